@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from ..db.postgres import get_db, create_task, get_task, update_task_status
-from ..workers.tasks import analyze_pr_task, compare_files_task
+from ..workers.tasks import analyze_pr_task, compare_files_task, compare_trees_task
 from ..db.redis import get_redis_client
+from ..core.github_ratelimit import get_rate_limit_budget
+from ..core.file_comparison import METADATA_MODES
+from ..core.token_stream import iter_sse_events
+from ..services.ollama_service import generation_profiles
+from typing import Optional
 import json
 
 
 router = APIRouter()
 
+def _check_llm_profile(llm_profile: Optional[str]):
+    if llm_profile is not None and llm_profile not in generation_profiles():
+        raise HTTPException(status_code=400, detail=f"llm_profile must be one of {', '.join(generation_profiles())}")
+
+
 @router.post("/analyze-pr")
-async def analyze_pr(repo_url: str, pr_number: int, db: Session = Depends(get_db)):
-    task = analyze_pr_task.delay(repo_url, pr_number)
+async def analyze_pr(repo_url: str, pr_number: int, llm_profile: Optional[str] = None,
+                     bypass_llm_cache: bool = False, db: Session = Depends(get_db)):
+    _check_llm_profile(llm_profile)
+    task = analyze_pr_task.delay(repo_url, pr_number, llm_profile=llm_profile, bypass_llm_cache=bypass_llm_cache)
     create_task(task.id, db)
     return {"task_id": task.id}
 
@@ -34,6 +47,31 @@ async def get_status(task_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Task not found")
     return {"task_id": task_id, "status": task.status}
 
+@router.get("/stream/{task_id}")
+async def stream_task(task_id: str, last_event_id: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """
+    Live model output of a task as Server-Sent Events: `token` events ({source, text}),
+    `end` when a source (file or diff chunk) is finished, and a final `done` ({status}).
+    Event ids are Redis stream ids, so EventSource reconnects resume via Last-Event-ID.
+    """
+    task = get_task(task_id, db)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    stored_status = task.status
+    redis_client = get_redis_client()
+
+    def task_status():
+        redis_data = redis_client.get(f"task:{task_id}")
+        if redis_data:
+            return json.loads(redis_data)["status"]
+        return stored_status
+
+    return StreamingResponse(
+        iter_sse_events(task_id, last_event_id, task_status),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/results/{task_id}")
 async def get_results(task_id: str, db: Session = Depends(get_db)):
     redis_client = get_redis_client()
@@ -60,13 +98,40 @@ async def compare_files(
     repo_b_raw_url: str,
     ref_a: str = "HEAD",
     ref_b: str = "HEAD",
+    metadata: str = "full",
+    llm_profile: Optional[str] = None,
+    bypass_llm_cache: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Compare two files from different repositories"""
-    task = compare_files_task.delay(repo_a_raw_url, repo_b_raw_url, ref_a, ref_b)
+    """Compare two files from different repositories (metadata: none | sha | full)"""
+    if metadata not in METADATA_MODES:
+        raise HTTPException(status_code=400, detail=f"metadata must be one of {', '.join(METADATA_MODES)}")
+    _check_llm_profile(llm_profile)
+    task = compare_files_task.delay(repo_a_raw_url, repo_b_raw_url, ref_a, ref_b, metadata,
+                                    llm_profile=llm_profile, bypass_llm_cache=bypass_llm_cache)
     create_task(task.id, db)
     return {"task_id": task.id}
 
+@router.post("/compare-trees")
+async def compare_trees(
+    repo_a_url: str,
+    repo_b_url: str,
+    ref_a: str = "HEAD",
+    ref_b: str = "HEAD",
+    path_a: str = "",
+    path_b: str = "",
+    db: Session = Depends(get_db)
+):
+    """Compare two directory trees (repo + ref + path prefix) file by file"""
+    task = compare_trees_task.delay(repo_a_url, repo_b_url, ref_a, ref_b, path_a, path_b)
+    create_task(task.id, db)
+    return {"task_id": task.id}
+
+@router.get("/github/rate-limit")
+async def github_rate_limit():
+    """Current GitHub API budget shared by all workers, per token and resource"""
+    return {"budgets": get_rate_limit_budget()}
+
 # from fastapi import APIRouter, Depends, HTTPException
 # from ..db.postgres import get_db, create_task, get_task, update_task_status
 # from ..workers.tasks import analyze_pr_task
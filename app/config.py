@@ -43,11 +43,135 @@ class Config:
     
     # Ollama configuration
     OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://ollama:11434/api")
+    # Several Ollama servers (comma-separated API URLs, overrides OLLAMA_API_URL): each request goes
+    # to the host with the fewest in-flight requests (counted across workers in Redis). A host is
+    # ejected after OLLAMA_EJECT_FAILURES consecutive failures, or a failed health check every
+    # OLLAMA_HEALTH_INTERVAL seconds (0 = no checks), for OLLAMA_EJECT_SECONDS (doubling with each
+    # ejection in a row) and readmitted once that time has passed; a passing check or request
+    # then clears its record. Only requests that could not be sent fail over to another host
+    OLLAMA_API_URLS = os.getenv("OLLAMA_API_URLS", "")
+    OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+    OLLAMA_EJECT_FAILURES = int(os.getenv("OLLAMA_EJECT_FAILURES", "3"))
+    OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:4b")
+    # Pooled Ollama client (shared per worker process): separate connect/read timeouts,
+    # and connection-failure retries only (a sent generation is never repeated)
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+    OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+    OLLAMA_POOL_MAXSIZE = int(os.getenv("OLLAMA_POOL_MAXSIZE", "8"))
+    OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+    # Generation profiles (see ollama_service.GENERATION_PROFILES) as JSON merged over the
+    # built-in ones, e.g. {"file_comparison": {"num_ctx": 16384}}, and the default keep_alive
+    OLLAMA_PROFILES = os.getenv("OLLAMA_PROFILES", "")
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
     
+    # Large diffs are analyzed as hunk-aligned chunks of about LLM_CHUNK_TOKENS tokens,
+    # LLM_CHUNK_CONCURRENCY at a time, at most LLM_MAX_CHUNKS per comparison
+    LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "1500"))
+    LLM_CHUNK_CONCURRENCY = int(os.getenv("LLM_CHUNK_CONCURRENCY", "4"))
+    LLM_MAX_CHUNKS = int(os.getenv("LLM_MAX_CHUNKS", "8"))
+    # Ollama `format` for comparison analyses: schema (JSON schema of the analysis, Ollama 0.5+),
+    # json (any JSON object) or none
+    LLM_JSON_FORMAT = os.getenv("LLM_JSON_FORMAT", "schema").lower()
+
+    # LLM response cache keyed by (model, generation options, sha256(prompt)): in-process LRU over
+    # Redis, where the least recently used entries beyond LLM_CACHE_MAX_ENTRIES are evicted.
+    # zstd compression needs the optional zstandard package (LLM_CACHE_COMPRESSION=zstd|none).
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_LRU_SIZE = int(os.getenv("LLM_CACHE_LRU_SIZE", "256"))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+    LLM_CACHE_COMPRESSION = os.getenv("LLM_CACHE_COMPRESSION", "zstd").lower()
+
+    # Live LLM tokens per task on a Redis stream, relayed by GET /stream/{task_id} (SSE).
+    # Tokens are published in batches every LLM_STREAM_FLUSH_MS; the stream keeps at most
+    # LLM_STREAM_MAXLEN entries and expires LLM_STREAM_TTL seconds after its last write
+    LLM_STREAM_ENABLED = os.getenv("LLM_STREAM_ENABLED", "true").lower() == "true"
+    LLM_STREAM_FLUSH_MS = int(os.getenv("LLM_STREAM_FLUSH_MS", "100"))
+    LLM_STREAM_MAXLEN = int(os.getenv("LLM_STREAM_MAXLEN", "10000"))
+    LLM_STREAM_TTL = int(os.getenv("LLM_STREAM_TTL", "3600"))
+    LLM_STREAM_BLOCK_MS = int(os.getenv("LLM_STREAM_BLOCK_MS", "15000"))
+
+    # PR analysis: number of commits analyzed per PR (0 = all commits)
+    ANALYZE_COMMIT_LIMIT = int(os.getenv("ANALYZE_COMMIT_LIMIT", "2"))
+    # Files analyzed concurrently per PR task (1 = one at a time); results keep commit and file order.
+    # Match the Ollama server's OLLAMA_NUM_PARALLEL, and keep it within OLLAMA_POOL_MAXSIZE
+    ANALYZE_FILE_CONCURRENCY = int(os.getenv("ANALYZE_FILE_CONCURRENCY", "4"))
+
     # API Keys
     GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
 
+    # GitHub HTTP client (shared per worker process)
+    GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+    GITHUB_GRAPHQL_URL = os.getenv("GITHUB_GRAPHQL_URL", f"{GITHUB_API_URL}/graphql")
+    GITHUB_RAW_URL = os.getenv("GITHUB_RAW_URL", "https://raw.githubusercontent.com").rstrip("/")
+    # Where PR changes are read from: rest (per-commit REST calls), graphql (batched queries;
+    # the PR's net change as one entry) or mirror (local bare clones for every repo)
+    GITHUB_BACKEND = os.getenv("GITHUB_BACKEND", "rest").lower()
+
+    # Local bare mirrors (gitpython). Repos listed as owner/repo are always read from a mirror.
+    GIT_MIRROR_DIR = os.getenv("GIT_MIRROR_DIR", os.path.join(os.getcwd(), ".cache", "mirrors"))
+    GIT_MIRROR_REPOS = os.getenv("GIT_MIRROR_REPOS", "")
+    GIT_MIRROR_REFRESH_SECONDS = int(os.getenv("GIT_MIRROR_REFRESH_SECONDS", "60"))
+    GITHUB_POOL_CONNECTIONS = int(os.getenv("GITHUB_POOL_CONNECTIONS", "4"))
+    GITHUB_POOL_MAXSIZE = int(os.getenv("GITHUB_POOL_MAXSIZE", "20"))
+    GITHUB_POOL_BLOCK = os.getenv("GITHUB_POOL_BLOCK", "true").lower() == "true"
+    GITHUB_CONNECT_TIMEOUT = float(os.getenv("GITHUB_CONNECT_TIMEOUT", "5"))
+    GITHUB_READ_TIMEOUT = float(os.getenv("GITHUB_READ_TIMEOUT", "30"))
+    GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+    GITHUB_RETRY_BACKOFF = float(os.getenv("GITHUB_RETRY_BACKOFF", "0.5"))
+    GITHUB_FETCH_CONCURRENCY = int(os.getenv("GITHUB_FETCH_CONCURRENCY", "8"))
+    # Items fetched ahead of the analysis loop while it waits on the LLM
+    GITHUB_PREFETCH_BUFFER = int(os.getenv("GITHUB_PREFETCH_BUFFER", "16"))
+
+    # GitHub conditional-request (ETag) cache
+    GITHUB_CACHE_ENABLED = os.getenv("GITHUB_CACHE_ENABLED", "true").lower() == "true"
+    GITHUB_CACHE_LRU_SIZE = int(os.getenv("GITHUB_CACHE_LRU_SIZE", "512"))
+    GITHUB_CACHE_LRU_BYTES = int(os.getenv("GITHUB_CACHE_LRU_BYTES", str(32 * 1024 ** 2)))
+    GITHUB_CACHE_TTL = int(os.getenv("GITHUB_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # Raw file downloads: hard size cap, and the size above which content spills to a temp file
+    MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(50 * 1024 ** 2)))
+    FILE_SPILL_THRESHOLD = int(os.getenv("FILE_SPILL_THRESHOLD", str(4 * 1024 ** 2)))
+
+    # Line diff engine for file comparisons: histogram | difflib (reference)
+    DIFF_ENGINE = os.getenv("DIFF_ENGINE", "histogram").lower()
+
+    # Symbol-level diff (Python via ast) next to the line diff; changed symbols replace file previews in prompts
+    SEMANTIC_DIFF_ENABLED = os.getenv("SEMANTIC_DIFF_ENABLED", "true").lower() == "true"
+
+    # Diff result cache keyed by content hashes: in-process LRU (entries / diff text bytes) over Redis
+    DIFF_CACHE_ENABLED = os.getenv("DIFF_CACHE_ENABLED", "true").lower() == "true"
+    DIFF_CACHE_LRU_SIZE = int(os.getenv("DIFF_CACHE_LRU_SIZE", "256"))
+    DIFF_CACHE_LRU_BYTES = int(os.getenv("DIFF_CACHE_LRU_BYTES", str(32 * 1024 ** 2)))
+    DIFF_CACHE_TTL = int(os.getenv("DIFF_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # Generated / binary / vendored file prefilter: categories listed in FILE_PREFILTER_SKIP
+    # are tagged and skip LLM analysis (other tagged files are still analyzed)
+    FILE_PREFILTER_ENABLED = os.getenv("FILE_PREFILTER_ENABLED", "true").lower() == "true"
+    FILE_PREFILTER_SKIP = os.getenv("FILE_PREFILTER_SKIP", "generated,binary,vendored")
+
+    # Tree comparisons: diff worker processes (0 = one per CPU) and max changed files diffed
+    TREE_DIFF_PROCESSES = int(os.getenv("TREE_DIFF_PROCESSES", "0"))
+    TREE_COMPARE_MAX_FILES = int(os.getenv("TREE_COMPARE_MAX_FILES", "500"))
+
+    # Content-addressed blob store (local disk, LRU by size) and blob-pair comparison cache
+    BLOB_CACHE_ENABLED = os.getenv("BLOB_CACHE_ENABLED", "true").lower() == "true"
+    BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", os.path.join(os.getcwd(), ".cache", "blobs"))
+    BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+    COMPARISON_CACHE_TTL = int(os.getenv("COMPARISON_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # Cluster-wide GitHub rate-limit scheduling. Reserves are fractions of the hourly limit
+    # kept back for higher priorities: low-priority fetches wait first, then normal ones.
+    GITHUB_RATELIMIT_ENABLED = os.getenv("GITHUB_RATELIMIT_ENABLED", "true").lower() == "true"
+    GITHUB_RATELIMIT_RESERVE_LOW = float(os.getenv("GITHUB_RATELIMIT_RESERVE_LOW", "0.2"))
+    GITHUB_RATELIMIT_RESERVE_NORMAL = float(os.getenv("GITHUB_RATELIMIT_RESERVE_NORMAL", "0.05"))
+    GITHUB_RATELIMIT_MAX_WAIT = int(os.getenv("GITHUB_RATELIMIT_MAX_WAIT", "900"))
+
+    # Redis-backed caches degrade to in-process only when Redis is unreachable
+    CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", "2"))
+    CACHE_REDIS_RETRY_SECONDS = int(os.getenv("CACHE_REDIS_RETRY_SECONDS", "30"))
+
     @staticmethod
     def get_redis_url():
         """Get Redis URL for Celery"""
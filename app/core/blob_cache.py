@@ -0,0 +1,209 @@
+"""
+Content-addressed blob store keyed by git blob SHA.
+
+Identical file versions (forks, vendored copies, repeat comparisons) are downloaded
+once per host and shared by every compare task and repository. Blobs live on local
+disk with size-bounded LRU eviction (file mtime is bumped on every hit). Results of
+comparing two blobs are cached in Redis under the pair of SHAs so a repeat
+comparison skips the diff and the LLM call as well.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+
+from ..config import Config
+from ..logger import logging
+from .cache import get_cache_redis, mark_redis_unavailable
+
+
+def git_blob_sha(data: bytes) -> str:
+    """SHA-1 git assigns to a blob with this content (matches the contents API `sha`)"""
+    digest = hashlib.sha1()
+    digest.update(b"blob %d\0" % len(data))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def git_blob_sha_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """git_blob_sha for a file on disk, read in chunks"""
+    digest = hashlib.sha1()
+    digest.update(b"blob %d\0" % os.path.getsize(path))
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._approx_size = None
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], sha[2:])
+
+    def get(self, sha: str) -> Optional[bytes]:
+        path = self._path(sha)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def path_for(self, sha: str) -> Optional[str]:
+        """Filesystem path of a stored blob (marked as recently used), or None"""
+        path = self._path(sha)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def put(self, sha: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(sha)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._account(len(data))
+
+    def put_file(self, sha: str, source_path: str):
+        """Store a blob from a file on disk without loading it into memory"""
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return
+        path = self._path(sha)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._account(size)
+
+    def _account(self, added: int):
+        with self._lock:
+            if self._approx_size is None:
+                self._approx_size = self._scan_size()
+            else:
+                self._approx_size += added
+            if self._approx_size > self.max_bytes:
+                self._approx_size = self._evict()
+
+    def _scan_size(self) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def _evict(self) -> int:
+        """Remove least recently used blobs until the store is below 90% of max_bytes"""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+        logging.info(f"Blob store evicted down to {total} bytes")
+        return total
+
+
+_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> Optional[BlobStore]:
+    global _store
+    if not Config.BLOB_CACHE_ENABLED:
+        return None
+    if _store is None:
+        _store = BlobStore(Config.BLOB_CACHE_DIR, Config.BLOB_CACHE_MAX_BYTES)
+    return _store
+
+
+def _comparison_key(sha_a: str, sha_b: str, names: str, settings: Optional[Dict[str, Any]]) -> str:
+    # File names appear in the diff headers, and the diff / generation settings shape the
+    # analysis, so both are part of the key
+    variant = names + "\n" + json.dumps(settings or {}, sort_keys=True)
+    variant_hash = hashlib.sha256(variant.encode("utf-8")).hexdigest()[:16]
+    return f"compare:blobs:{sha_a}:{sha_b}:{variant_hash}"
+
+
+def get_cached_comparison(sha_a: Optional[str], sha_b: Optional[str], names: str = "",
+                          settings: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Diff + analysis previously computed for this exact pair of blobs with the same settings"""
+    if not sha_a or not sha_b or not Config.BLOB_CACHE_ENABLED:
+        return None
+    client = get_cache_redis()
+    if client is None:
+        return None
+    try:
+        raw = client.get(_comparison_key(sha_a, sha_b, names, settings))
+    except Exception as e:
+        mark_redis_unavailable(e)
+        return None
+    return json.loads(raw) if raw else None
+
+
+def store_cached_comparison(sha_a: Optional[str], sha_b: Optional[str], comparison: Dict[str, Any], names: str = "",
+                            settings: Optional[Dict[str, Any]] = None):
+    if not sha_a or not sha_b or not Config.BLOB_CACHE_ENABLED:
+        return
+    client = get_cache_redis()
+    if client is None:
+        return
+    try:
+        client.set(_comparison_key(sha_a, sha_b, names, settings), json.dumps(comparison),
+                   ex=Config.COMPARISON_CACHE_TTL)
+    except Exception as e:
+        mark_redis_unavailable(e)
@@ -0,0 +1,118 @@
+"""
+Cache building blocks shared by the GitHub, diff and LLM caching layers
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from ..config import Config
+from ..logger import logging
+from ..db.redis import get_redis_client
+
+
+def _default_sizeof(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return 1
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache bounded by entry count and, optionally, by total size.
+    Size is measured with `sizeof` (length of str/bytes values by default).
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = _default_sizeof):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def set(self, key, value):
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never let a single oversized value flush the whole cache
+            return
+        with self._lock:
+            if key in self._data:
+                self._size -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self._size += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._size > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._size -= evicted_size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value, size = self._data.pop(key)
+            self._size -= size
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+_redis_client = None
+_redis_pid = None
+_redis_disabled_until = 0.0
+_redis_lock = threading.Lock()
+
+
+def get_cache_redis():
+    """
+    Process-wide Redis client for caches, or None while Redis is marked unavailable.
+    Caches must treat None as a miss and carry on without Redis.
+    """
+    global _redis_client, _redis_pid
+    if not Config.REDIS_URL or time.monotonic() < _redis_disabled_until:
+        return None
+    pid = os.getpid()
+    if _redis_client is None or _redis_pid != pid:
+        with _redis_lock:
+            if _redis_client is None or _redis_pid != pid:
+                try:
+                    _redis_client = get_redis_client(
+                        socket_timeout=Config.CACHE_REDIS_TIMEOUT,
+                        socket_connect_timeout=Config.CACHE_REDIS_TIMEOUT,
+                    )
+                    _redis_pid = pid
+                except Exception as e:
+                    mark_redis_unavailable(e)
+                    return None
+    return _redis_client
+
+
+def mark_redis_unavailable(error: Exception):
+    """Skip Redis for CACHE_REDIS_RETRY_SECONDS after a failure instead of paying a timeout per call"""
+    global _redis_disabled_until
+    _redis_disabled_until = time.monotonic() + Config.CACHE_REDIS_RETRY_SECONDS
+    logging.warning(f"Redis cache unavailable, continuing without it for {Config.CACHE_REDIS_RETRY_SECONDS}s: {error}")
@@ -0,0 +1,89 @@
+"""
+Small concurrency helpers shared by the fetch and analysis stages
+"""
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def prefetch(iterable: Iterable[T], buffer_size: int = 1) -> Iterator[T]:
+    """
+    Iterate `iterable` in a background thread, keeping up to `buffer_size` items ready.
+    Lets a consumer work on the current item (e.g. an LLM call) while the next page downloads.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    if buffer_size <= 0:
+        yield from iterable
+        return
+
+    items = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put(item):
+                    return
+        except BaseException as e:
+            _put(_Failure(e))
+            return
+        _put(_DONE)
+
+    producer = threading.Thread(target=_produce, name="prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # Consumer finished or abandoned the iterator: let the producer exit
+        stop.set()
+
+
+def ordered_map(fn: Callable[[T], R], iterable: Iterable[T], concurrency: int = 1) -> Iterator[R]:
+    """
+    Like map(), running up to `concurrency` calls at a time in threads while yielding
+    results in input order. The input is consumed lazily (at most `concurrency` items
+    ahead), so it can be a streaming iterator. Exceptions from `fn` are re-raised in order.
+    """
+    if concurrency <= 1:
+        yield from map(fn, iterable)
+        return
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ordered-map") as executor:
+        try:
+            for item in iterable:
+                if len(pending) >= concurrency:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(fn, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
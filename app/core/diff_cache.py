@@ -0,0 +1,128 @@
+"""
+Diff result cache keyed by content hashes.
+
+The key is (sha256(content_a), sha256(content_b), diff options). File names are an
+option because they appear in the diff headers. Results live in an in-process LRU
+bounded by entry count and total diff text size, backed by Redis so every worker
+shares them. Repeat comparisons of the same file versions (e.g. release branches)
+then skip the diff computation entirely.
+"""
+import hashlib
+import json
+from typing import Dict, Any, Optional, Sequence, Tuple, Union
+
+from ..config import Config
+from ..logger import logging
+from .cache import LRUCache, get_cache_redis, mark_redis_unavailable
+from .file_comparison import MAX_DIFF_CHARS, compute_unified_diff
+
+Content = Union[str, Sequence[str]]
+
+
+def content_hash(content: Content) -> str:
+    """sha256 of the text; a string and its lines (with line endings) hash the same"""
+    digest = hashlib.sha256()
+    if isinstance(content, str):
+        digest.update(content.encode("utf-8", errors="surrogatepass"))
+    else:
+        for line in content:
+            digest.update(line.encode("utf-8", errors="surrogatepass"))
+    return digest.hexdigest()
+
+
+def _diff_size(diff: Dict[str, Any]) -> int:
+    size = len(diff.get("unified_diff", "")) + 64
+    if diff.get("semantic_diff"):
+        size += len(json.dumps(diff["semantic_diff"]))
+    size += sum(len(chunk) for chunk in diff.get("diff_chunks") or ())
+    return size
+
+
+class DiffCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int, namespace: str = "diff"):
+        self.lru = LRUCache(max_entries=max_entries, max_bytes=max_bytes, sizeof=_diff_size)
+        self.ttl = ttl
+        self.namespace = namespace
+
+    def make_key(self, hash_a: str, hash_b: str, **options) -> str:
+        options_hash = hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return f"{self.namespace}:{hash_a}:{hash_b}:{options_hash}"
+
+    def key_for(self, file_a_content: Content, file_b_content: Content, file_a_name: str, file_b_name: str,
+                engine: Optional[str] = None, max_chars: int = MAX_DIFF_CHARS, semantic: bool = False,
+                chunk_tokens: Optional[int] = None, max_chunks: Optional[int] = None) -> str:
+        """Key of the compute_unified_diff result for these contents and arguments"""
+        return self.make_key(
+            content_hash(file_a_content), content_hash(file_b_content),
+            names=[file_a_name, file_b_name], engine=engine or Config.DIFF_ENGINE, max_chars=max_chars,
+            semantic=semantic, chunk_tokens=chunk_tokens, max_chunks=max_chunks,
+        )
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        diff = self.lru.get(key)
+        if diff is not None:
+            return diff
+        client = get_cache_redis()
+        if client is None:
+            return None
+        try:
+            raw = client.get(key)
+        except Exception as e:
+            mark_redis_unavailable(e)
+            return None
+        if not raw:
+            return None
+        diff = json.loads(raw)
+        self.lru.set(key, diff)
+        return diff
+
+    def store(self, key: str, diff: Dict[str, Any]):
+        self.lru.set(key, diff)
+        client = get_cache_redis()
+        if client is None:
+            return
+        try:
+            client.set(key, json.dumps(diff), ex=self.ttl)
+        except Exception as e:
+            mark_redis_unavailable(e)
+
+
+_cache: Optional[DiffCache] = None
+
+
+def get_diff_cache() -> Optional[DiffCache]:
+    global _cache
+    if not Config.DIFF_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = DiffCache(Config.DIFF_CACHE_LRU_SIZE, Config.DIFF_CACHE_LRU_BYTES, Config.DIFF_CACHE_TTL)
+        logging.info(f"Diff cache enabled (lru={Config.DIFF_CACHE_LRU_SIZE} entries / "
+                     f"{Config.DIFF_CACHE_LRU_BYTES} bytes, ttl={Config.DIFF_CACHE_TTL}s)")
+    return _cache
+
+
+def cached_unified_diff(file_a_content: Content, file_b_content: Content,
+                        file_a_name: str = "file_a", file_b_name: str = "file_b",
+                        engine: Optional[str] = None, max_chars: int = MAX_DIFF_CHARS,
+                        semantic: bool = False, chunk_tokens: Optional[int] = None,
+                        max_chunks: Optional[int] = None) -> Tuple[Dict[str, Any], str]:
+    """
+    compute_unified_diff through the diff cache.
+    Returns the diff and the cache outcome: "hit", "miss" or "disabled".
+    """
+    cache = get_diff_cache()
+    if cache is None:
+        return compute_unified_diff(file_a_content, file_b_content, file_a_name, file_b_name,
+                                    engine=engine, max_chars=max_chars, semantic=semantic,
+                                    chunk_tokens=chunk_tokens, max_chunks=max_chunks), "disabled"
+
+    key = cache.key_for(file_a_content, file_b_content, file_a_name, file_b_name, engine, max_chars, semantic,
+                        chunk_tokens, max_chunks)
+    diff = cache.lookup(key)
+    if diff is not None:
+        return diff, "hit"
+    diff = compute_unified_diff(file_a_content, file_b_content, file_a_name, file_b_name,
+                                engine=engine, max_chars=max_chars, semantic=semantic,
+                                chunk_tokens=chunk_tokens, max_chunks=max_chunks)
+    cache.store(key, diff)
+    return diff, "miss"
@@ -0,0 +1,121 @@
+"""
+Split unified diffs into token-budgeted chunks on hunk boundaries for LLM analysis
+"""
+import re
+from typing import List, Optional, Tuple
+
+# Rough size of a token for code and diffs; only used to turn token budgets into characters
+CHARS_PER_TOKEN = 4
+
+_HUNK_HEADER = re.compile(r"@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_hunks(diff_text: str) -> Tuple[str, List[str]]:
+    """
+    Split a unified diff into its file header and hunks (each starting with its @@ line).
+    Header lines may be glued to the first hunk (compute_unified_diff uses lineterm=''),
+    so a hunk starts at any header match at the start of a line, or right after the file header.
+    """
+    starts = []
+    for match in _HUNK_HEADER.finditer(diff_text):
+        position = match.start()
+        if not starts or position == 0 or diff_text[position - 1] == "\n":
+            starts.append(position)
+    if not starts:
+        return diff_text, []
+    hunks = [diff_text[start:end] for start, end in zip(starts, starts[1:] + [len(diff_text)])]
+    return diff_text[:starts[0]], hunks
+
+
+def _split_large_hunk(hunk: str, max_chars: int) -> List[str]:
+    """Split a hunk bigger than the budget on line boundaries, repeating its @@ line on each piece"""
+    header = _HUNK_HEADER.match(hunk).group(0)
+    body = hunk[len(header):]
+    continued = f"{header} (continued)\n"
+    pieces = []
+    current = header
+    for line in body.splitlines(keepends=True):
+        if len(current) + len(line) > max_chars and current not in (header, continued):
+            pieces.append(current)
+            current = continued
+        # A single line longer than the budget is cut rather than dropped
+        current += line[:max_chars - len(continued)]
+    pieces.append(current)
+    return pieces
+
+
+def chunk_diff(diff_text: str, max_tokens: int) -> List[str]:
+    """
+    Pack consecutive hunks into chunks of at most `max_tokens` (estimated), never splitting
+    a hunk unless it alone exceeds the budget. Diffs without hunks come back as one chunk.
+    """
+    max_chars = max(max_tokens * CHARS_PER_TOKEN, 200)
+    _, hunks = split_hunks(diff_text)
+    if not hunks:
+        return [diff_text] if diff_text else []
+
+    chunks = []
+    current = ""
+    for hunk in hunks:
+        pieces = _split_large_hunk(hunk, max_chars) if len(hunk) > max_chars else [hunk]
+        for piece in pieces:
+            if current and len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class DiffChunkPacker:
+    """
+    chunk_diff over a stream of diff lines (as produced by the diff engines), so chunks can
+    be built from the whole diff while only a bounded prefix of its text is kept.
+    Chunks beyond `max_chunks` are only counted (`skipped`).
+    """
+
+    def __init__(self, max_tokens: int, max_chunks: Optional[int] = None):
+        self.max_chars = max(max_tokens * CHARS_PER_TOKEN, 200)
+        self.max_chunks = max_chunks
+        self.chunks: List[str] = []
+        self.skipped = 0
+        self._hunk: List[str] = []
+        self._current = ""
+
+    def add_line(self, line: str):
+        if _HUNK_HEADER.match(line):
+            self._end_hunk()
+            self._hunk.append(line)
+        elif self._hunk:
+            # Lines before the first hunk are the file header, which chunks leave out
+            self._hunk.append(line)
+
+    def _emit(self, chunk: str):
+        if self.max_chunks is None or len(self.chunks) < self.max_chunks:
+            self.chunks.append(chunk)
+        else:
+            self.skipped += 1
+
+    def _end_hunk(self):
+        if not self._hunk:
+            return
+        hunk = "".join(self._hunk)
+        self._hunk = []
+        pieces = _split_large_hunk(hunk, self.max_chars) if len(hunk) > self.max_chars else [hunk]
+        for piece in pieces:
+            if self._current and len(self._current) + len(piece) > self.max_chars:
+                self._emit(self._current)
+                self._current = ""
+            self._current += piece
+
+    def finish(self) -> List[str]:
+        self._end_hunk()
+        if self._current:
+            self._emit(self._current)
+            self._current = ""
+        return self.chunks
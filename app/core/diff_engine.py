@@ -0,0 +1,364 @@
+"""
+Pluggable line diff engines for compute_unified_diff.
+
+Every engine turns two line sequences into SequenceMatcher-style opcodes and shares
+the unified-diff formatting below, so the output format is identical to
+difflib.unified_diff whichever engine computed the alignment.
+
+- "difflib": difflib.SequenceMatcher, kept as the reference implementation. It is
+  quadratic on inputs with many repeated lines (lockfiles, JSON fixtures, generated code).
+- "histogram": git's histogram diff on interned line IDs. Matches are anchored on the
+  rarest common lines, and regions without a usable anchor fall back to Myers' O(ND) diff.
+
+Files can also be passed as InternedLines: compact arrays of line IDs into a LineTable
+shared by both sides, which the engines diff directly without re-interning.
+"""
+import difflib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..config import Config
+
+Opcode = Tuple[str, int, int, int, int]
+Block = Tuple[int, int, int]
+
+
+def _format_range_unified(start: int, stop: int) -> str:
+    """Convert a range to the "ed" format, as difflib does"""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def group_opcodes(opcodes: List[Opcode], n: int = 3) -> Iterator[List[Opcode]]:
+    """Isolate change clusters with up to `n` lines of context (difflib's get_grouped_opcodes)"""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    nn = n + n
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # End the current group and start a new one whenever there is a large range with no changes
+        if tag == "equal" and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+class DiffEngine:
+    """Base class: subclasses implement get_opcodes()"""
+
+    name = "base"
+
+    def get_opcodes(self, a: Sequence[str], b: Sequence[str]) -> List[Opcode]:
+        raise NotImplementedError
+
+    def unified_diff(self, a: Sequence[str], b: Sequence[str], fromfile: str = "", tofile: str = "",
+                     n: int = 3, lineterm: str = "\n") -> Iterator[str]:
+        """Same lines, in the same format, as difflib.unified_diff (without file dates)"""
+        started = False
+        for group in group_opcodes(self.get_opcodes(a, b), n):
+            if not started:
+                started = True
+                yield f"--- {fromfile}{lineterm}"
+                yield f"+++ {tofile}{lineterm}"
+
+            first, last = group[0], group[-1]
+            file1_range = _format_range_unified(first[1], last[2])
+            file2_range = _format_range_unified(first[3], last[4])
+            yield f"@@ -{file1_range} +{file2_range} @@{lineterm}"
+
+            for tag, i1, i2, j1, j2 in group:
+                if tag == "equal":
+                    for line in a[i1:i2]:
+                        yield " " + line
+                    continue
+                if tag in ("replace", "delete"):
+                    for line in a[i1:i2]:
+                        yield "-" + line
+                if tag in ("replace", "insert"):
+                    for line in b[j1:j2]:
+                        yield "+" + line
+
+
+class DifflibEngine(DiffEngine):
+    """Reference engine: difflib.SequenceMatcher"""
+
+    name = "difflib"
+
+    def get_opcodes(self, a: Sequence[str], b: Sequence[str]) -> List[Opcode]:
+        if isinstance(a, InternedLines) and isinstance(b, InternedLines) and a.table is b.table:
+            # Equal IDs are equal lines, so SequenceMatcher finds the same alignment on the ints
+            return difflib.SequenceMatcher(None, a.ids, b.ids).get_opcodes()
+        return difflib.SequenceMatcher(None, a, b).get_opcodes()
+
+    def unified_diff(self, a: Sequence[str], b: Sequence[str], fromfile: str = "", tofile: str = "",
+                     n: int = 3, lineterm: str = "\n") -> Iterator[str]:
+        if isinstance(a, InternedLines) or isinstance(b, InternedLines):
+            return super().unified_diff(a, b, fromfile, tofile, n, lineterm)
+        return difflib.unified_diff(a, b, fromfile=fromfile, tofile=tofile, n=n, lineterm=lineterm)
+
+
+class LineTable:
+    """
+    Shared intern table: every distinct line is stored once and referred to by a small integer.
+    Several files encoded against one table share the storage of their common lines.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._lines: List[str] = []
+
+    def intern(self, line: str) -> int:
+        line_id = self._ids.get(line)
+        if line_id is None:
+            line_id = self._ids[line] = len(self._lines)
+            self._lines.append(line)
+        return line_id
+
+    def encode(self, lines: Iterable[str]) -> "InternedLines":
+        return InternedLines(self, array("I", map(self.intern, lines)))
+
+    def line(self, line_id: int) -> str:
+        return self._lines[line_id]
+
+    def __len__(self):
+        return len(self._lines)
+
+
+class InternedLines(Sequence):
+    """
+    A file as an array('I') of line IDs into a LineTable (4 bytes per line).
+    Reads like a list of lines, so text is only materialized for the lines actually accessed.
+    """
+
+    def __init__(self, table: LineTable, ids: array):
+        self.table = table
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.table.line(line_id) for line_id in self.ids[index]]
+        return self.table.line(self.ids[index])
+
+    def __iter__(self):
+        return map(self.table.line, self.ids)
+
+
+def intern_lines(a: Sequence[str], b: Sequence[str]) -> Tuple[Sequence[int], Sequence[int]]:
+    """Map every distinct line to a small integer so the diff compares ints instead of strings"""
+    if isinstance(a, InternedLines) and isinstance(b, InternedLines) and a.table is b.table:
+        return a.ids, b.ids
+    ids: Dict[str, int] = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    return a_ids, b_ids
+
+
+def _blocks_to_opcodes(blocks: List[Block], len_a: int, len_b: int) -> List[Opcode]:
+    """Turn sorted, non-overlapping matching blocks into opcodes (SequenceMatcher.get_opcodes)"""
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in blocks + [(len_a, len_b, 0)]:
+        tag = ""
+        if i < ai and j < bj:
+            tag = "replace"
+        elif i < ai:
+            tag = "delete"
+        elif j < bj:
+            tag = "insert"
+        if tag:
+            opcodes.append((tag, i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(("equal", ai, i, bj, j))
+    return opcodes
+
+
+def _merge_blocks(blocks: List[Block]) -> List[Block]:
+    merged: List[Block] = []
+    for ai, bj, size in sorted(blocks):
+        if merged:
+            pa, pb, psize = merged[-1]
+            if pa + psize == ai and pb + psize == bj:
+                merged[-1] = (pa, pb, psize + size)
+                continue
+        merged.append((ai, bj, size))
+    return merged
+
+
+class HistogramEngine(DiffEngine):
+    """
+    Histogram diff (as in git diff --histogram) on interned line IDs.
+    Lines occurring more than `max_chain` times in a region are never used as anchors;
+    Myers' algorithm handles regions without an anchor, up to `max_myers_cost` edits.
+    """
+
+    name = "histogram"
+
+    def __init__(self, max_chain: int = 64, max_myers_cost: int = 1000):
+        self.max_chain = max_chain
+        self.max_myers_cost = max_myers_cost
+
+    def get_opcodes(self, a: Sequence[str], b: Sequence[str]) -> List[Opcode]:
+        a_ids, b_ids = intern_lines(a, b)
+        return _blocks_to_opcodes(self.matching_blocks(a_ids, b_ids), len(a_ids), len(b_ids))
+
+    def matching_blocks(self, a: Sequence[int], b: Sequence[int]) -> List[Block]:
+        blocks: List[Block] = []
+        # Explicit stack of regions: recursion would overflow on large inputs
+        regions = [(0, len(a), 0, len(b))]
+        while regions:
+            a0, a1, b0, b1 = regions.pop()
+
+            # Common prefix and suffix
+            start = 0
+            while a0 + start < a1 and b0 + start < b1 and a[a0 + start] == b[b0 + start]:
+                start += 1
+            if start:
+                blocks.append((a0, b0, start))
+                a0 += start
+                b0 += start
+            end = 0
+            while a0 < a1 - end and b0 < b1 - end and a[a1 - end - 1] == b[b1 - end - 1]:
+                end += 1
+            if end:
+                a1 -= end
+                b1 -= end
+                blocks.append((a1, b1, end))
+            if a0 == a1 or b0 == b1:
+                continue
+
+            anchor = self._find_anchor(a, b, a0, a1, b0, b1)
+            if anchor is None:
+                blocks.extend(self._myers(a, b, a0, a1, b0, b1))
+                continue
+            ai, bj, size = anchor
+            blocks.append(anchor)
+            regions.append((a0, ai, b0, bj))
+            regions.append((ai + size, a1, bj + size, b1))
+
+        return _merge_blocks(blocks)
+
+    def _find_anchor(self, a: Sequence[int], b: Sequence[int], a0: int, a1: int, b0: int, b1: int) -> Optional[Block]:
+        """Longest common run whose rarest line occurs the fewest times in a[a0:a1]"""
+        positions: Dict[int, List[int]] = {}
+        for i in range(a0, a1):
+            chain = positions.get(a[i])
+            if chain is None:
+                positions[a[i]] = [i]
+            else:
+                chain.append(i)
+
+        best = None
+        best_size = 0
+        # Chains longer than max_chain are skipped below; a run is only taken at count <= max_chain
+        best_count = self.max_chain
+        j = b0
+        while j < b1:
+            chain = positions.get(b[j])
+            if chain is None or len(chain) > best_count:
+                j += 1
+                continue
+            next_j = j + 1
+            for i in chain:
+                if i < a0:
+                    continue
+                start_a, start_b = i, j
+                count = len(chain)
+                while start_a > a0 and start_b > b0 and a[start_a - 1] == b[start_b - 1]:
+                    start_a -= 1
+                    start_b -= 1
+                    count = min(count, len(positions[a[start_a]]))
+                end_a, end_b = i + 1, j + 1
+                while end_a < a1 and end_b < b1 and a[end_a] == b[end_b]:
+                    count = min(count, len(positions[a[end_a]]))
+                    end_a += 1
+                    end_b += 1
+                size = end_a - start_a
+                if count < best_count or (count == best_count and size > best_size):
+                    best = (start_a, start_b, size)
+                    best_size = size
+                    best_count = count
+                next_j = max(next_j, end_b)
+            j = next_j
+        return best
+
+    def _myers(self, a: Sequence[int], b: Sequence[int], a0: int, a1: int, b0: int, b1: int) -> List[Block]:
+        """Matching blocks of a[a0:a1] and b[b0:b1] from Myers' greedy O(ND) algorithm"""
+        n, m = a1 - a0, b1 - b0
+        max_d = min(n + m, self.max_myers_cost)
+        offset = max_d + 1
+        v = [0] * (2 * max_d + 3)
+        # trace[d] holds v[-d..d] as it was before step d
+        trace = []
+        for d in range(max_d + 1):
+            trace.append(v[offset - d:offset + d + 1])
+            for k in range(-d, d + 1, 2):
+                if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                    x = v[offset + k + 1]
+                else:
+                    x = v[offset + k - 1] + 1
+                y = x - k
+                while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                    x += 1
+                    y += 1
+                v[offset + k] = x
+                if x >= n and y >= m:
+                    return self._myers_backtrack(trace, n, m, a0, b0)
+        # Too many edits: report the region as one replacement
+        return []
+
+    @staticmethod
+    def _myers_backtrack(trace: List[List[int]], n: int, m: int, a0: int, b0: int) -> List[Block]:
+        """Walk the edit path back from (n, m), collecting its diagonal runs"""
+        blocks = []
+        x, y = n, m
+        for d in range(len(trace) - 1, 0, -1):
+            previous = trace[d]
+            k = x - y
+            if k == -d or (k != d and previous[k - 1 + d] < previous[k + 1 + d]):
+                prev_k = k + 1
+                prev_x = previous[prev_k + d]
+                snake_x = prev_x
+            else:
+                prev_k = k - 1
+                prev_x = previous[prev_k + d]
+                snake_x = prev_x + 1
+            if x > snake_x:
+                blocks.append((a0 + snake_x, b0 + snake_x - k, x - snake_x))
+            x, y = prev_x, prev_x - prev_k
+        if x > 0:
+            blocks.append((a0, b0, x))
+        return blocks
+
+
+DIFF_ENGINES: Dict[str, DiffEngine] = {
+    DifflibEngine.name: DifflibEngine(),
+    HistogramEngine.name: HistogramEngine(),
+}
+
+
+def get_diff_engine(name: Optional[str] = None) -> DiffEngine:
+    """Engine registered under `name` (default Config.DIFF_ENGINE)"""
+    name = name or Config.DIFF_ENGINE
+    try:
+        return DIFF_ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown diff engine '{name}', expected one of: {', '.join(DIFF_ENGINES)}")
@@ -0,0 +1,238 @@
+"""
+Generated / binary / vendored file classification.
+
+Runs before the diff and LLM stages so lockfiles, minified bundles, snapshots, vendored
+directories and binary blobs don't spend model time nobody wants. Signals, strongest first:
+.gitattributes (linguist-generated, linguist-vendored, binary / -diff), path patterns,
+a null byte in the first 8000 bytes (git's own binary check), then content heuristics:
+byte entropy, generated-file markers and minified line lengths.
+"""
+import math
+import posixpath
+import re
+from collections import Counter
+from fnmatch import fnmatchcase
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple, Union
+
+from ..config import Config
+from ..logger import logging
+from .git_mirror import get_mirror_manager, github_clone_url, use_mirror
+from .github_client import github_get, github_headers
+from .github_utils import parse_repo_url
+
+# How much of a file the content heuristics look at
+SAMPLE_BYTES = 8000
+# Minified / packed code: long lines on average, with at least one very long line
+MINIFIED_AVG_LINE = 200
+MINIFIED_MAX_LINE = 1000
+# Bits per byte: source code sits around 4.5-5.2, base64 around 6, compressed data near 8
+BINARY_ENTROPY = 7.0
+
+_GENERATED_MARKER = re.compile(r"@generated|\bDO NOT EDIT\b|\bCode generated\b|\b[Aa]uto-?generated\b")
+# Lines of a file's header searched for generated-file markers
+MARKER_HEADER_LINES = 5
+# First hunk of a patch that starts at line 1 of the new file
+_FIRST_LINES_HUNK = re.compile(r"^@@ -\d+(?:,\d+)? \+1(?:,\d+)? @@[^\n]*\n", re.MULTILINE)
+
+_PATH_RULES: List[Tuple[str, "re.Pattern", str]] = [
+    ("vendored", re.compile(r"(^|/)(vendor|node_modules|third_party|third-party|bower_components|"
+                            r"\.yarn|Pods|Carthage)/"), "vendored directory"),
+    ("generated", re.compile(r"(^|/)(package-lock\.json|npm-shrinkwrap\.json|yarn\.lock|pnpm-lock\.yaml|"
+                             r"Cargo\.lock|poetry\.lock|Pipfile\.lock|Gemfile\.lock|composer\.lock|go\.sum|"
+                             r"mix\.lock|pubspec\.lock|packages\.lock\.json|flake\.lock|uv\.lock)$"), "lockfile"),
+    ("generated", re.compile(r"\.min\.(js|css|mjs)$|(^|/)[^/]+[-.]bundle\.js$|\.js\.map$|\.css\.map$"),
+     "minified or bundled asset"),
+    ("generated", re.compile(r"(^|/)__snapshots__/|\.snap$"), "test snapshot"),
+    ("generated", re.compile(r"_pb2(_grpc)?\.pyi?$|\.pb\.(go|cc|h)$|\.pb\.gw\.go$|_generated\.\w+$|"
+                             r"\.generated\.\w+$|\.g\.dart$|\.designer\.cs$"), "generated source"),
+    ("generated", re.compile(r"(^|/)(dist|generated)/"), "build output directory"),
+    ("binary", re.compile(r"\.(png|jpe?g|gif|bmp|ico|webp|tiff?|psd|pdf|zip|gz|tgz|bz2|xz|7z|rar|jar|war|"
+                          r"whl|egg|exe|dll|so|dylib|a|o|class|pyc|wasm|woff2?|ttf|otf|eot|mp3|mp4|mov|avi|"
+                          r"ogg|wav|sqlite|db|bin)$", re.IGNORECASE), "binary file type"),
+]
+
+# .gitattributes attribute that sets (or, when unset, overrides) each category
+_CATEGORY_ATTRIBUTES = {
+    "generated": "linguist-generated",
+    "vendored": "linguist-vendored",
+    "binary": "binary",
+}
+
+
+class Classification(NamedTuple):
+    category: str
+    reason: str
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"category": self.category, "reason": self.reason}
+
+
+class GitAttributes:
+    """The linguist / binary attributes of a .gitattributes file (last matching line wins, as in git)"""
+
+    def __init__(self, rules: Optional[List[Tuple[str, Dict[str, bool]]]] = None):
+        self.rules = rules or []
+
+    @classmethod
+    def parse(cls, text: str) -> "GitAttributes":
+        rules = []
+        for line in text.splitlines():
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            attributes = {}
+            for field in fields[1:]:
+                if field.startswith("-"):
+                    attributes[field[1:]] = False
+                elif field.startswith("!"):
+                    attributes[field[1:]] = None
+                else:
+                    name, _, value = field.partition("=")
+                    attributes[name] = value.lower() not in ("false", "0")
+            # "-diff" marks content git won't diff: treat it like the binary macro
+            if attributes.get("diff") is False:
+                attributes.setdefault("binary", True)
+            if any(name in attributes for name in _CATEGORY_ATTRIBUTES.values()):
+                rules.append((fields[0], attributes))
+        return cls(rules)
+
+    @staticmethod
+    def _matches(pattern: str, path: str) -> bool:
+        if pattern.endswith("/"):
+            # A directory: everything below it, at any depth unless the pattern has another slash
+            directory = pattern.rstrip("/")
+            parents = path.split("/")[:-1]
+            if "/" not in directory:
+                return any(fnmatchcase(parent, directory) for parent in parents)
+            directory = directory.lstrip("/").replace("**/", "*")
+            return any(fnmatchcase("/".join(parents[:depth]), directory) for depth in range(1, len(parents) + 1))
+        if "/" not in pattern.rstrip("/"):
+            return fnmatchcase(posixpath.basename(path), pattern)
+        pattern = pattern.lstrip("/")
+        if pattern.endswith("/**"):
+            return path.startswith(pattern[:-2])
+        return fnmatchcase(path, pattern.replace("**/", "*"))
+
+    def lookup(self, path: str) -> Dict[str, Optional[bool]]:
+        """Attribute values set for `path`: True (set), False (unset) or None (unspecified)"""
+        values: Dict[str, Optional[bool]] = {}
+        for pattern, attributes in self.rules:
+            if self._matches(pattern, path):
+                values.update(attributes)
+        return values
+
+
+def load_gitattributes(repo_url: str, ref: str = "HEAD") -> GitAttributes:
+    """The repository's root .gitattributes at `ref`; empty when it has none or it can't be read"""
+    owner, repo = parse_repo_url(repo_url)
+    try:
+        if use_mirror(owner, repo):
+            try:
+                data = get_mirror_manager().read_file(github_clone_url(owner, repo), ref, ".gitattributes",
+                                                      with_commit_msg=False)["data"]
+            except FileNotFoundError:
+                return GitAttributes()
+            return GitAttributes.parse(data.decode("utf-8", errors="replace"))
+
+        response = github_get(f"{Config.GITHUB_RAW_URL}/{owner}/{repo}/{ref}/.gitattributes",
+                              headers=github_headers(accept=None), cache=True)
+        if response.status_code == 404:
+            return GitAttributes()
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}")
+        return GitAttributes.parse(response.text)
+    except Exception as e:
+        logging.warning(f"Could not read .gitattributes of {owner}/{repo}@{ref}, using path rules only: {e}")
+        return GitAttributes()
+
+
+def byte_entropy(data: bytes) -> float:
+    """Shannon entropy in bits per byte"""
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+
+def _patch_header(patch: str) -> str:
+    """The new file's first lines when the patch shows them (a hunk starting at line 1), else empty"""
+    match = _FIRST_LINES_HUNK.search(patch)
+    if match is None:
+        return ""
+    lines = []
+    for line in patch[match.end():].splitlines():
+        if line.startswith("@@") or len(lines) == MARKER_HEADER_LINES:
+            break
+        if not line.startswith("-"):
+            lines.append(line[1:])
+    return "\n".join(lines)
+
+
+def _classify_content(content: Union[str, bytes], patch: bool = False) -> Optional[Classification]:
+    if isinstance(content, str):
+        sample = content[:SAMPLE_BYTES].encode("utf-8", errors="replace")
+    else:
+        sample = content[:SAMPLE_BYTES]
+    if b"\0" in sample:
+        return Classification("binary", "contains null bytes")
+    entropy = byte_entropy(sample) if len(sample) >= 1024 else 0.0
+    if entropy >= BINARY_ENTROPY:
+        return Classification("binary", f"high byte entropy ({entropy:.1f} bits/byte)")
+
+    text = sample.decode("utf-8", errors="replace")
+    lines = text.splitlines()
+    # Markers only count in the file header: a patch line that merely mentions one does not
+    header = _patch_header(text) if patch else "\n".join(lines[:MARKER_HEADER_LINES])
+    if _GENERATED_MARKER.search(header):
+        return Classification("generated", "generated-file marker in header")
+    if lines and len(sample) >= MINIFIED_MAX_LINE:
+        longest = max(len(line) for line in lines)
+        if longest >= MINIFIED_MAX_LINE and len(text) / len(lines) >= MINIFIED_AVG_LINE:
+            return Classification("generated", f"minified content (lines up to {longest} chars)")
+    return None
+
+
+def classify_file(path: str, content: Union[str, bytes, None] = None,
+                  attributes: Optional[GitAttributes] = None, patch: bool = False) -> Optional[Classification]:
+    """
+    Category of a file that isn't hand-written source, or None for regular files.
+    With `patch`, `content` is a unified diff patch rather than the file itself.
+    """
+    path = path.lstrip("/")
+    explicit: Dict[str, Optional[bool]] = attributes.lookup(path) if attributes is not None else {}
+    for category, attribute in _CATEGORY_ATTRIBUTES.items():
+        if explicit.get(attribute):
+            return Classification(category, f"{attribute} in .gitattributes")
+
+    # An explicitly unset attribute ("-linguist-generated") overrides the heuristics for its category
+    def overridden(classification: Classification) -> bool:
+        return explicit.get(_CATEGORY_ATTRIBUTES[classification.category]) is False
+
+    for category, pattern, reason in _PATH_RULES:
+        if pattern.search(path) and not overridden(Classification(category, reason)):
+            return Classification(category, reason)
+
+    if content:
+        classification = _classify_content(content, patch)
+        if classification is not None and not overridden(classification):
+            return classification
+    return None
+
+
+def skipped_categories() -> List[str]:
+    """Categories whose files skip LLM analysis (Config.FILE_PREFILTER_SKIP)"""
+    return [category.strip() for category in Config.FILE_PREFILTER_SKIP.split(",") if category.strip()]
+
+
+def prefilter(path: str, content: Union[str, bytes, None] = None,
+              attributes: Optional[GitAttributes] = None, patch: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Classification of a tagged file as {category, reason, skipped}, where `skipped` says
+    whether it skips LLM analysis; None for regular files or when the prefilter is off.
+    """
+    if not Config.FILE_PREFILTER_ENABLED:
+        return None
+    classification = classify_file(path, content, attributes, patch)
+    if classification is None:
+        return None
+    return {**classification.as_dict(), "skipped": classification.category in skipped_categories()}
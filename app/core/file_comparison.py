@@ -1,18 +1,79 @@
 """
 File comparison utilities for comparing files from different repositories
 """
+import io
+import mmap
+import os
+import re
+import shutil
+import tempfile
 import requests
-import difflib
 import time
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple, Union
 from ..config import Config
 from ..logger import logging
+from .diff_chunker import DiffChunkPacker
+from .diff_engine import InternedLines, LineTable, get_diff_engine
+from .semantic_diff import semantic_diff
+from .blob_cache import get_blob_store, git_blob_sha, git_blob_sha_file
+from .git_mirror import get_mirror_manager, github_clone_url, use_mirror
+from .github_client import github_get, github_headers
 
+METADATA_MODES = ("none", "sha", "full")
 
-def fetch_file_from_raw_url(raw_url: str, ref: str = "HEAD") -> Dict[str, Any]:
+# Characters of unified diff text kept by compute_unified_diff
+MAX_DIFF_CHARS = 20000
+
+# Characters of a spilled file exposed through content_text() when no limit is given
+SPILLED_PREVIEW_CHARS = 20000
+
+
+def parse_raw_url(raw_url: str) -> Optional[Tuple[str, str, str, str]]:
     """
-    Fetch a file from a GitHub raw URL and return content with metadata
+    Split a raw URL into (owner, repo, branch, path).
+    raw URL format: https://raw.githubusercontent.com/owner/repo/branch/path
     """
+    parts = raw_url.replace("https://raw.githubusercontent.com/", "").split("/")
+    if len(parts) < 4:
+        return None
+    return parts[0], parts[1], parts[2], "/".join(parts[3:])
+
+
+def _lookup_blob_sha(owner: str, repo: str, branch: str, file_path: str, headers: Dict[str, str],
+                     priority: str = "low") -> Optional[str]:
+    """Blob SHA of the file through the contents API (https://api.github.com/repos/owner/repo/contents/path?ref=branch)"""
+    api_url = f"{Config.GITHUB_API_URL}/repos/{owner}/{repo}/contents/{file_path}"
+    api_response = github_get(api_url, headers=headers, params={"ref": branch}, cache=True, priority=priority)
+    if api_response.status_code != 200:
+        return None
+    return api_response.json().get("sha", None)
+
+
+def _lookup_last_commit_msg(owner: str, repo: str, file_path: str, headers: Dict[str, str]) -> Optional[str]:
+    """First line of the last commit message touching the file"""
+    commits_url = f"{Config.GITHUB_API_URL}/repos/{owner}/{repo}/commits"
+    commits_params = {"path": file_path, "per_page": 1}
+    commits_response = github_get(commits_url, headers=headers, params=commits_params, cache=True, priority="low")
+    if commits_response.status_code == 200:
+        commits = commits_response.json()
+        if commits:
+            return commits[0].get("commit", {}).get("message", "").split("\n")[0]
+    return None
+
+
+def fetch_file_from_raw_url(raw_url: str, ref: str = "HEAD", metadata: str = "full") -> Dict[str, Any]:
+    """
+    Fetch a file from a GitHub raw URL and return content with metadata.
+
+    metadata selects the extra GitHub lookups: "none" skips them, "sha" resolves the
+    blob SHA through the contents API, "full" also fetches the last commit message.
+    The lookups run concurrently with the download. When the blob store already holds
+    the blob with the looked-up SHA, the stored copy is used and the download is closed unread.
+    """
+    if metadata not in METADATA_MODES:
+        raise ValueError(f"metadata must be one of {', '.join(METADATA_MODES)}")
+
     result = {
         "raw_url": raw_url,
         "fetched": False,
@@ -26,92 +87,345 @@ def fetch_file_from_raw_url(raw_url: str, ref: str = "HEAD") -> Dict[str, Any]:
         "error": None
     }
     
+    executor = ThreadPoolExecutor(max_workers=3)
     try:
-        # Fetch the file content
-        headers = {}
-        if Config.GITHUB_TOKEN:
-            headers["Authorization"] = f"Bearer {Config.GITHUB_TOKEN}"
-        
-        response = requests.get(raw_url, headers=headers, timeout=30)
-        
-        if response.status_code != 200:
-            result["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
-            return result
-        
-        content = response.text
-        result["content"] = content
-        result["meta"]["size"] = len(content.encode('utf-8'))
+        headers = github_headers(accept=None)
+        location = parse_raw_url(raw_url)
+        if location is not None and use_mirror(location[0], location[1]):
+            try:
+                return _read_from_mirror(result, location, metadata)
+            except Exception as e:
+                logging.warning(f"Mirror read failed for {raw_url}, falling back to GitHub: {e}")
+
+        blob_store = get_blob_store()
+        sha_future = None
+        commit_msg_future = None
+
+        if location is not None and metadata != "none":
+            owner, repo, branch, file_path = location
+            # The SHA is on the critical path when it decides whether the download is used at all
+            sha_priority = "normal" if blob_store is not None else "low"
+            sha_future = executor.submit(_lookup_blob_sha, owner, repo, branch, file_path, headers, sha_priority)
+            if metadata == "full":
+                commit_msg_future = executor.submit(_lookup_last_commit_msg, owner, repo, file_path, headers)
+
+        # Streamed: only the headers are read until the SHA says whether the body is needed
+        download_future = executor.submit(github_get, raw_url, headers=headers, stream=True)
+
+        api_sha = _metadata_result(sha_future, raw_url)
+        result["meta"]["sha"] = api_sha
+
+        blob_path = blob_store.path_for(api_sha) if blob_store is not None and api_sha else None
+        if blob_path is not None:
+            result["meta"]["blob_cache"] = "hit"
+            download_future.add_done_callback(_close_download)
+            _load_blob(result, blob_path)
+        else:
+            # Fetch the file content, streamed and size capped
+            response = download_future.result()
+            try:
+                if response.status_code != 200:
+                    result["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
+                    return result
+                buffer = _download(response)
+            finally:
+                response.close()
+
+            if buffer.in_memory:
+                data = buffer.getvalue()
+                blob_sha = git_blob_sha(data)
+                result["content"] = data.decode("utf-8", errors="replace")
+            else:
+                blob_sha = git_blob_sha_file(buffer.path)
+                result["content_path"] = buffer.path
+                result["meta"]["spilled"] = True
+            result["meta"]["size"] = buffer.size
+            if result["meta"]["sha"] is None:
+                result["meta"]["sha"] = blob_sha
+            if blob_store is not None:
+                result["meta"]["blob_cache"] = "miss"
+                try:
+                    if buffer.in_memory:
+                        blob_store.put(blob_sha, data)
+                    else:
+                        blob_store.put_file(blob_sha, buffer.path)
+                except OSError as e:
+                    logging.warning(f"Could not store blob {blob_sha}: {e}")
+
         result["fetched"] = True
         
-        # Try to extract commit info from URL
-        # Convert raw URL to API URL to get commit info
-        try:
-            # raw URL format: https://raw.githubusercontent.com/owner/repo/branch/path
-            # API URL format: https://api.github.com/repos/owner/repo/contents/path?ref=branch
-            parts = raw_url.replace("https://raw.githubusercontent.com/", "").split("/")
-            if len(parts) >= 4:
-                owner = parts[0]
-                repo = parts[1]
-                branch = parts[2]
-                file_path = "/".join(parts[3:])
-                
-                api_url = f"https://api.github.com/repos/{owner}/{repo}/contents/{file_path}"
-                api_params = {"ref": branch}
-                
-                api_response = requests.get(api_url, headers=headers, params=api_params, timeout=10)
-                if api_response.status_code == 200:
-                    api_data = api_response.json()
-                    result["meta"]["sha"] = api_data.get("sha", None)
-                    
-                    # Try to get last commit message
-                    commits_url = f"https://api.github.com/repos/{owner}/{repo}/commits"
-                    commits_params = {"path": file_path, "per_page": 1}
-                    commits_response = requests.get(commits_url, headers=headers, params=commits_params, timeout=10)
-                    if commits_response.status_code == 200:
-                        commits = commits_response.json()
-                        if commits:
-                            result["meta"]["last_commit_msg"] = commits[0].get("commit", {}).get("message", "").split("\n")[0]
-        except Exception as e:
-            logging.warning(f"Could not fetch metadata for {raw_url}: {e}")
-            # Continue without metadata
+        # The commit lookup only counts when the contents API recognised the file
+        last_commit_msg = _metadata_result(commit_msg_future, raw_url)
+        if api_sha is not None:
+            result["meta"]["last_commit_msg"] = last_commit_msg
         
+    except FileTooLargeError as e:
+        result["error"] = str(e)
+        logging.warning(f"Rejected file {raw_url}: {e}")
     except requests.exceptions.RequestException as e:
         result["error"] = str(e)
         logging.error(f"Error fetching file {raw_url}: {e}")
     except Exception as e:
         result["error"] = str(e)
         logging.error(f"Unexpected error fetching file {raw_url}: {e}")
+    finally:
+        executor.shutdown(wait=False)
+        if not result["fetched"]:
+            release_content(result)
     
     return result
 
 
-def compute_unified_diff(file_a_content: str, file_b_content: str, file_a_name: str = "file_a", file_b_name: str = "file_b") -> Dict[str, Any]:
+class FileTooLargeError(Exception):
+    """Raised when a file exceeds Config.MAX_FILE_SIZE"""
+
+
+class _SpillBuffer:
+    """Collects a download in memory and moves it to a temp file once it passes `threshold` bytes"""
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.size = 0
+        self.path = None
+        self._memory = io.BytesIO()
+        self._file = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    def write(self, chunk: bytes):
+        if self._file is None and self.size + len(chunk) > self.threshold:
+            fd, self.path = tempfile.mkstemp(prefix="potpie-file-")
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._memory.getbuffer())
+            self._memory = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._memory.write(chunk)
+        self.size += len(chunk)
+
+    def finish(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        self.finish()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def getvalue(self) -> bytes:
+        return self._memory.getvalue()
+
+
+def _download(response: requests.Response, spill_threshold: Optional[int] = None) -> _SpillBuffer:
     """
-    Compute unified diff between two files
+    Stream a response body, rejecting it as soon as it is known to exceed MAX_FILE_SIZE.
+    Content-Length is only trusted when the body is not content-encoded (compressed length differs).
+    Bodies above `spill_threshold` (default FILE_SPILL_THRESHOLD) go to a temp file.
     """
-    lines_a = file_a_content.splitlines(keepends=True)
-    lines_b = file_b_content.splitlines(keepends=True)
+    max_size = Config.MAX_FILE_SIZE
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and not response.headers.get("Content-Encoding"):
+        if int(declared) > max_size:
+            raise FileTooLargeError(f"File is {declared} bytes, above the {max_size} byte limit (MAX_FILE_SIZE)")
+
+    buffer = _SpillBuffer(Config.FILE_SPILL_THRESHOLD if spill_threshold is None else spill_threshold)
+    try:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            buffer.write(chunk)
+            if buffer.size > max_size:
+                raise FileTooLargeError(f"File is larger than the {max_size} byte limit (MAX_FILE_SIZE)")
+        buffer.finish()
+    except BaseException:
+        buffer.discard()
+        raise
+    return buffer
+
+
+def download_raw(raw_url: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+    """Download a raw file into memory, enforcing MAX_FILE_SIZE"""
+    response = github_get(raw_url, headers=headers or github_headers(accept=None), stream=True)
+    try:
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}: {response.text[:200]}")
+        return _download(response, spill_threshold=Config.MAX_FILE_SIZE).getvalue()
+    finally:
+        response.close()
+
+
+def _load_blob(result: Dict[str, Any], blob_path: str):
+    """Fill `result` from a blob store file; large blobs stay on disk behind a private hard link"""
+    size = os.path.getsize(blob_path)
+    result["meta"]["size"] = size
+    if size <= Config.FILE_SPILL_THRESHOLD:
+        with open(blob_path, "rb") as f:
+            result["content"] = f.read().decode("utf-8", errors="replace")
+        return
+    # A private link keeps the content readable even if the store evicts the blob meanwhile
+    fd, private_path = tempfile.mkstemp(prefix="potpie-file-")
+    os.close(fd)
+    os.unlink(private_path)
+    try:
+        os.link(blob_path, private_path)
+    except OSError:
+        shutil.copyfile(blob_path, private_path)
+    result["content_path"] = private_path
+    result["meta"]["spilled"] = True
+
+
+# A line with its ending. Lines break on "\n" only, like mmap.readline() on spilled files, so a
+# file diffs the same on both paths ("\r\n" ends one line, a lone "\r" is not a break)
+_LINE = re.compile(r"[^\n]*\n|[^\n]+")
+
+
+def iter_content_lines(result: Dict[str, Any]) -> Iterator[str]:
+    """
+    Lines (with line endings) of a fetched file, one at a time, split on "\n". In-memory
+    content is matched lazily; spilled files are memory-mapped and read line by line.
+    """
+    if result.get("content_path") is None:
+        for match in _LINE.finditer(result.get("content") or ""):
+            yield match.group()
+        return
+    path = result["content_path"]
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for line in iter(mapped.readline, b""):
+            yield line.decode("utf-8", errors="replace")
+
+
+def content_lines(result: Dict[str, Any]) -> List[str]:
+    """
+    Lines (with line endings) of a fetched file. Spilled files are memory-mapped and
+    decoded line by line, so the whole file is never held as one decoded string.
+    """
+    return list(iter_content_lines(result))
+
+
+def intern_content(result: Dict[str, Any], table: LineTable) -> InternedLines:
+    """Encode a fetched file against a shared LineTable (4 bytes per line plus each distinct line once)"""
+    return table.encode(iter_content_lines(result))
+
+
+def content_text(result: Dict[str, Any], max_chars: Optional[int] = None) -> str:
+    """
+    Text of a fetched file. For spilled files only a prefix is read
+    (at most `max_chars` characters, default SPILLED_PREVIEW_CHARS).
+    """
+    if result.get("content_path") is None:
+        content = result.get("content") or ""
+        return content if max_chars is None else content[:max_chars]
+    max_chars = max_chars or SPILLED_PREVIEW_CHARS
+    with open(result["content_path"], "rb") as f:
+        # UTF-8 uses at most 4 bytes per character
+        return f.read(max_chars * 4).decode("utf-8", errors="replace")[:max_chars]
+
+
+def release_content(result: Dict[str, Any]):
+    """Drop the content of a fetched file and delete its spill file, if any"""
+    result["content"] = None
+    path = result.pop("content_path", None)
+    if path is not None and os.path.exists(path):
+        os.unlink(path)
+
+
+def _read_from_mirror(result: Dict[str, Any], location: Tuple[str, str, str, str], metadata: str) -> Dict[str, Any]:
+    """Fill `result` from the local bare mirror instead of the GitHub API"""
+    owner, repo, branch, file_path = location
+    blob = get_mirror_manager().read_file(
+        github_clone_url(owner, repo), branch, file_path, with_commit_msg=metadata == "full"
+    )
+    result["content"] = blob["data"].decode("utf-8", errors="replace")
+    result["meta"]["size"] = len(blob["data"])
+    result["meta"]["sha"] = blob["sha"]
+    result["meta"]["last_commit_msg"] = blob["last_commit_msg"]
+    result["meta"]["source"] = "mirror"
+    result["fetched"] = True
+    return result
+
+
+def _close_download(future):
+    """Close a download that is no longer needed, once its request has completed"""
+    if future.exception() is None:
+        future.result().close()
+
+
+def _metadata_result(future, raw_url: str):
+    """Result of a metadata lookup; failures are logged and treated as missing metadata"""
+    if future is None:
+        return None
+    try:
+        return future.result()
+    except Exception as e:
+        logging.warning(f"Could not fetch metadata for {raw_url}: {e}")
+        # Continue without metadata
+        return None
+
+
+def compute_unified_diff(file_a_content: Union[str, Sequence[str]], file_b_content: Union[str, Sequence[str]],
+                         file_a_name: str = "file_a", file_b_name: str = "file_b",
+                         engine: Optional[str] = None, max_chars: int = MAX_DIFF_CHARS,
+                         semantic: bool = False, chunk_tokens: Optional[int] = None,
+                         max_chunks: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compute unified diff between two files.
+    Contents may be strings or already split lines (see content_lines).
+    `engine` names a diff engine from diff_engine.DIFF_ENGINES (default Config.DIFF_ENGINE).
+    With `semantic`, the result also carries the symbol-level diff of file B's language
+    under "semantic_diff" (None when no parser handles it, see semantic_diff.py).
+    With `chunk_tokens`, the whole diff (not just the `max_chars` prefix) is also packed into
+    hunk-aligned LLM chunks: at most `max_chunks` under "diff_chunks", the rest counted in
+    "diff_chunks_skipped".
+
+    The diff is consumed as a stream in a single pass: lines are counted as they are
+    generated and text stops accumulating once `max_chars` is reached, so memory is
+    bounded by the output budget rather than by the size of the diff.
+    """
+    lines_a = _LINE.findall(file_a_content) if isinstance(file_a_content, str) else file_a_content
+    lines_b = _LINE.findall(file_b_content) if isinstance(file_b_content, str) else file_b_content
     
-    diff = list(difflib.unified_diff(
+    diff = get_diff_engine(engine).unified_diff(
         lines_a, lines_b,
         fromfile=file_a_name,
         tofile=file_b_name,
         lineterm=''
-    ))
+    )
     
-    unified_diff_text = ''.join(diff)
+    packer = DiffChunkPacker(chunk_tokens, max_chunks) if chunk_tokens else None
+    added = removed = 0
+    parts = []
+    length = 0
+    truncated = False
+    for line in diff:
+        if packer is not None:
+            packer.add_line(line)
+        # Count changes
+        if line.startswith('+'):
+            if not line.startswith('+++'):
+                added += 1
+        elif line.startswith('-') and not line.startswith('---'):
+            removed += 1
+        
+        # Keep text only up to the budget, but keep counting
+        if truncated:
+            continue
+        if length + len(line) > max_chars:
+            parts.append(line[:max_chars - length])
+            truncated = True
+        else:
+            parts.append(line)
+            length += len(line)
     
-    # Count changes
-    added = sum(1 for line in diff if line.startswith('+') and not line.startswith('+++'))
-    removed = sum(1 for line in diff if line.startswith('-') and not line.startswith('---'))
+    unified_diff_text = ''.join(parts)
+    if truncated:
+        unified_diff_text += "\n... (truncated)"
     modified = min(added, removed)  # Approximate
     
-    # Truncate if too long
-    max_diff_length = 20000
-    if len(unified_diff_text) > max_diff_length:
-        unified_diff_text = unified_diff_text[:max_diff_length] + "\n... (truncated)"
-    
-    return {
+    result = {
         "unified_diff": unified_diff_text,
         "summary_lines_changed": {
             "added": added,
@@ -119,4 +433,9 @@ def compute_unified_diff(file_a_content: str, file_b_content: str, file_a_name:
             "modified": modified
         }
     }
-
+    if semantic:
+        result["semantic_diff"] = semantic_diff(lines_a, lines_b, file_b_name)
+    if packer is not None:
+        result["diff_chunks"] = packer.finish()
+        result["diff_chunks_skipped"] = packer.skipped
+    return result
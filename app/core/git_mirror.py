@@ -0,0 +1,285 @@
+"""
+Local bare-mirror git backend.
+
+Keeps `git clone --mirror` copies of frequently analyzed repositories on local disk
+and refreshes them with incremental `git fetch`. PR diffs, per-commit patches and
+file contents are then computed locally: no rate limits, no patch truncation, and
+disk speed instead of one HTTP round trip per commit or file.
+
+GitHub publishes every PR head as refs/pull/<n>/head, which a mirror clone fetches.
+The PR base is the merge base of that head with the PR's base branch: the first parent
+of refs/pull/<n>/merge while the PR is open, else the PR's base.sha from the API
+(merged and closed PRs), else the mirror's default branch (HEAD).
+
+GitPython (and fcntl) are imported where they are used: GitPython fails at import time
+when there is no git executable, which must not stop the rest backends from working.
+"""
+import hashlib
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional, Tuple
+
+from ..config import Config
+from ..logger import logging
+from .github_client import github_get, github_headers
+
+if TYPE_CHECKING:
+    import git
+
+_FETCH_MARKER = "last_fetch"
+
+
+def _patch_text(diff: "git.Diff") -> str:
+    patch = diff.diff or b""
+    if isinstance(patch, bytes):
+        patch = patch.decode("utf-8", errors="replace")
+    if patch.startswith("Binary files"):
+        return ""
+    return patch
+
+
+def _patch_stats(patch: str) -> Tuple[int, int]:
+    additions = deletions = 0
+    for line in patch.splitlines():
+        if line.startswith("+") and not line.startswith("+++"):
+            additions += 1
+        elif line.startswith("-") and not line.startswith("---"):
+            deletions += 1
+    return additions, deletions
+
+
+def _file_entry(diff: "git.Diff") -> Dict[str, Any]:
+    """A changed file in the same shape as the GitHub REST `files` entries"""
+    if diff.new_file:
+        status = "added"
+    elif diff.deleted_file:
+        status = "removed"
+    elif diff.renamed_file:
+        status = "renamed"
+    else:
+        status = "modified"
+    patch = _patch_text(diff)
+    additions, deletions = _patch_stats(patch)
+    return {
+        "filename": diff.b_path or diff.a_path,
+        "status": status,
+        "additions": additions,
+        "deletions": deletions,
+        "patch": patch,
+    }
+
+
+class MirrorManager:
+    def __init__(self, root: str, refresh_seconds: int = 60):
+        self.root = root
+        self.refresh_seconds = refresh_seconds
+        os.makedirs(root, exist_ok=True)
+
+    def mirror_path(self, repo_url: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", repo_url.rstrip("/").split("://")[-1])[-80:]
+        digest = hashlib.sha256(repo_url.encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.root, f"{name}-{digest}.git")
+
+    @contextmanager
+    def _locked(self, path: str):
+        """Serialize clone/fetch of one mirror across threads and worker processes"""
+        import fcntl
+        with open(f"{path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _auth_env(repo_url: str) -> Optional[Dict[str, str]]:
+        """
+        Environment carrying the GitHub token as an http.extraHeader for one git command
+        (GIT_CONFIG_* variables, git 2.31+): unlike clone --config, nothing is written to the
+        mirror's config, and unlike `git -c` the token doesn't show up in process listings.
+        """
+        if Config.GITHUB_TOKEN and repo_url.startswith("https://github.com/"):
+            return {
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": "http.extraHeader",
+                "GIT_CONFIG_VALUE_0": f"Authorization: Bearer {Config.GITHUB_TOKEN}",
+            }
+        return None
+
+    def _last_fetch(self, path: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(path, _FETCH_MARKER))
+        except OSError:
+            return 0.0
+
+    def _mark_fetched(self, path: str):
+        with open(os.path.join(path, _FETCH_MARKER), "w") as marker:
+            marker.write(str(time.time()))
+
+    def ensure(self, repo_url: str, refresh: Optional[bool] = None) -> "git.Repo":
+        """
+        Return the mirror for `repo_url`, cloning it on first use.
+        Existing mirrors are fetched incrementally when older than refresh_seconds
+        (refresh=True forces a fetch, refresh=False never fetches).
+        """
+        import git
+        path = self.mirror_path(repo_url)
+        with self._locked(path):
+            if not os.path.isdir(path):
+                started = time.monotonic()
+                repo = git.Repo.clone_from(repo_url, path, mirror=True, env=self._auth_env(repo_url))
+                self._mark_fetched(path)
+                logging.info(f"Cloned mirror of {repo_url} in {time.monotonic() - started:.2f}s")
+                return repo
+
+            repo = git.Repo(path)
+            stale = time.time() - self._last_fetch(path) >= self.refresh_seconds
+            if refresh or (refresh is None and stale):
+                started = time.monotonic()
+                repo.git.fetch("--prune", "origin", env=self._auth_env(repo_url))
+                self._mark_fetched(path)
+                logging.info(f"Fetched mirror of {repo_url} in {time.monotonic() - started:.2f}s")
+            return repo
+
+    @staticmethod
+    def _api_base_sha(repo_url: str, pr_number: int) -> Optional[str]:
+        """base.sha of a GitHub PR, or None (not a GitHub repository, or the lookup failed)"""
+        if not repo_url.startswith("https://github.com/"):
+            return None
+        owner, name = repo_url.rstrip("/").split("/")[-2:]
+        try:
+            response = github_get(f"{Config.GITHUB_API_URL}/repos/{owner}/{name}/pulls/{pr_number}",
+                                  headers=github_headers(), cache=True)
+            if response.status_code != 200:
+                return None
+            return response.json()["base"]["sha"]
+        except Exception as e:
+            logging.warning(f"Could not look up the base of PR #{pr_number} in {repo_url}: {e}")
+            return None
+
+    def _base_branch_commit(self, repo: "git.Repo", repo_url: str, pr_number: int) -> Tuple["git.Commit", str]:
+        """A commit of the PR's base branch (and where it came from)"""
+        import git
+        try:
+            # GitHub's test merge of an open PR: its first parent is the base branch tip
+            return repo.commit(f"refs/pull/{pr_number}/merge").parents[0], "merge ref"
+        except (git.BadName, ValueError, IndexError):
+            pass
+        base_sha = self._api_base_sha(repo_url, pr_number)
+        if base_sha:
+            try:
+                return repo.commit(base_sha), "base.sha"
+            except (git.BadName, ValueError):
+                logging.warning(f"Base {base_sha} of PR #{pr_number} is not in the mirror of {repo_url}")
+        return repo.commit("HEAD"), "default branch"
+
+    def _resolve_pr(self, repo: "git.Repo", repo_url: str, pr_number: int) -> Tuple["git.Commit", "git.Commit"]:
+        import git
+        try:
+            head = repo.commit(f"refs/pull/{pr_number}/head")
+        except (git.BadName, ValueError):
+            raise Exception(f"Pull Request #{pr_number} not found in mirror.")
+        base_branch, source = self._base_branch_commit(repo, repo_url, pr_number)
+        merge_bases = repo.merge_base(head, base_branch)
+        if not merge_bases:
+            raise Exception(f"Pull Request #{pr_number} has no common history with its base ({source}).")
+        return merge_bases[0], head
+
+    def iter_pr_commits(self, repo_url: str, pr_number: int, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield PR commits oldest first with per-commit patches, like github_utils.iter_pr_commits"""
+        import git
+        repo = self.ensure(repo_url)
+        base, head = self._resolve_pr(repo, repo_url, pr_number)
+        commits = repo.iter_commits(f"{base.hexsha}..{head.hexsha}", reverse=True)
+        for count, commit in enumerate(commits, 1):
+            if limit and count > limit:
+                break
+            if commit.parents:
+                diffs = commit.parents[0].diff(commit, create_patch=True)
+            else:
+                # Root commit: GitPython reports diff(NULL_TREE) from the commit's side
+                diffs = commit.diff(git.NULL_TREE, create_patch=True)
+            yield {
+                "sha": commit.hexsha[:7],
+                "full_sha": commit.hexsha,
+                "message": commit.message,
+                "author": commit.author.name,
+                "date": commit.authored_datetime.isoformat(),
+                "files": [_file_entry(diff) for diff in diffs],
+            }
+
+    def iter_pr_files(self, repo_url: str, pr_number: int) -> Iterator[Dict[str, Any]]:
+        """Yield the PR's net changes (base...head) like github_utils.iter_pr_files"""
+        repo = self.ensure(repo_url)
+        base, head = self._resolve_pr(repo, repo_url, pr_number)
+        for diff in base.diff(head, create_patch=True):
+            entry = _file_entry(diff)
+            yield {"filename": entry["filename"], "content": entry["patch"]}
+
+    def read_file(self, repo_url: str, ref: str, path: str, with_commit_msg: bool = True) -> Dict[str, Any]:
+        """Content, blob SHA and last commit message of `path` at `ref`"""
+        repo = self.ensure(repo_url)
+        commit = repo.commit(ref)
+        try:
+            blob = commit.tree / path
+        except KeyError:
+            raise FileNotFoundError(f"{path} not found at {ref}")
+        last_commit_msg = None
+        if with_commit_msg:
+            last_commit = next(repo.iter_commits(commit, paths=path, max_count=1), None)
+            if last_commit is not None:
+                last_commit_msg = last_commit.message.split("\n")[0]
+        return {
+            "data": blob.data_stream.read(),
+            "sha": blob.hexsha,
+            "last_commit_msg": last_commit_msg,
+        }
+
+    def list_tree(self, repo_url: str, ref: str, prefix: str = "") -> Dict[str, str]:
+        """Blob SHA of every file under `prefix` at `ref`, keyed by path relative to `prefix`"""
+        import git
+        repo = self.ensure(repo_url)
+        tree = repo.commit(ref).tree
+        prefix = prefix.strip("/")
+        if prefix:
+            try:
+                tree = tree / prefix
+            except KeyError:
+                raise FileNotFoundError(f"{prefix} not found at {ref}")
+            if not isinstance(tree, git.Tree):
+                raise NotADirectoryError(f"{prefix} is not a directory at {ref}")
+        return {
+            os.path.relpath(item.path, prefix) if prefix else item.path: item.hexsha
+            for item in tree.traverse()
+            if item.type == "blob"
+        }
+
+    def read_blob(self, repo_url: str, sha: str) -> bytes:
+        """Content of a blob by SHA (the mirror is not refreshed)"""
+        repo = self.ensure(repo_url, refresh=False)
+        return repo.odb.stream(bytes.fromhex(sha)).read()
+
+
+_manager: Optional[MirrorManager] = None
+
+
+def get_mirror_manager() -> MirrorManager:
+    global _manager
+    if _manager is None:
+        _manager = MirrorManager(Config.GIT_MIRROR_DIR, Config.GIT_MIRROR_REFRESH_SECONDS)
+    return _manager
+
+
+def mirrored_repos() -> List[str]:
+    return [name.strip().lower() for name in Config.GIT_MIRROR_REPOS.split(",") if name.strip()]
+
+
+def use_mirror(owner: str, repo: str) -> bool:
+    """Whether owner/repo is served from a local mirror (listed in GIT_MIRROR_REPOS, or GITHUB_BACKEND=mirror)"""
+    return Config.GITHUB_BACKEND == "mirror" or f"{owner}/{repo}".lower() in mirrored_repos()
+
+
+def github_clone_url(owner: str, repo: str) -> str:
+    return f"https://github.com/{owner}/{repo}"
@@ -0,0 +1,138 @@
+"""
+Conditional-request (ETag / Last-Modified) cache for GitHub API responses.
+
+Bodies are stored in Redis together with their validators, with an in-process LRU
+in front (bounded by entries and bytes) that also keeps the parsed JSON. Revalidation sends If-None-Match /
+If-Modified-Since; a 304 is answered from the cache and does not count against
+the GitHub rate limit.
+"""
+import hashlib
+import json
+from typing import Dict, Any, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from ..config import Config
+from ..logger import logging
+from .cache import LRUCache, get_cache_redis, mark_redis_unavailable
+
+# Response headers worth replaying from a cached entry (Link is needed for pagination)
+_KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    # The body, and roughly as much again for the parsed JSON kept on the entry after a hit
+    return 2 * len(entry.get("body", "")) + 256
+
+
+class CachedResponse(requests.Response):
+    """A response rebuilt from the cache; json() returns the already-parsed body (treat it as read-only)"""
+
+    def __init__(self, entry: Dict[str, Any]):
+        super().__init__()
+        self.from_cache = True
+        self._entry = entry
+
+    def json(self, **kwargs):
+        # The parsed body lives on the LRU entry so the next hit skips json.loads as well
+        if "_parsed" not in self._entry:
+            self._entry["_parsed"] = super().json(**kwargs)
+        return self._entry["_parsed"]
+
+
+class GitHubResponseCache:
+    def __init__(self, max_entries: int, ttl: int, namespace: str = "github:etag",
+                 max_bytes: Optional[int] = None):
+        self.lru = LRUCache(max_entries=max_entries, max_bytes=max_bytes, sizeof=_entry_size)
+        self.ttl = ttl
+        self.namespace = namespace
+
+    def make_key(self, url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]]) -> str:
+        # The token is part of the key: different tokens may see different content
+        raw = json.dumps({
+            "url": url,
+            "params": sorted((params or {}).items()),
+            "accept": headers.get("Accept", ""),
+            "auth": hashlib.sha256(headers.get("Authorization", "").encode("utf-8")).hexdigest()[:16],
+        }, default=str)
+        return f"{self.namespace}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.lru.get(key)
+        if entry is not None:
+            return entry
+        client = get_cache_redis()
+        if client is None:
+            return None
+        try:
+            raw = client.get(key)
+        except Exception as e:
+            mark_redis_unavailable(e)
+            return None
+        if not raw:
+            return None
+        entry = json.loads(raw)
+        self.lru.set(key, entry)
+        return entry
+
+    def store(self, key: str, response: requests.Response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        entry = {
+            "url": response.url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "headers": {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers},
+            "body": response.text,
+        }
+        self.lru.set(key, entry)
+        client = get_cache_redis()
+        if client is None:
+            return
+        try:
+            client.set(key, json.dumps(entry), ex=self.ttl)
+        except Exception as e:
+            mark_redis_unavailable(e)
+
+    @staticmethod
+    def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def build_response(entry: Dict[str, Any], not_modified: requests.Response) -> CachedResponse:
+        response = CachedResponse(entry)
+        response.status_code = 200
+        response.url = entry["url"]
+        response.encoding = "utf-8"
+        response._content = entry["body"].encode("utf-8")
+        headers = CaseInsensitiveDict(entry["headers"])
+        # Keep fresh rate-limit and validator headers from the 304
+        headers.update(not_modified.headers)
+        headers.pop("Content-Length", None)
+        response.headers = headers
+        response.request = not_modified.request
+        response.elapsed = not_modified.elapsed
+        return response
+
+
+_cache: Optional[GitHubResponseCache] = None
+
+
+def get_response_cache() -> Optional[GitHubResponseCache]:
+    global _cache
+    if not Config.GITHUB_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = GitHubResponseCache(Config.GITHUB_CACHE_LRU_SIZE, Config.GITHUB_CACHE_TTL,
+                                     max_bytes=Config.GITHUB_CACHE_LRU_BYTES)
+        logging.info(f"GitHub response cache enabled (lru={Config.GITHUB_CACHE_LRU_SIZE} entries / "
+                     f"{Config.GITHUB_CACHE_LRU_BYTES} bytes, ttl={Config.GITHUB_CACHE_TTL}s)")
+    return _cache
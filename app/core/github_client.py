@@ -0,0 +1,220 @@
+"""
+Shared, pooled HTTP client for all GitHub calls made by a worker process
+"""
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from ..config import Config
+from ..logger import logging
+from .github_cache import get_response_cache
+from .github_ratelimit import get_scheduler
+
+
+class PoolStats:
+    """Thread-safe connection pool counters for the current worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.hits = 0
+            self.new_connections = 0
+            self.wait_seconds = 0.0
+
+    def record_checkout(self, reused: bool, waited: float):
+        with self._lock:
+            if reused:
+                self.hits += 1
+            else:
+                self.new_connections += 1
+            self.wait_seconds += waited
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "requests": self.requests,
+                "hits": self.hits,
+                "new_connections": self.new_connections,
+                "wait_seconds": round(self.wait_seconds, 4),
+            }
+
+
+_pool_stats = PoolStats()
+
+
+class _InstrumentedPoolMixin:
+    """Records whether a checked-out connection is reused and how long we waited for it"""
+
+    def _get_conn(self, timeout=None):
+        started = time.monotonic()
+        conn = super()._get_conn(timeout=timeout)
+        # A connection without a socket will perform a fresh TCP (+TLS) handshake
+        reused = getattr(conn, "sock", None) is not None
+        _pool_stats.record_checkout(reused, time.monotonic() - started)
+        return conn
+
+
+class _InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _InstrumentedHTTPConnectionPool,
+            "https": _InstrumentedHTTPSConnectionPool,
+        }
+
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=Config.GITHUB_MAX_RETRIES,
+        connect=Config.GITHUB_MAX_RETRIES,
+        read=Config.GITHUB_MAX_RETRIES,
+        status=Config.GITHUB_MAX_RETRIES,
+        backoff_factor=Config.GITHUB_RETRY_BACKOFF,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = _PooledAdapter(
+        pool_connections=Config.GITHUB_POOL_CONNECTIONS,
+        pool_maxsize=Config.GITHUB_POOL_MAXSIZE,
+        pool_block=Config.GITHUB_POOL_BLOCK,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide GitHub session.
+    The session is rebuilt after a fork so prefork Celery children never share sockets.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                if _session_pid is not None:
+                    # Forked child: counters inherited from the parent are not ours
+                    _pool_stats.reset()
+                _session = _build_session()
+                _session_pid = pid
+                logging.info(
+                    f"Created GitHub HTTP session for pid {pid} "
+                    f"(pool_maxsize={Config.GITHUB_POOL_MAXSIZE}, retries={Config.GITHUB_MAX_RETRIES})"
+                )
+    return _session
+
+
+def github_headers(accept: str = "application/vnd.github.v3+json") -> Dict[str, str]:
+    """Default headers for GitHub requests, including auth when a token is configured"""
+    headers = {}
+    if accept:
+        headers["Accept"] = accept
+    if Config.GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {Config.GITHUB_TOKEN}"
+    return headers
+
+
+def github_get(url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, Any]] = None,
+               timeout=None, cache: bool = False, priority: str = "normal", **kwargs) -> requests.Response:
+    """
+    GET a GitHub URL through the pooled session.
+    Every call carries a (connect, read) timeout; 5xx responses and connection resets are retried with backoff.
+    With cache=True the request is revalidated against the ETag cache and a 304 is served from it.
+    Requests are scheduled against the shared rate-limit budget at the given priority (high, normal, low).
+    """
+    scheduler = get_scheduler()
+    scheduler.acquire(url, priority)
+    response = _send(url, headers, params, timeout, cache, **kwargs)
+    scheduler.record(response)
+    if scheduler.wait_for_reset(response):
+        # Hand the connection back to the pool (a streamed response is otherwise never read)
+        response.close()
+        response = _send(url, headers, params, timeout, cache, **kwargs)
+        scheduler.record(response)
+    return response
+
+
+def _send(url: str, headers: Optional[Dict[str, str]], params: Optional[Dict[str, Any]],
+          timeout, cache: bool, **kwargs) -> requests.Response:
+    if headers is None:
+        headers = github_headers()
+    if timeout is None:
+        timeout = (Config.GITHUB_CONNECT_TIMEOUT, Config.GITHUB_READ_TIMEOUT)
+    session = get_session()
+
+    response_cache = get_response_cache() if cache and not kwargs.get("stream") else None
+    if response_cache is None:
+        _pool_stats.record_request()
+        return session.get(url, headers=headers, params=params, timeout=timeout, **kwargs)
+
+    key = response_cache.make_key(url, headers, params)
+    entry = response_cache.lookup(key)
+    request_headers = dict(headers)
+    if entry is not None:
+        request_headers.update(response_cache.conditional_headers(entry))
+
+    _pool_stats.record_request()
+    response = session.get(url, headers=request_headers, params=params, timeout=timeout, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        return response_cache.build_response(entry, response)
+    if response.status_code == 200:
+        response_cache.store(key, response)
+    return response
+
+
+def github_post(url: str, json: Any = None, headers: Optional[Dict[str, str]] = None,
+                timeout=None, priority: str = "normal", **kwargs) -> requests.Response:
+    """POST to GitHub (e.g. GraphQL queries) through the pooled session and the rate-limit scheduler"""
+    if headers is None:
+        headers = github_headers()
+    if timeout is None:
+        timeout = (Config.GITHUB_CONNECT_TIMEOUT, Config.GITHUB_READ_TIMEOUT)
+    scheduler = get_scheduler()
+    scheduler.acquire(url, priority)
+    session = get_session()
+    _pool_stats.record_request()
+    response = session.post(url, json=json, headers=headers, timeout=timeout, **kwargs)
+    scheduler.record(response)
+    if scheduler.wait_for_reset(response):
+        response.close()
+        _pool_stats.record_request()
+        response = session.post(url, json=json, headers=headers, timeout=timeout, **kwargs)
+        scheduler.record(response)
+    return response
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Connection pool statistics for this worker process"""
+    return _pool_stats.snapshot()
@@ -0,0 +1,158 @@
+"""
+GraphQL backend for PR analysis.
+
+One query returns the PR head/base and its commit list (paged 100 at a time when the
+PR is larger). Patch bodies are not available through GraphQL, so the changed files
+come from the paginated REST `/pulls/{n}/files` listing alone, i.e. 1 + ceil(files / 100)
+requests instead of 2 + N per-commit calls.
+
+Unlike the rest and mirror backends, this one does not analyze commit by commit:
+GitHub's GraphQL API has no per-commit file lists, so the PR's net change is reported
+as a single entry whose `commits` field lists the PR commits. The commit limit
+(ANALYZE_COMMIT_LIMIT) only bounds that list; the files always cover the whole PR.
+"""
+from typing import Dict, Any, Iterator, List, Optional
+
+from ..config import Config
+from ..logger import logging
+from .github_client import github_post, github_headers
+from .github_utils import parse_repo_url, iter_github_pages
+
+PR_QUERY = """
+query($owner: String!, $name: String!, $number: Int!,
+      $commitsFirst: Int!, $commitsAfter: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      title
+      createdAt
+      headRefOid
+      baseRefOid
+      author { login }
+      commits(first: $commitsFirst, after: $commitsAfter) {
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          commit {
+            oid
+            message
+            additions
+            deletions
+            changedFilesIfAvailable
+            author { name date }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+_PAGE_SIZE = 100
+
+
+def graphql_query(query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a GraphQL query and return its `data`, raising on HTTP or GraphQL errors"""
+    response = github_post(Config.GITHUB_GRAPHQL_URL, json={"query": query, "variables": variables},
+                           headers=github_headers(accept="application/json"))
+    if response.status_code != 200:
+        raise Exception(f"GitHub GraphQL Error: {response.status_code} - {response.text}")
+    payload = response.json()
+    if payload.get("errors"):
+        messages = "; ".join(error.get("message", str(error)) for error in payload["errors"])
+        raise Exception(f"GitHub GraphQL Error: {messages}")
+    return payload.get("data") or {}
+
+
+def fetch_pr_graphql(repo_url: str, pr_number: int, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Fetch PR metadata and up to `limit` commits (all when None).
+    Each additional round trip is only made for PRs with more than 100 commits.
+    """
+    owner, repo = parse_repo_url(repo_url)
+    variables = {
+        "owner": owner,
+        "name": repo,
+        "number": pr_number,
+        "commitsFirst": min(limit, _PAGE_SIZE) if limit else _PAGE_SIZE,
+        "commitsAfter": None,
+    }
+    pr_info = None
+    commits: List[Dict[str, Any]] = []
+    round_trips = 0
+    more = True
+
+    while more:
+        data = graphql_query(PR_QUERY, variables)
+        round_trips += 1
+        pull_request = (data.get("repository") or {}).get("pullRequest")
+        if pull_request is None:
+            raise Exception(f"Pull Request #{pr_number} not found for repository {owner}/{repo}.")
+        if pr_info is None:
+            pr_info = pull_request
+
+        connection = pull_request["commits"]
+        commits.extend(node["commit"] for node in connection["nodes"])
+        more = connection["pageInfo"]["hasNextPage"] and not (limit and len(commits) >= limit)
+        variables["commitsAfter"] = connection["pageInfo"]["endCursor"]
+
+    if limit:
+        commits = commits[:limit]
+    logging.info(f"GraphQL fetched PR #{pr_number}: {len(commits)} commits in {round_trips} queries")
+    return {"pull_request": pr_info, "commits": commits}
+
+
+def _fetch_files(owner: str, repo: str, pr_number: int) -> List[Dict[str, Any]]:
+    """Every file in the PR with its stats and patch, from the paginated REST listing"""
+    url = f"{Config.GITHUB_API_URL}/repos/{owner}/{repo}/pulls/{pr_number}/files"
+    return [
+        {
+            "filename": file.get("filename", ""),
+            "status": file.get("status", ""),
+            "additions": file.get("additions", 0),
+            "deletions": file.get("deletions", 0),
+            "patch": file.get("patch", "")
+        }
+        for file in iter_github_pages(url, github_headers(), params={"per_page": _PAGE_SIZE})
+    ]
+
+
+def iter_pr_changes_graphql(repo_url: str, pr_number: int, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the PR's net change in the same shape as a REST commit entry (see iter_pr_commits);
+    `limit` bounds the listed commits, not the files
+    """
+    try:
+        owner, repo = parse_repo_url(repo_url)
+        pr = fetch_pr_graphql(repo_url, pr_number, limit)
+        files = _fetch_files(owner, repo, pr_number)
+        if not files:
+            return
+        pull_request = pr["pull_request"]
+
+        yield {
+            "sha": (pull_request.get("headRefOid") or "")[:7],
+            "full_sha": pull_request.get("headRefOid") or "",
+            "base_sha": (pull_request.get("baseRefOid") or "")[:7],
+            "message": pull_request.get("title", ""),
+            "author": (pull_request.get("author") or {}).get("login", ""),
+            "date": pull_request.get("createdAt", ""),
+            "commits": [
+                {
+                    "sha": commit["oid"][:7],
+                    "message": commit.get("message", ""),
+                    "author": (commit.get("author") or {}).get("name", ""),
+                    "date": (commit.get("author") or {}).get("date", ""),
+                    "additions": commit.get("additions", 0),
+                    "deletions": commit.get("deletions", 0),
+                    "changed_files": commit.get("changedFilesIfAvailable"),
+                }
+                for commit in pr["commits"]
+            ],
+            "files": files
+        }
+
+    except ValueError as ve:
+        logging.error(f"GitHub API Request Error: {ve}")
+        raise Exception(f"URL Parsing Error: {ve}")
+    except Exception as e:
+        logging.error(f"GitHub API Request Error: {e}")
+        raise Exception(f"GitHub Fetch Error: {e}")
@@ -0,0 +1,225 @@
+"""
+Cluster-wide GitHub rate-limit scheduler.
+
+Every GitHub API response updates a shared budget in Redis (X-RateLimit-Limit /
+Remaining / Reset, tracked per token and per resource). Before each request a
+worker reserves one unit of that budget; when the remaining budget drops into the
+reserve kept for higher priorities, the request waits for the window reset instead
+of failing with a 403. Low-priority fetches (metadata lookups) therefore yield to
+normal and high-priority ones as the budget runs out.
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse
+
+from ..config import Config
+from ..logger import logging
+from .cache import get_cache_redis, mark_redis_unavailable
+
+PRIORITIES = ("high", "normal", "low")
+
+_ACQUIRE_SCRIPT = """
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit'))
+local remaining = tonumber(redis.call('HGET', KEYS[1], 'remaining'))
+local reset = tonumber(redis.call('HGET', KEYS[1], 'reset'))
+local now = tonumber(ARGV[1])
+if not limit or not remaining or not reset or now >= reset then
+    return 0
+end
+if remaining > math.floor(limit * tonumber(ARGV[2])) then
+    redis.call('HINCRBY', KEYS[1], 'remaining', -1)
+    return 0
+end
+return math.max(1, reset - now)
+"""
+
+_RECORD_SCRIPT = """
+local remaining = tonumber(ARGV[2])
+local reset = tonumber(ARGV[3])
+local stored_reset = tonumber(redis.call('HGET', KEYS[1], 'reset'))
+local stored_remaining = tonumber(redis.call('HGET', KEYS[1], 'remaining'))
+if stored_reset == reset and stored_remaining and stored_remaining < remaining then
+    remaining = stored_remaining
+end
+redis.call('HSET', KEYS[1], 'limit', ARGV[1], 'remaining', remaining, 'reset', reset, 'updated', ARGV[4])
+redis.call('EXPIREAT', KEYS[1], reset + 3600)
+return remaining
+"""
+
+
+def token_id(token: Optional[str] = None) -> str:
+    """Stable, non-reversible identifier for a GitHub token"""
+    token = Config.GITHUB_TOKEN if token is None else token
+    if not token:
+        return "anonymous"
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:12]
+
+
+def resource_for_url(url: str) -> Optional[str]:
+    """GitHub rate-limit resource for an API URL, or None for hosts that are not rate limited"""
+    parsed = urlparse(url)
+    if parsed.hostname != urlparse(Config.GITHUB_API_URL).hostname:
+        return None
+    if parsed.path.rstrip("/").endswith("/graphql"):
+        return "graphql"
+    if "/search/" in parsed.path:
+        return "search"
+    return "core"
+
+
+class RateLimitScheduler:
+    def __init__(self, namespace: str = "github:ratelimit"):
+        self.namespace = namespace
+        self._local: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._scripts = {}
+
+    def _key(self, resource: str, token: Optional[str] = None) -> str:
+        return f"{self.namespace}:{token_id(token)}:{resource}"
+
+    def _script(self, client, name: str, source: str):
+        script = self._scripts.get((id(client), name))
+        if script is None:
+            script = client.register_script(source)
+            self._scripts[(id(client), name)] = script
+        return script
+
+    def _reserve_fraction(self, priority: str) -> float:
+        return {
+            "high": 0.0,
+            "normal": Config.GITHUB_RATELIMIT_RESERVE_NORMAL,
+            "low": Config.GITHUB_RATELIMIT_RESERVE_LOW,
+        }.get(priority, Config.GITHUB_RATELIMIT_RESERVE_NORMAL)
+
+    def _try_acquire(self, key: str, reserve: float) -> int:
+        """Reserve one request; returns 0 when allowed, otherwise seconds until the window resets"""
+        now = int(time.time())
+        client = get_cache_redis()
+        if client is not None:
+            try:
+                return int(self._script(client, "acquire", _ACQUIRE_SCRIPT)(keys=[key], args=[now, reserve]))
+            except Exception as e:
+                mark_redis_unavailable(e)
+        with self._lock:
+            budget = self._local.get(key)
+            if not budget or now >= budget["reset"]:
+                return 0
+            if budget["remaining"] > int(budget["limit"] * reserve):
+                budget["remaining"] -= 1
+                return 0
+            return max(1, budget["reset"] - now)
+
+    def acquire(self, url: str, priority: str = "normal"):
+        """Block until the budget for `url` allows a request at `priority` (bounded by GITHUB_RATELIMIT_MAX_WAIT)"""
+        resource = resource_for_url(url)
+        if resource is None or not Config.GITHUB_RATELIMIT_ENABLED:
+            return
+        key = self._key(resource)
+        reserve = self._reserve_fraction(priority)
+        deadline = time.monotonic() + Config.GITHUB_RATELIMIT_MAX_WAIT
+        while True:
+            wait = self._try_acquire(key, reserve)
+            if wait <= 0:
+                return
+            remaining_wait = deadline - time.monotonic()
+            if remaining_wait <= 0:
+                logging.warning(f"GitHub {resource} budget still low after waiting; sending {priority} request anyway")
+                return
+            logging.info(f"GitHub {resource} budget low, delaying {priority} request ({wait}s until reset)")
+            # Re-check periodically: another worker may have recorded a fresher budget
+            time.sleep(min(wait, remaining_wait, 5))
+
+    def record(self, response) -> Optional[Dict[str, Any]]:
+        """Update the shared budget from a response's X-RateLimit-* headers"""
+        headers = response.headers
+        if "X-RateLimit-Remaining" not in headers or "X-RateLimit-Reset" not in headers:
+            return None
+        try:
+            limit = int(headers.get("X-RateLimit-Limit", 0))
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = int(headers["X-RateLimit-Reset"])
+        except ValueError:
+            return None
+        resource = headers.get("X-RateLimit-Resource") or resource_for_url(response.url) or "core"
+        key = self._key(resource)
+        now = int(time.time())
+
+        client = get_cache_redis()
+        if client is not None:
+            try:
+                remaining = int(self._script(client, "record", _RECORD_SCRIPT)(
+                    keys=[key], args=[limit, remaining, reset, now]
+                ))
+            except Exception as e:
+                mark_redis_unavailable(e)
+                client = None
+        with self._lock:
+            budget = self._local.get(key)
+            if client is None and budget and budget["reset"] == reset:
+                remaining = min(remaining, budget["remaining"])
+            self._local[key] = {"limit": limit, "remaining": remaining, "reset": reset, "updated": now}
+        return self._local[key]
+
+    def wait_for_reset(self, response) -> bool:
+        """
+        After a 403/429 caused by rate limiting, sleep until GitHub allows requests again.
+        Returns True when the caller should retry the request.
+        """
+        if response.status_code not in (403, 429):
+            return False
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            wait = int(retry_after)
+        elif response.headers.get("X-RateLimit-Remaining") == "0":
+            wait = max(1, int(response.headers.get("X-RateLimit-Reset", "0")) - int(time.time()))
+        else:
+            return False
+        if wait > Config.GITHUB_RATELIMIT_MAX_WAIT:
+            logging.warning(f"GitHub rate limit exceeded; reset in {wait}s is beyond GITHUB_RATELIMIT_MAX_WAIT")
+            return False
+        logging.warning(f"GitHub rate limit exceeded; retrying in {wait}s")
+        time.sleep(wait)
+        return True
+
+    def get_budget(self) -> List[Dict[str, Any]]:
+        """Current known budgets for every token and resource, for capacity planning"""
+        budgets = {}
+        with self._lock:
+            for key, budget in self._local.items():
+                budgets[key] = dict(budget)
+        client = get_cache_redis()
+        if client is not None:
+            try:
+                for key in client.scan_iter(match=f"{self.namespace}:*"):
+                    data = client.hgetall(key)
+                    if data:
+                        budgets[key] = {name: int(value) for name, value in data.items()}
+            except Exception as e:
+                mark_redis_unavailable(e)
+
+        now = int(time.time())
+        result = []
+        for key, budget in sorted(budgets.items()):
+            token, resource = key[len(self.namespace) + 1:].split(":", 1)
+            result.append({
+                "token": token,
+                "resource": resource,
+                "limit": budget.get("limit"),
+                "remaining": budget.get("remaining"),
+                "reset": budget.get("reset"),
+                "reset_in_seconds": max(0, budget.get("reset", now) - now),
+            })
+        return result
+
+
+_scheduler = RateLimitScheduler()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    return _scheduler
+
+
+def get_rate_limit_budget() -> List[Dict[str, Any]]:
+    return _scheduler.get_budget()
@@ -1,37 +1,55 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional
 from ..config import Config
 from ..logger import logging
+from .github_client import github_get, github_headers
 
 
-def fetch_pr_files(repo_url: str, pr_number: int):
-    """Fetch files changed in a PR"""
-    try:
-        if not repo_url.startswith("https://github.com/"):
-            raise ValueError("Invalid GitHub repository URL.")
-
-        parts = repo_url.rstrip("/").split("/")
-        if len(parts) < 2:
-            raise ValueError("Invalid GitHub repository URL structure.")
-
-        owner, repo = parts[-2], parts[-1]
-        url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}/files"
-        headers = {
-            "Accept": "application/vnd.github.v3+json",
-        }
-        if Config.GITHUB_TOKEN:
-            headers["Authorization"] = f"Bearer {Config.GITHUB_TOKEN}"
-
-        response = requests.get(url, headers=headers)
-        if response.status_code == 404:
-            raise Exception(f"Pull Request #{pr_number} not found for repository {owner}/{repo}.")
+def parse_repo_url(repo_url: str):
+    """Return (owner, repo) for a https://github.com/<owner>/<repo> URL"""
+    if not repo_url.startswith("https://github.com/"):
+        raise ValueError("Invalid GitHub repository URL.")
+
+    parts = repo_url.rstrip("/").split("/")
+    if len(parts) < 2:
+        raise ValueError("Invalid GitHub repository URL structure.")
+
+    return parts[-2], parts[-1]
+
+
+def iter_github_pages(url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]] = None,
+                      not_found_message: Optional[str] = None) -> Iterator[Any]:
+    """
+    Yield the items of a paginated GitHub list endpoint, following the `Link: rel="next"` header.
+    Pages are requested one at a time, only when the consumer reaches the end of the previous one.
+    """
+    while url:
+        response = github_get(url, headers=headers, params=params, cache=True)
+        if response.status_code == 404 and not_found_message:
+            raise Exception(not_found_message)
         elif response.status_code != 200:
             raise Exception(f"GitHub API Error: {response.status_code} - {response.text}")
 
-        return [
-            {"filename": file["filename"], "content": file.get("patch", "")}
-            for file in response.json()
-        ]
-        
+        for item in response.json():
+            yield item
+
+        # The next link already carries the query string
+        url = response.links.get("next", {}).get("url")
+        params = None
+
+
+def iter_pr_files(repo_url: str, pr_number: int, per_page: int = 100) -> Iterator[Dict[str, Any]]:
+    """Lazily yield every file changed in a PR, one API page at a time"""
+    try:
+        owner, repo = parse_repo_url(repo_url)
+        url = f"{Config.GITHUB_API_URL}/repos/{owner}/{repo}/pulls/{pr_number}/files"
+        pages = iter_github_pages(
+            url, github_headers(), params={"per_page": per_page},
+            not_found_message=f"Pull Request #{pr_number} not found for repository {owner}/{repo}.",
+        )
+        for file in pages:
+            yield {"filename": file["filename"], "content": file.get("patch", "")}
+
     except ValueError as ve:
         logging.error(f"GitHub API Request Error: {ve}")
         raise Exception(f"URL Parsing Error: {ve}")
@@ -40,68 +58,89 @@ def fetch_pr_files(repo_url: str, pr_number: int):
         raise Exception(f"GitHub Fetch Error: {e}")
 
 
-def fetch_pr_commits(repo_url: str, pr_number: int, limit: int = 2):
-    """Fetch commits from a PR (default: 2 commits)"""
+def fetch_pr_files(repo_url: str, pr_number: int):
+    """Fetch files changed in a PR"""
+    return list(iter_pr_files(repo_url, pr_number))
+
+
+def _fetch_commit_detail(owner: str, repo: str, commit: dict, headers: dict):
+    """Fetch the files of a single commit; returns None when GitHub does not answer with 200"""
+    commit_sha = commit.get("sha", "")
+    commit_url = f"{Config.GITHUB_API_URL}/repos/{owner}/{repo}/commits/{commit_sha}"
+    commit_detail_response = github_get(commit_url, headers=headers, cache=True)
+
+    if commit_detail_response.status_code != 200:
+        logging.warning(f"Skipping commit {commit_sha[:7]}: GitHub API returned {commit_detail_response.status_code}")
+        return None
+
+    commit_data = commit_detail_response.json()
+    return {
+        "sha": commit_sha[:7],  # Short SHA
+        "full_sha": commit_sha,
+        "message": commit.get("commit", {}).get("message", ""),
+        "author": commit.get("commit", {}).get("author", {}).get("name", ""),
+        "date": commit.get("commit", {}).get("author", {}).get("date", ""),
+        "files": [
+            {
+                "filename": file.get("filename", ""),
+                "status": file.get("status", ""),
+                "additions": file.get("additions", 0),
+                "deletions": file.get("deletions", 0),
+                "patch": file.get("patch", "")
+            }
+            for file in commit_data.get("files", [])
+        ]
+    }
+
+
+def _fetch_commit_details(owner: str, repo: str, commits: list, headers: dict, concurrency: int):
+    """Fetch details for a batch of commits, concurrently when enabled, keeping their order"""
+    if concurrency > 1 and len(commits) > 1:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(commits))) as executor:
+            details = list(executor.map(lambda c: _fetch_commit_detail(owner, repo, c, headers), commits))
+    else:
+        details = [_fetch_commit_detail(owner, repo, commit, headers) for commit in commits]
+    return [detail for detail in details if detail is not None]
+
+
+def iter_pr_commits(repo_url: str, pr_number: int, limit: Optional[int] = None,
+                    per_page: int = 100, concurrency: int = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield commits of a PR with their changed files, in PR order.
+    Commit details are fetched in batches of `concurrency` requests in flight
+    (defaults to Config.GITHUB_FETCH_CONCURRENCY). `limit=None` walks every page.
+    """
     try:
-        if not repo_url.startswith("https://github.com/"):
-            raise ValueError("Invalid GitHub repository URL.")
-
-        parts = repo_url.rstrip("/").split("/")
-        if len(parts) < 2:
-            raise ValueError("Invalid GitHub repository URL structure.")
+        owner, repo = parse_repo_url(repo_url)
+        headers = github_headers()
+        if concurrency is None:
+            concurrency = Config.GITHUB_FETCH_CONCURRENCY
+        batch_size = max(concurrency, 1)
+        if limit:
+            per_page = min(per_page, limit)
+
+        commits_url = f"{Config.GITHUB_API_URL}/repos/{owner}/{repo}/pulls/{pr_number}/commits"
+        pages = iter_github_pages(
+            commits_url, headers, params={"per_page": per_page},
+            not_found_message=f"Pull Request #{pr_number} not found for repository {owner}/{repo}.",
+        )
+
+        listed = 0
+        batch = []
+        for commit in pages:
+            batch.append(commit)
+            listed += 1
+            reached_limit = bool(limit) and listed >= limit
+            if len(batch) >= batch_size or reached_limit:
+                for detail in _fetch_commit_details(owner, repo, batch, headers, concurrency):
+                    yield detail
+                batch = []
+            if reached_limit:
+                break
+
+        for detail in _fetch_commit_details(owner, repo, batch, headers, concurrency):
+            yield detail
 
-        owner, repo = parts[-2], parts[-1]
-        
-        # First, get PR info to get the commits URL
-        pr_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
-        headers = {
-            "Accept": "application/vnd.github.v3+json",
-        }
-        if Config.GITHUB_TOKEN:
-            headers["Authorization"] = f"Bearer {Config.GITHUB_TOKEN}"
-
-        pr_response = requests.get(pr_url, headers=headers)
-        if pr_response.status_code != 200:
-            raise Exception(f"GitHub API Error: {pr_response.status_code} - {pr_response.text}")
-        
-        pr_data = pr_response.json()
-        commits_url = pr_data.get("commits_url", f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}/commits")
-        
-        # Fetch commits
-        commits_response = requests.get(commits_url, headers=headers, params={"per_page": limit})
-        if commits_response.status_code != 200:
-            raise Exception(f"GitHub API Error: {commits_response.status_code} - {commits_response.text}")
-        
-        commits = commits_response.json()[:limit]  # Limit to requested number
-        
-        # Fetch details for each commit
-        commit_details = []
-        for commit in commits:
-            commit_sha = commit.get("sha", "")
-            commit_url = f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}"
-            commit_detail_response = requests.get(commit_url, headers=headers)
-            
-            if commit_detail_response.status_code == 200:
-                commit_data = commit_detail_response.json()
-                commit_details.append({
-                    "sha": commit_sha[:7],  # Short SHA
-                    "message": commit.get("commit", {}).get("message", ""),
-                    "author": commit.get("commit", {}).get("author", {}).get("name", ""),
-                    "date": commit.get("commit", {}).get("author", {}).get("date", ""),
-                    "files": [
-                        {
-                            "filename": file.get("filename", ""),
-                            "status": file.get("status", ""),
-                            "additions": file.get("additions", 0),
-                            "deletions": file.get("deletions", 0),
-                            "patch": file.get("patch", "")
-                        }
-                        for file in commit_data.get("files", [])
-                    ]
-                })
-        
-        return commit_details
-        
     except ValueError as ve:
         logging.error(f"GitHub API Request Error: {ve}")
         raise Exception(f"URL Parsing Error: {ve}")
@@ -109,6 +148,14 @@ def fetch_pr_commits(repo_url: str, pr_number: int, limit: int = 2):
         logging.error(f"GitHub API Request Error: {e}")
         raise Exception(f"GitHub Fetch Error: {e}")
 
+
+def fetch_pr_commits(repo_url: str, pr_number: int, limit: int = 2, concurrency: int = None):
+    """
+    Fetch commits from a PR (default: 2 commits, `limit=None` for all of them).
+    Commit details are fetched with up to `concurrency` requests in flight; the list keeps the PR's commit order.
+    """
+    return list(iter_pr_commits(repo_url, pr_number, limit=limit, concurrency=concurrency))
+
 # import requests
 # from ..config import Config
 
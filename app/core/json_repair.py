@@ -0,0 +1,114 @@
+"""
+Tolerant, incremental JSON parsing for LLM output.
+
+Model responses may be wrapped in prose or code fences, or cut off by num_predict.
+IncrementalJSONParser scans text as it arrives (feed()), skipping anything before
+the first object or array (or the first object, when that is what the caller expects),
+and remembers the last point where every member written so far is complete.
+A truncated document is repaired by cutting there and closing the open containers,
+so the complete members (e.g. finished `analysis` entries) survive and only the one
+being written is lost.
+
+Prose may contain brackets too ("see [1]"), so parse_tolerant_json moves on to the next
+opening bracket when the text from one does not parse.
+"""
+import json
+from typing import Any, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Opening brackets tried as the document root before giving up
+MAX_ROOT_CANDIDATES = 8
+
+
+class IncrementalJSONParser:
+    def __init__(self, openers: str = "{["):
+        self._openers = openers  # characters that may start the top-level value
+        self._buffer = []
+        self._position = 0       # characters scanned so far
+        self._start = None       # offset of the first opener
+        self._end = None         # offset just past the top-level value, once complete
+        self._stack = []         # open containers
+        self._in_string = False
+        self._escape = False
+        self._cut = None         # (offset, open containers) of the last consistent point
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    def feed(self, text: str):
+        if self._end is not None:
+            return
+        self._buffer.append(text)
+        for char in text:
+            offset = self._position
+            self._position += 1
+            if self._start is None:
+                if char in self._openers:
+                    self._start = offset
+                    self._stack.append(char)
+                    self._cut = (offset + 1, "".join(self._stack))
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(char)
+                self._cut = (offset + 1, "".join(self._stack))
+            elif char in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    self._end = offset + 1
+                    return
+                self._cut = (offset + 1, "".join(self._stack))
+            elif char == ",":
+                # Everything before the comma is a run of complete members
+                self._cut = (offset, "".join(self._stack))
+
+    def _text(self) -> str:
+        if len(self._buffer) > 1:
+            self._buffer = ["".join(self._buffer)]
+        return self._buffer[0] if self._buffer else ""
+
+    def result(self) -> Tuple[Optional[Any], bool]:
+        """
+        (value, repaired): the parsed document, or its repaired prefix when the text
+        ended early (repaired=True). (None, False) when there is nothing usable.
+        """
+        if self._start is None:
+            return None, False
+        text = self._text()
+        if self._end is not None:
+            candidate, repaired = text[self._start:self._end], False
+        else:
+            offset, stack = self._cut
+            candidate = text[self._start:offset] + "".join(_CLOSERS[opener] for opener in reversed(stack))
+            repaired = True
+        try:
+            return json.loads(candidate), repaired
+        except ValueError:
+            return None, False
+
+
+def parse_tolerant_json(text: str, openers: str = "{[") -> Tuple[Optional[Any], bool]:
+    """
+    IncrementalJSONParser over a whole response: (value, repaired). When the text
+    from the first opener does not parse, the next opener is tried as the root.
+    """
+    offset = 0
+    for _ in range(MAX_ROOT_CANDIDATES):
+        parser = IncrementalJSONParser(openers)
+        parser.feed(text[offset:])
+        value, repaired = parser.result()
+        if value is not None or parser._start is None:
+            return value, repaired
+        offset += parser._start + 1
+    return None, False
@@ -0,0 +1,145 @@
+"""
+LLM response cache keyed by (model, generation options, sha256(prompt)).
+
+Reverts, cherry-picks, the same commit in several PRs and re-runs of a PR all send
+prompts the model has already answered. Responses live in an in-process LRU backed by
+Redis, where a sorted-set index (last access time per key) evicts the least recently
+used entries beyond LLM_CACHE_MAX_ENTRIES; every entry also expires after LLM_CACHE_TTL.
+Responses are zstd-compressed when the optional zstandard package is installed.
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from ..config import Config
+from ..logger import logging
+from .cache import LRUCache, get_cache_redis, mark_redis_unavailable
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Responses shorter than this are stored uncompressed
+COMPRESS_MIN_CHARS = 256
+
+
+class LLMCacheStats:
+    """Thread-safe hit / miss / bypass counters for one task (or one file)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.last: Optional[str] = None
+
+    def record(self, outcome: str):
+        with self._lock:
+            self.last = outcome
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "miss":
+                self.misses += 1
+            elif outcome == "bypass":
+                self.bypassed += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed}
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries: int, redis_max_entries: int, ttl: int,
+                 compression: str = "zstd", namespace: str = "llm"):
+        self.lru = LRUCache(max_entries=max_entries)
+        self.redis_max_entries = redis_max_entries
+        self.ttl = ttl
+        self.namespace = namespace
+        self.index_key = f"{namespace}:lru"
+        self._compressor = None
+        if compression == "zstd":
+            if zstandard is None:
+                logging.warning("LLM_CACHE_COMPRESSION=zstd but the zstandard package is not installed; "
+                                "storing responses uncompressed")
+            else:
+                self._compressor = zstandard.ZstdCompressor(level=3)
+
+    def make_key(self, model: str, options: Dict[str, Any], prompt: str) -> str:
+        options_hash = hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8", errors="surrogatepass")).hexdigest()
+        return f"{self.namespace}:{model}:{options_hash}:{prompt_hash}"
+
+    def _encode(self, text: str) -> str:
+        # The cache Redis client decodes responses, so compressed bytes travel as base64
+        if self._compressor is not None and len(text) >= COMPRESS_MIN_CHARS:
+            return "z:" + base64.b64encode(self._compressor.compress(text.encode("utf-8"))).decode("ascii")
+        return "r:" + text
+
+    @staticmethod
+    def _decode(value: str) -> Optional[str]:
+        kind, _, data = value.partition(":")
+        if kind == "r":
+            return data
+        if kind == "z" and zstandard is not None:
+            return zstandard.ZstdDecompressor().decompress(base64.b64decode(data)).decode("utf-8")
+        return None
+
+    def lookup(self, key: str) -> Optional[str]:
+        text = self.lru.get(key)
+        if text is not None:
+            return text
+        client = get_cache_redis()
+        if client is None:
+            return None
+        try:
+            value = client.get(key)
+            if value is None:
+                return None
+            client.zadd(self.index_key, {key: time.time()})
+        except Exception as e:
+            mark_redis_unavailable(e)
+            return None
+        text = self._decode(value)
+        if text is not None:
+            self.lru.set(key, text)
+        return text
+
+    def store(self, key: str, text: str):
+        self.lru.set(key, text)
+        client = get_cache_redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.set(key, self._encode(text), ex=self.ttl)
+            pipe.zadd(self.index_key, {key: time.time()})
+            pipe.zcard(self.index_key)
+            excess = pipe.execute()[-1] - self.redis_max_entries
+            if excess > 0:
+                # Least recently used first; entries that already expired are dropped from the index too
+                victims = client.zrange(self.index_key, 0, excess - 1)
+                if victims:
+                    client.delete(*victims)
+                    client.zrem(self.index_key, *victims)
+        except Exception as e:
+            mark_redis_unavailable(e)
+
+
+_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    global _cache
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = LLMResponseCache(Config.LLM_CACHE_LRU_SIZE, Config.LLM_CACHE_MAX_ENTRIES, Config.LLM_CACHE_TTL,
+                                  Config.LLM_CACHE_COMPRESSION)
+        logging.info(f"LLM response cache enabled (lru={Config.LLM_CACHE_LRU_SIZE}, "
+                     f"redis max entries={Config.LLM_CACHE_MAX_ENTRIES}, ttl={Config.LLM_CACHE_TTL}s, "
+                     f"compression={'zstd' if _cache._compressor is not None else 'none'})")
+    return _cache
@@ -0,0 +1,251 @@
+"""
+Routing across several Ollama servers.
+
+Each request goes to the healthy host with the fewest outstanding requests. In-flight
+requests are tracked in Redis (one sorted set per host, scored by start time), so every
+worker sees the load the others put on a host; entries older than OLLAMA_READ_TIMEOUT
+are ignored, which keeps requests of crashed workers from counting forever. Without
+Redis each process balances its own requests.
+
+Hosts are ejected after OLLAMA_EJECT_FAILURES consecutive failures (connection errors,
+timeouts, 5xx) or a failed health check (GET /version every OLLAMA_HEALTH_INTERVAL
+seconds), for OLLAMA_EJECT_SECONDS doubling on every ejection in a row. Once that time
+has passed the host is readmitted; a success (or passing health check) clears its record.
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+
+from ..config import Config
+from ..logger import logging
+from .cache import get_cache_redis, mark_redis_unavailable
+
+# Least outstanding host among KEYS (one sorted set of in-flight request ids per host);
+# registers ARGV[3] on it and returns its index
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local max_age = tonumber(ARGV[2])
+local best, best_count
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - max_age)
+    local count = redis.call('ZCARD', key)
+    if not best or count < best_count then
+        best, best_count = i, count
+    end
+end
+redis.call('ZADD', KEYS[best], now, ARGV[3])
+redis.call('EXPIRE', KEYS[best], math.ceil(max_age))
+return best - 1
+"""
+
+# Ejections in a row beyond this no longer double the ejection time
+MAX_BACKOFF_DOUBLINGS = 5
+
+
+def ollama_api_urls() -> List[str]:
+    """Configured Ollama API URLs: OLLAMA_API_URLS, or else OLLAMA_API_URL"""
+    urls = [url.strip().rstrip("/") for url in Config.OLLAMA_API_URLS.split(",") if url.strip()]
+    return urls or [Config.OLLAMA_API_URL.rstrip("/")]
+
+
+class HostState:
+    def __init__(self, url: str):
+        self.url = url
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.inflight = 0
+
+
+class OllamaHostPool:
+    def __init__(self, urls: Sequence[str], namespace: str = "ollama:inflight",
+                 health_interval: Optional[float] = None):
+        self.hosts = [HostState(url) for url in urls]
+        self._by_url = {host.url: host for host in self.hosts}
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._scripts = {}
+        self._stop = threading.Event()
+        self._health_thread = None
+        health_interval = Config.OLLAMA_HEALTH_INTERVAL if health_interval is None else health_interval
+        # A single host has nowhere else to route to
+        if len(self.hosts) > 1 and health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, args=(health_interval,),
+                                                   name="ollama-health", daemon=True)
+            self._health_thread.start()
+
+    def _key(self, url: str) -> str:
+        return f"{self.namespace}:{url}"
+
+    def _script(self, client):
+        script = self._scripts.get(id(client))
+        if script is None:
+            script = client.register_script(_ACQUIRE_SCRIPT)
+            self._scripts[id(client)] = script
+        return script
+
+    def _candidates(self, exclude: Sequence[str]) -> List[HostState]:
+        now = time.monotonic()
+        hosts = [host for host in self.hosts if host.url not in exclude] or self.hosts
+        admitted = [host for host in hosts if host.ejected_until <= now]
+        if admitted:
+            return admitted
+        # Every host is ejected: try the one due back first rather than failing outright
+        return [min(hosts, key=lambda host: host.ejected_until)]
+
+    def acquire(self, exclude: Sequence[str] = ()) -> Tuple[str, str]:
+        """(host URL, request id) for the least outstanding admitted host; pair with release()"""
+        candidates = self._candidates(exclude)
+        # Ties go to a random host instead of always the first one
+        random.shuffle(candidates)
+        request_id = uuid.uuid4().hex
+        host = candidates[0]
+        if len(candidates) > 1:
+            client = get_cache_redis()
+            index = None
+            if client is not None:
+                try:
+                    index = int(self._script(client)(
+                        keys=[self._key(candidate.url) for candidate in candidates],
+                        args=[time.time(), Config.OLLAMA_READ_TIMEOUT, request_id]
+                    ))
+                except Exception as e:
+                    mark_redis_unavailable(e)
+            if index is not None:
+                host = candidates[index]
+            else:
+                with self._lock:
+                    host = min(candidates, key=lambda candidate: candidate.inflight)
+        with self._lock:
+            host.inflight += 1
+            host.requests += 1
+        return host.url, request_id
+
+    def release(self, url: str, request_id: str):
+        host = self._by_url[url]
+        with self._lock:
+            host.inflight -= 1
+        if len(self.hosts) > 1:
+            client = get_cache_redis()
+            if client is not None:
+                try:
+                    client.zrem(self._key(url), request_id)
+                except Exception as e:
+                    mark_redis_unavailable(e)
+
+    @contextmanager
+    def lease(self, exclude: Sequence[str] = ()) -> Iterator[str]:
+        """Host URL to send one request to, counted as in flight until the block exits"""
+        url, request_id = self.acquire(exclude)
+        try:
+            yield url
+        finally:
+            self.release(url, request_id)
+
+    def _eject(self, host: HostState, reason: str):
+        # Caller holds the lock
+        host.ejections += 1
+        duration = Config.OLLAMA_EJECT_SECONDS * 2 ** min(host.ejections - 1, MAX_BACKOFF_DOUBLINGS)
+        host.ejected_until = time.monotonic() + duration
+        logging.warning(f"Ejecting Ollama host {host.url} for {duration:.0f}s: {reason}")
+
+    def record_failure(self, url: str, error: Any):
+        host = self._by_url[url]
+        with self._lock:
+            host.errors += 1
+            host.failures += 1
+            if host.failures >= Config.OLLAMA_EJECT_FAILURES and host.ejected_until <= time.monotonic():
+                self._eject(host, f"{host.failures} consecutive failures ({error})")
+
+    def record_success(self, url: str):
+        host = self._by_url[url]
+        with self._lock:
+            if host.ejections:
+                logging.info(f"Ollama host {url} is healthy again")
+            host.failures = 0
+            host.ejections = 0
+            host.ejected_until = 0.0
+
+    def check_health(self):
+        """Probe every host (GET /version): eject failing ones, readmit recovered ones once due"""
+        # Imported here: ollama_service builds on this module
+        from ..services.ollama_service import get_ollama_session
+        session = get_ollama_session()
+        for host in self.hosts:
+            try:
+                response = session.get(f"{host.url}/version", timeout=Config.OLLAMA_CONNECT_TIMEOUT)
+                healthy = response.status_code == 200
+                error = f"health check returned {response.status_code}"
+            except requests.exceptions.RequestException as e:
+                healthy, error = False, f"health check failed: {e}"
+            if healthy:
+                if host.ejected_until <= time.monotonic():
+                    self.record_success(host.url)
+                continue
+            with self._lock:
+                if host.ejected_until <= time.monotonic():
+                    self._eject(host, error)
+
+    def _health_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logging.error(f"Ollama health check error: {e}")
+
+    def close(self):
+        self._stop.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-host routing statistics for this worker process"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "hosts": [
+                    {
+                        "url": host.url,
+                        "admitted": host.ejected_until <= now,
+                        "ejected_for": round(max(0.0, host.ejected_until - now), 1),
+                        "inflight": host.inflight,
+                        "requests": host.requests,
+                        "errors": host.errors,
+                    }
+                    for host in self.hosts
+                ]
+            }
+
+
+_pools: Dict[Tuple[str, ...], OllamaHostPool] = {}
+_pools_pid: Optional[int] = None
+_pools_lock = threading.Lock()
+
+
+def get_ollama_pool(urls: Optional[Sequence[str]] = None) -> OllamaHostPool:
+    """Process-wide pool for a set of hosts (the configured ones by default), rebuilt after a fork"""
+    global _pools_pid
+    key = tuple(urls or ollama_api_urls())
+    pid = os.getpid()
+    with _pools_lock:
+        if _pools_pid != pid:
+            # Health-check threads do not survive a fork; start over in the child
+            _pools.clear()
+            _pools_pid = pid
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = OllamaHostPool(key)
+            if len(key) > 1:
+                logging.info(f"Routing Ollama requests across {len(key)} hosts: {', '.join(key)}")
+        return pool
+
+
+def get_ollama_pool_stats() -> Dict[str, Any]:
+    """Routing statistics of the configured hosts"""
+    return get_ollama_pool().snapshot()
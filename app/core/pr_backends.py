@@ -0,0 +1,44 @@
+"""
+Selects where PR changes are read from (Config.GITHUB_BACKEND, GIT_MIRROR_REPOS)
+"""
+from typing import Dict, Any, Iterator, Optional
+
+from ..config import Config
+from .git_mirror import get_mirror_manager, github_clone_url, use_mirror
+from .github_utils import iter_pr_commits, iter_pr_files, parse_repo_url
+
+PR_BACKENDS = ("rest", "graphql", "mirror")
+
+
+def backend_for(repo_url: str, backend: Optional[str] = None) -> str:
+    """Explicit backend, else the local mirror for hot repos, else Config.GITHUB_BACKEND"""
+    if backend:
+        return backend
+    owner, repo = parse_repo_url(repo_url)
+    return "mirror" if use_mirror(owner, repo) else Config.GITHUB_BACKEND
+
+
+def iter_pr_changes(repo_url: str, pr_number: int, limit: Optional[int] = None,
+                    backend: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield PR changes as commit entries ({sha, full_sha, message, author, date, files}).
+    "rest" and "mirror" yield one entry per commit; "graphql" yields the PR's net change as one entry.
+    """
+    backend = backend_for(repo_url, backend)
+    if backend == "rest":
+        return iter_pr_commits(repo_url, pr_number, limit=limit)
+    if backend == "graphql":
+        from .github_graphql import iter_pr_changes_graphql
+        return iter_pr_changes_graphql(repo_url, pr_number, limit=limit)
+    if backend == "mirror":
+        owner, repo = parse_repo_url(repo_url)
+        return get_mirror_manager().iter_pr_commits(github_clone_url(owner, repo), pr_number, limit=limit)
+    raise ValueError(f"Unknown GitHub backend '{backend}', expected one of {', '.join(PR_BACKENDS)}")
+
+
+def iter_pr_file_changes(repo_url: str, pr_number: int, backend: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield the PR's changed files ({filename, content}) from the mirror or the REST API"""
+    if backend_for(repo_url, backend) == "mirror":
+        owner, repo = parse_repo_url(repo_url)
+        return get_mirror_manager().iter_pr_files(github_clone_url(owner, repo), pr_number)
+    return iter_pr_files(repo_url, pr_number)
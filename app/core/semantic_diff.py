@@ -0,0 +1,178 @@
+"""
+Symbol-level (semantic) diff alongside the line diff.
+
+A SymbolParser turns a source file into its functions and classes, keyed by qualified
+name ("Parser.parse"), each with a fingerprint of its own code (nested definitions
+excluded) that ignores formatting and comments. Matching the two versions by name
+tells which symbols were added, removed or changed, and the changed symbols' code
+goes into the LLM prompt next to the diff.
+
+Parsers are registered by file extension in SYMBOL_PARSERS; files without a parser,
+or that fail to parse, have no semantic diff.
+"""
+import ast
+import copy
+import hashlib
+import os
+from typing import Dict, Any, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+# Files above this size are not parsed
+MAX_PARSE_CHARS = 2 * 1024 ** 2
+# Budget for symbol code carried in the result (and sent to the model), and per symbol side
+MAX_SOURCE_CHARS = 10000
+MAX_SYMBOL_CHARS = 4000
+
+
+class Symbol(NamedTuple):
+    name: str
+    kind: str
+    start: int
+    end: int
+    fingerprint: str
+    source: str
+
+
+class SymbolParser:
+    """Extracts the symbols of one language"""
+    language = ""
+    extensions: Tuple[str, ...] = ()
+
+    def parse(self, text: str) -> Optional[List[Symbol]]:
+        """Symbols in source order, or None when the text doesn't parse"""
+        raise NotImplementedError
+
+
+def _own_source(lines: List[str], start: int, end: int, children: List[Tuple[str, str, int, int]]) -> str:
+    """Lines start..end (1-based) with each nested definition collapsed to a one-line placeholder"""
+    parts = []
+    position = start
+    for name, kind, child_start, child_end in children:
+        parts.extend(lines[position - 1:child_start - 1])
+        header = lines[child_start - 1] if child_start <= len(lines) else ""
+        indent = header[:len(header) - len(header.lstrip())]
+        parts.append(f"{indent}# ... {kind} {name} (lines {child_start}-{child_end})\n")
+        position = child_end + 1
+    parts.extend(lines[position - 1:end])
+    return "".join(parts)
+
+
+class PythonSymbolParser(SymbolParser):
+    language = "python"
+    extensions = (".py", ".pyi")
+    _definitions = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+    def parse(self, text: str) -> Optional[List[Symbol]]:
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            return None
+        lines = text.splitlines(keepends=True)
+        symbols: List[Symbol] = []
+        children = self._collect(tree, "", lines, symbols)
+        symbols.insert(0, Symbol("<module>", "module", 1, max(len(lines), 1), self._fingerprint(tree),
+                                 _own_source(lines, 1, len(lines), children)))
+        return symbols
+
+    def _collect(self, parent: ast.AST, prefix: str, lines: List[str],
+                 symbols: List[Symbol]) -> List[Tuple[str, str, int, int]]:
+        """Append the definitions directly in `parent`'s body (and, recursively, theirs); returns their spans"""
+        spans = []
+        seen: Dict[str, int] = {}
+        for node in parent.body:
+            if not isinstance(node, self._definitions):
+                continue
+            name = f"{prefix}{node.name}"
+            # Redefinitions (property setters, overloads) are told apart by their order
+            seen[name] = seen.get(name, 0) + 1
+            if seen[name] > 1:
+                name = f"{name}#{seen[name]}"
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+            index = len(symbols)
+            symbols.append(None)
+            nested = self._collect(node, f"{name}.", lines, symbols)
+            symbols[index] = Symbol(name, kind, start, node.end_lineno, self._fingerprint(node),
+                                    _own_source(lines, start, node.end_lineno, nested))
+            spans.append((name, kind, start, node.end_lineno))
+        return spans
+
+    def _fingerprint(self, node: ast.AST) -> str:
+        """Hash of the node's AST without nested definitions (positions, formatting and comments ignored)"""
+        own = copy.copy(node)
+        own.body = [child for child in node.body if not isinstance(child, self._definitions)]
+        return hashlib.sha1(ast.dump(own).encode("utf-8")).hexdigest()[:16]
+
+
+SYMBOL_PARSERS: Dict[str, SymbolParser] = {
+    extension: parser for parser in (PythonSymbolParser(),) for extension in parser.extensions
+}
+
+
+def get_symbol_parser(file_name: str) -> Optional[SymbolParser]:
+    """Parser registered for the file's extension, if any"""
+    return SYMBOL_PARSERS.get(os.path.splitext(file_name)[1].lower())
+
+
+def _exceeds(content: Union[str, Sequence[str]], limit: int) -> bool:
+    """Whether the content is longer than `limit` characters, without joining its lines"""
+    if isinstance(content, str):
+        return len(content) > limit
+    total = 0
+    for line in content:
+        total += len(line)
+        if total > limit:
+            return True
+    return False
+
+
+def semantic_diff(file_a_content: Union[str, Sequence[str]], file_b_content: Union[str, Sequence[str]],
+                  file_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Added, removed and changed symbols between two versions of `file_name`, with their
+    line ranges and code (within MAX_SOURCE_CHARS), or None when the file can't be parsed.
+    """
+    parser = get_symbol_parser(file_name)
+    if parser is None:
+        return None
+    if _exceeds(file_a_content, MAX_PARSE_CHARS) or _exceeds(file_b_content, MAX_PARSE_CHARS):
+        return None
+    text_a = file_a_content if isinstance(file_a_content, str) else "".join(file_a_content)
+    text_b = file_b_content if isinstance(file_b_content, str) else "".join(file_b_content)
+    symbols_a, symbols_b = parser.parse(text_a), parser.parse(text_b)
+    if symbols_a is None or symbols_b is None:
+        return None
+
+    by_name_a = {symbol.name: symbol for symbol in symbols_a}
+    by_name_b = {symbol.name: symbol for symbol in symbols_b}
+    pairs = [(by_name_a.get(symbol.name), symbol) for symbol in symbols_b]
+    pairs += [(symbol, None) for symbol in symbols_a if symbol.name not in by_name_b]
+
+    entries = []
+    budget = MAX_SOURCE_CHARS
+    for old, new in pairs:
+        if old is not None and new is not None and old.fingerprint == new.fingerprint:
+            continue
+        symbol = new or old
+        entry = {
+            "name": symbol.name,
+            "kind": symbol.kind,
+            "status": "added" if old is None else "removed" if new is None else "changed",
+            "lines_a": [old.start, old.end] if old is not None else None,
+            "lines_b": [new.start, new.end] if new is not None else None,
+        }
+        for side, version in (("source_a", old), ("source_b", new)):
+            source = version.source if version is not None else None
+            if source is not None and len(source) > MAX_SYMBOL_CHARS:
+                source = source[:MAX_SYMBOL_CHARS] + "\n... (truncated)"
+            if source is not None and len(source) > budget:
+                source = None
+            entry[side] = source
+            budget -= len(source or "")
+        entries.append(entry)
+
+    return {
+        "language": parser.language,
+        "symbols": entries,
+        "summary": {status: sum(1 for entry in entries if entry["status"] == status)
+                    for status in ("added", "removed", "changed")},
+    }
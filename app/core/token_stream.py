@@ -0,0 +1,171 @@
+"""
+Live LLM output per task on a Redis stream (`stream:<task_id>`), relayed as Server-Sent Events.
+
+Workers publish best effort: tokens are buffered per source (a file, a diff chunk) and
+flushed every LLM_STREAM_FLUSH_MS, so a remote Redis does not slow generation down, and
+a Redis failure only silences the stream. Entries carry `event` (token | end | done),
+`source` and `data`; the stream is capped at LLM_STREAM_MAXLEN entries and expires
+LLM_STREAM_TTL seconds after its last write.
+"""
+import json
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ..config import Config
+from ..logger import logging
+from ..db.redis import get_redis_client
+from .cache import get_cache_redis, mark_redis_unavailable
+
+# Flush a source's buffer early once it holds this many characters
+FLUSH_CHARS = 2048
+
+
+def stream_key(task_id: str) -> str:
+    return f"stream:{task_id}"
+
+
+class TokenPublisher:
+    """
+    Token callback (`on_token`) for one source of a task. Buffers tokens and
+    publishes them in batches; close() flushes and marks the source's end.
+    """
+
+    def __init__(self, stream: "TokenStream", source: str):
+        self.stream = stream
+        self.source = source
+        self._parts: List[str] = []
+        self._chars = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self, token: str):
+        with self._lock:
+            self._parts.append(token)
+            self._chars += len(token)
+            if (self._chars < FLUSH_CHARS
+                    and (time.monotonic() - self._flushed_at) * 1000 < self.stream.flush_ms):
+                return
+            text = self._take()
+        self.stream.publish("token", self.source, text)
+
+    def _take(self) -> str:
+        text = "".join(self._parts)
+        self._parts = []
+        self._chars = 0
+        self._flushed_at = time.monotonic()
+        return text
+
+    def flush(self):
+        with self._lock:
+            text = self._take()
+        if text:
+            self.stream.publish("token", self.source, text)
+
+    def close(self):
+        self.flush()
+        self.stream.publish("end", self.source)
+
+
+class TokenStream:
+    """Writer side of a task's token stream"""
+
+    def __init__(self, task_id: str, maxlen: Optional[int] = None, ttl: Optional[int] = None,
+                 flush_ms: Optional[int] = None):
+        self.key = stream_key(task_id)
+        self.maxlen = maxlen or Config.LLM_STREAM_MAXLEN
+        self.ttl = ttl or Config.LLM_STREAM_TTL
+        self.flush_ms = Config.LLM_STREAM_FLUSH_MS if flush_ms is None else flush_ms
+
+    def publish(self, event: str, source: str = "", data: str = ""):
+        client = get_cache_redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.xadd(self.key, {"event": event, "source": source, "data": data},
+                      maxlen=self.maxlen, approximate=True)
+            pipe.expire(self.key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            mark_redis_unavailable(e)
+
+    def publisher(self, source: str) -> TokenPublisher:
+        return TokenPublisher(self, source)
+
+    def close(self, status: str):
+        """Final event: readers stop after it"""
+        self.publish("done", data=status)
+
+
+def get_token_stream(task_id: str) -> Optional[TokenStream]:
+    """TokenStream for a task, or None when streaming is disabled"""
+    if not Config.LLM_STREAM_ENABLED:
+        return None
+    return TokenStream(task_id)
+
+
+def format_sse(event: str, data: Dict, event_id: Optional[str] = None) -> str:
+    """One Server-Sent Events message (data is sent as a single JSON line)"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _sse_message(entry_id: str, fields: Dict[str, str]) -> str:
+    event = fields.get("event", "token")
+    if event == "done":
+        return format_sse("done", {"status": fields.get("data", "")}, entry_id)
+    data = {"source": fields.get("source", "")}
+    if event == "token":
+        data["text"] = fields.get("data", "")
+    return format_sse(event, data, entry_id)
+
+
+def iter_sse_events(task_id: str, last_event_id: Optional[str] = None,
+                    task_status: Callable[[], Optional[str]] = lambda: None,
+                    block_ms: Optional[int] = None, client=None) -> Iterator[str]:
+    """
+    Relay a task's token stream as SSE messages, from after `last_event_id` (a Redis
+    stream id, as sent back by EventSource on reconnect) or from the start.
+    Ends after the `done` entry; while the stream is idle a keep-alive comment is sent
+    and `task_status()` is checked, so tasks that never stream (or whose stream was
+    lost) still end with a `done` event once their status is final.
+    """
+    block_ms = block_ms or Config.LLM_STREAM_BLOCK_MS
+    if client is None:
+        client = get_redis_client(socket_timeout=block_ms / 1000 + 5)
+    key = stream_key(task_id)
+    last_id = last_event_id or "0-0"
+
+    def read(block: Optional[int]):
+        nonlocal last_id
+        response = client.xread({key: last_id}, count=100, block=block)
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                yield entry_id, fields
+
+    while True:
+        received = False
+        for entry_id, fields in read(block_ms):
+            received = True
+            yield _sse_message(entry_id, fields)
+            if fields.get("event") == "done":
+                return
+        if received:
+            continue
+        status = task_status()
+        if status in ("completed", "failed"):
+            # Entries written between the blocking read and the status check
+            for entry_id, fields in read(None):
+                yield _sse_message(entry_id, fields)
+                if fields.get("event") == "done":
+                    return
+            logging.info(f"Token stream for task {task_id} ended without a done event (status: {status})")
+            yield format_sse("done", {"status": status})
+            return
+        yield ": keep-alive\n\n"
@@ -0,0 +1,226 @@
+"""
+Directory/tree comparison.
+
+Both sides (repo + ref + path prefix) are listed in one call each, through the git
+trees API or a local mirror, and files are paired by their path below the prefix.
+Files with identical blob SHAs are skipped without downloading anything. Changed
+files are fetched concurrently and diffed in a pool of worker processes, because
+diffing is CPU-bound and threads would serialize on the GIL.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from billiard import Pool
+
+from ..config import Config
+from ..logger import logging
+from .blob_cache import get_blob_store, git_blob_sha
+from .diff_cache import get_diff_cache
+from .file_classifier import GitAttributes, load_gitattributes, prefilter
+from .file_comparison import compute_unified_diff, download_raw
+from .git_mirror import get_mirror_manager, github_clone_url, use_mirror
+from .github_client import github_get, github_headers
+from .github_utils import parse_repo_url
+
+
+class TreeSpec(NamedTuple):
+    repo_url: str
+    ref: str = "HEAD"
+    path: str = ""
+
+
+def list_tree(spec: TreeSpec) -> Dict[str, str]:
+    """Blob SHA of every file under spec.path, keyed by path relative to spec.path"""
+    owner, repo = parse_repo_url(spec.repo_url)
+    prefix = spec.path.strip("/")
+    if use_mirror(owner, repo):
+        try:
+            return get_mirror_manager().list_tree(github_clone_url(owner, repo), spec.ref, prefix)
+        except Exception as e:
+            logging.warning(f"Mirror tree listing failed for {owner}/{repo}, falling back to GitHub: {e}")
+
+    # "<ref>:<path>" lists just the subtree, so large repositories stay below the API's entry limit
+    tree_ref = f"{spec.ref}:{prefix}" if prefix else spec.ref
+    url = f"{Config.GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{quote(tree_ref, safe='')}"
+    response = github_get(url, headers=github_headers(), params={"recursive": "1"}, cache=True)
+    if response.status_code == 404:
+        raise Exception(f"Tree {tree_ref} not found for repository {owner}/{repo}.")
+    if response.status_code != 200:
+        raise Exception(f"GitHub API Error: {response.status_code} - {response.text}")
+    payload = response.json()
+    if payload.get("truncated"):
+        raise Exception(f"Tree {tree_ref} of {owner}/{repo} is too large for the trees API; "
+                        f"compare a narrower path or mirror the repository (GIT_MIRROR_REPOS).")
+    return {entry["path"]: entry["sha"] for entry in payload.get("tree", []) if entry.get("type") == "blob"}
+
+
+def plan_tree_comparison(files_a: Dict[str, str], files_b: Dict[str, str]) -> Tuple[List[Dict[str, Any]], int]:
+    """Changed files (sorted by path) and the number of files whose blob SHAs match"""
+    changed = []
+    unchanged = 0
+    for path in sorted(set(files_a) | set(files_b)):
+        sha_a, sha_b = files_a.get(path), files_b.get(path)
+        if sha_a == sha_b:
+            unchanged += 1
+            continue
+        if sha_a is None:
+            status = "added"
+        elif sha_b is None:
+            status = "removed"
+        else:
+            status = "modified"
+        changed.append({"path": path, "status": status, "sha_a": sha_a, "sha_b": sha_b})
+    return changed, unchanged
+
+
+def read_tree_file(spec: TreeSpec, path: str, sha: Optional[str]) -> bytes:
+    """Content of `path` (relative to spec.path) with blob `sha`: blob store, mirror, then raw download"""
+    if sha is None:
+        return b""
+    blob_store = get_blob_store()
+    if blob_store is not None:
+        data = blob_store.get(sha)
+        if data is not None:
+            return data
+
+    owner, repo = parse_repo_url(spec.repo_url)
+    if use_mirror(owner, repo):
+        try:
+            return get_mirror_manager().read_blob(github_clone_url(owner, repo), sha)
+        except Exception as e:
+            logging.warning(f"Mirror read of blob {sha} failed, falling back to GitHub: {e}")
+
+    prefix = spec.path.strip("/")
+    full_path = f"{prefix}/{path}" if prefix else path
+    data = download_raw(f"{Config.GITHUB_RAW_URL}/{owner}/{repo}/{quote(spec.ref)}/{quote(full_path)}")
+    if git_blob_sha(data) != sha:
+        # The ref moved between listing the tree and downloading the file
+        logging.warning(f"{owner}/{repo}:{full_path} changed since the tree was listed (expected blob {sha})")
+    elif blob_store is not None:
+        blob_store.put(sha, data)
+    return data
+
+
+def _diff_job(job: Tuple[int, str, str, str, Optional[str]]) -> Tuple[int, Dict[str, Any]]:
+    """Runs in a pool worker process"""
+    index, path, text_a, text_b, engine = job
+    return index, compute_unified_diff(text_a, text_b, f"a/{path}", f"b/{path}", engine=engine)
+
+
+def diff_tree_files(spec_a: TreeSpec, spec_b: TreeSpec, changed: List[Dict[str, Any]],
+                    engine: Optional[str] = None, processes: Optional[int] = None,
+                    attributes: Optional[GitAttributes] = None) -> List[Dict[str, Any]]:
+    """
+    Fetch and diff every changed file, filling in `diff` (or `error` / `binary`) on each entry.
+    Generated and vendored files are tagged with their `classification`; binary ones are not diffed.
+    Downloads run in threads and feed the diff process pool as they complete; diffs found
+    in the diff cache never reach the pool.
+    """
+    prefix_b = spec_b.path.strip("/")
+    processes = processes or Config.TREE_DIFF_PROCESSES or os.cpu_count() or 1
+    diff_cache = get_diff_cache()
+    cache_keys: Dict[int, str] = {}
+
+    def fetch(entry: Dict[str, Any]) -> Tuple[Optional[bytes], Optional[bytes], Optional[str]]:
+        try:
+            return (read_tree_file(spec_a, entry["path"], entry["sha_a"]),
+                    read_tree_file(spec_b, entry["path"], entry["sha_b"]), None)
+        except Exception as e:
+            logging.error(f"Error fetching {entry['path']} for tree comparison: {e}")
+            return None, None, str(e)
+
+    def jobs(fetched: Iterator) -> Iterator[Tuple[int, str, str, str, Optional[str]]]:
+        for index, (entry, (data_a, data_b, error)) in enumerate(zip(changed, fetched)):
+            if error is not None:
+                entry["error"] = error
+                continue
+            entry["size_a"], entry["size_b"] = len(data_a), len(data_b)
+            full_path = f"{prefix_b}/{entry['path']}" if prefix_b else entry["path"]
+            classification = prefilter(full_path, data_b or data_a, attributes)
+            if classification:
+                entry["classification"] = classification
+            if b"\0" in data_a or b"\0" in data_b or (classification and classification["category"] == "binary"):
+                entry["binary"] = True
+                continue
+            text_a, text_b = data_a.decode("utf-8", errors="replace"), data_b.decode("utf-8", errors="replace")
+            if diff_cache is not None:
+                cache_keys[index] = diff_cache.key_for(text_a, text_b, f"a/{entry['path']}", f"b/{entry['path']}", engine)
+                cached = diff_cache.lookup(cache_keys[index])
+                if cached is not None:
+                    entry["diff"] = cached
+                    entry["diff_cache"] = "hit"
+                    continue
+            yield index, entry["path"], text_a, text_b, engine
+
+    def collect(index: int, diff: Dict[str, Any]):
+        changed[index]["diff"] = diff
+        if diff_cache is not None:
+            changed[index]["diff_cache"] = "miss"
+            diff_cache.store(cache_keys[index], diff)
+
+    # Fork the diff workers before any fetch thread starts: a child forked while another
+    # thread holds a lock (logging, connection pool) can deadlock on it
+    pool = Pool(processes=min(processes, len(changed))) if processes > 1 and len(changed) > 1 else None
+    try:
+        with ThreadPoolExecutor(max_workers=Config.GITHUB_FETCH_CONCURRENCY) as executor:
+            fetched = executor.map(fetch, changed)
+            if pool is None:
+                for index, diff in map(_diff_job, jobs(fetched)):
+                    collect(index, diff)
+            else:
+                # apply_async rather than imap: billiard workers only exit promptly once the
+                # results they produced are acknowledged, which its imap iterators never do
+                pending = [pool.apply_async(_diff_job, (job,)) for job in jobs(fetched)]
+                for result in pending:
+                    collect(*result.get())
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return changed
+
+
+def compare_trees(spec_a: TreeSpec, spec_b: TreeSpec, engine: Optional[str] = None,
+                  max_files: Optional[int] = None) -> Dict[str, Any]:
+    """List both trees, skip files with identical blobs and diff the rest (at most `max_files`)"""
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        files_a_future = executor.submit(list_tree, spec_a)
+        files_b_future = executor.submit(list_tree, spec_b)
+        files_a, files_b = files_a_future.result(), files_b_future.result()
+    listed = time.monotonic()
+
+    changed, unchanged = plan_tree_comparison(files_a, files_b)
+    max_files = max_files or Config.TREE_COMPARE_MAX_FILES
+    skipped = changed[max_files:]
+    attributes = load_gitattributes(spec_b.repo_url, spec_b.ref) if Config.FILE_PREFILTER_ENABLED else None
+    changed = diff_tree_files(spec_a, spec_b, changed[:max_files], engine=engine, attributes=attributes)
+    logging.info(f"Compared trees: {len(changed)} changed files diffed, {unchanged} unchanged, "
+                 f"{len(skipped)} over the limit, in {time.monotonic() - started:.2f}s")
+
+    diffed = [entry["diff"]["summary_lines_changed"] for entry in changed if "diff" in entry]
+    return {
+        "files": changed,
+        "not_compared": [entry["path"] for entry in skipped],
+        "summary": {
+            "files_a": len(files_a),
+            "files_b": len(files_b),
+            "unchanged": unchanged,
+            "added": sum(1 for entry in changed if entry["status"] == "added"),
+            "removed": sum(1 for entry in changed if entry["status"] == "removed"),
+            "modified": sum(1 for entry in changed if entry["status"] == "modified"),
+            "binary": sum(1 for entry in changed if entry.get("binary")),
+            "generated": sum(1 for entry in changed if entry.get("classification", {}).get("category") == "generated"),
+            "vendored": sum(1 for entry in changed if entry.get("classification", {}).get("category") == "vendored"),
+            "errors": sum(1 for entry in changed if "error" in entry),
+            "lines_added": sum(counts["added"] for counts in diffed),
+            "lines_removed": sum(counts["removed"] for counts in diffed),
+        },
+        "meta": {
+            "list_seconds": round(listed - started, 2),
+            "diff_seconds": round(time.monotonic() - listed, 2),
+        },
+    }
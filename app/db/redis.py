@@ -1,14 +1,15 @@
 import redis
 from ..config import Config
 
-def get_redis_client():
+def get_redis_client(**kwargs):
     """
     Connects to the Redis database using the provided credentials.
     Supports both URL format and individual connection parameters.
+    Extra keyword arguments (e.g. socket timeouts) are passed to the client.
     """
     # If REDIS_URL is provided, use it
     if Config.REDIS_URL:
-        return redis.StrictRedis.from_url(Config.REDIS_URL, decode_responses=True)
+        return redis.StrictRedis.from_url(Config.REDIS_URL, decode_responses=True, **kwargs)
     
     # Otherwise, use individual connection parameters
     return redis.Redis(
@@ -16,5 +17,6 @@ def get_redis_client():
         port=Config.REDIS_PORT,
         username=Config.REDIS_USERNAME,
         password=Config.REDIS_PASSWORD,
-        decode_responses=True
+        decode_responses=True,
+        **kwargs
     )
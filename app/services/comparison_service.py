@@ -1,28 +1,132 @@
 """
 Service for comparing files using Ollama
 """
-import json
 import time
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, List, Optional
 from ..config import Config
 from ..logger import logging
-from ..services.ollama_service import OllamaService
+from ..core.diff_chunker import chunk_diff
+from ..core.json_repair import parse_tolerant_json
+from ..core.llm_cache import LLMCacheStats
+from ..core.token_stream import TokenStream
+from ..services.ollama_service import generation_options, get_ollama_service
+
+SEVERITIES = ("critical", "major", "minor", "info")
+
+# JSON schema of the analysis, passed as Ollama's `format` (LLM_JSON_FORMAT=schema)
+ANALYSIS_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "analysis": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "file_section": {"type": "string"},
+                    "type": {"type": "string",
+                             "enum": ["style", "bug", "performance", "api", "security", "best_practice"]},
+                    "severity": {"type": "string", "enum": list(SEVERITIES[::-1])},
+                    "description": {"type": "string"},
+                    "suggestion": {"type": "string"},
+                    "lines": {
+                        "type": "object",
+                        "properties": {
+                            "start": {"type": ["integer", "null"]},
+                            "end": {"type": ["integer", "null"]}
+                        },
+                        "required": ["start", "end"]
+                    }
+                },
+                "required": ["file_section", "type", "severity", "description", "suggestion", "lines"]
+            }
+        },
+        "summary": {
+            "type": "object",
+            "properties": {
+                "total_issues": {"type": "integer"},
+                "critical": {"type": "integer"},
+                "major": {"type": "integer"},
+                "minor": {"type": "integer"},
+                "info": {"type": "integer"},
+                "recommendation": {"type": "string"}
+            },
+            "required": ["total_issues", "critical", "major", "minor", "info", "recommendation"]
+        }
+    },
+    "required": ["analysis", "summary"]
+}
 
 
 class ComparisonService:
-    def __init__(self):
-        self.ollama_service = OllamaService()
+    def __init__(self, llm_profile: Optional[str] = None, llm_options: Optional[Dict[str, Any]] = None,
+                 bypass_llm_cache: bool = False, token_stream: Optional[TokenStream] = None):
+        self.ollama_service = get_ollama_service()
+        # Generation profile for every prompt (default: file_comparison / diff_chunk_review)
+        # and option overrides on top of it
+        self.llm_profile = llm_profile
+        self.llm_options = llm_options
+        # LLM response cache: bypass skips lookups (fresh responses are still stored)
+        self.bypass_llm_cache = bypass_llm_cache
+        self.llm_cache = LLMCacheStats()
+        # Live model output, one source per prompt (file name, or file name and chunk)
+        self.token_stream = token_stream
+        # Ollama `format` for the analysis: the schema, plain "json" (older servers) or none
+        self.response_format = {"schema": ANALYSIS_SCHEMA, "json": "json"}.get(Config.LLM_JSON_FORMAT)
     
-    def generate_comparison_prompt(self, file_a_content: str, file_b_content: str, 
-                                   file_a_name: str, file_b_name: str, 
-                                   diff_text: str) -> str:
-        """Generate the comparison prompt for Ollama"""
-        
-        # Truncate files if too large (keep first 5000 chars each)
-        max_file_length = 5000
-        file_a_preview = file_a_content[:max_file_length] + ("..." if len(file_a_content) > max_file_length else "")
-        file_b_preview = file_b_content[:max_file_length] + ("..." if len(file_b_content) > max_file_length else "")
-        diff_preview = diff_text[:3000] + ("..." if len(diff_text) > 3000 else "")
+    def settings(self) -> Dict[str, Any]:
+        """Everything besides the diff that shapes the analysis: model, effective generation options, format, chunking"""
+        return {
+            "model": self.ollama_service.model,
+            "generation": {
+                profile: generation_options(self.llm_profile or profile, self.llm_options)[0]
+                for profile in ("file_comparison", "diff_chunk_review")
+            },
+            "format": Config.LLM_JSON_FORMAT,
+            "chunk_tokens": Config.LLM_CHUNK_TOKENS,
+            "max_chunks": Config.LLM_MAX_CHUNKS,
+        }
+    
+    @staticmethod
+    def format_changed_symbols(semantic_diff: Dict[str, Any]) -> str:
+        """Prompt section with the code of every added, removed or changed symbol"""
+        sections = []
+        omitted = []
+        for symbol in semantic_diff["symbols"]:
+            if symbol["source_a"] is None and symbol["source_b"] is None:
+                omitted.append(f"{symbol['name']} ({symbol['status']})")
+                continue
+            ranges = ", ".join(
+                f"{side} lines {lines[0]}-{lines[1]}"
+                for side, lines in (("A", symbol["lines_a"]), ("B", symbol["lines_b"])) if lines
+            )
+            section = f"{symbol['kind']} {symbol['name']} ({symbol['status']}; {ranges}):"
+            for side, source in (("File A", symbol["source_a"]), ("File B", symbol["source_b"])):
+                if source is not None:
+                    section += f"\n{side} version:\n```\n{source.rstrip()}\n```"
+            sections.append(section)
+        if omitted:
+            sections.append(f"Also changed (code omitted for length): {', '.join(omitted)}")
+        return "\n\n".join(sections)
+
+    def generate_comparison_prompt(self, file_a_name: str, file_b_name: str, diff_text: str,
+                                   semantic_diff: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Generate the comparison prompt for Ollama from the whole diff (no full-file previews).
+        With a semantic diff that found changed symbols, their code is added as context.
+        """
+        if semantic_diff and semantic_diff["symbols"]:
+            counts = semantic_diff["summary"]
+            context = f"""Changed symbols ({counts['added']} added, {counts['removed']} removed, {counts['changed']} changed; nested definitions are shown as "# ..." placeholders):
+
+{self.format_changed_symbols(semantic_diff)}
+
+"""
+            file_section = "<symbol name from the changed symbols above, or line range>"
+        else:
+            context = ""
+            file_section = "<function or region name or line range>"
         
         prompt = f"""You are a precise, conservative code-comparison agent. Always explain assumptions, never invent code, and return structured JSON.
 
@@ -31,19 +135,9 @@ Task: Compare two specific source files and produce a focused, useful report tha
 File A: {file_a_name}
 File B: {file_b_name}
 
-File A content (first {max_file_length} chars):
+{context}Unified diff:
 ```
-{file_a_preview}
-```
-
-File B content (first {max_file_length} chars):
-```
-{file_b_preview}
-```
-
-Unified diff (first 3000 chars):
-```
-{diff_preview}
+{diff_text}
 ```
 
 Analyze these files and provide:
@@ -59,7 +153,7 @@ Return ONLY valid JSON with this exact structure:
 {{
   "analysis": [
     {{
-      "file_section": "<function or region name or line range>",
+      "file_section": "{file_section}",
       "type": "style|bug|performance|api|security|best_practice",
       "severity": "info|minor|major|critical",
       "description": "<short human-readable>",
@@ -87,78 +181,201 @@ Return the JSON now:"""
         
         return prompt
     
-    def analyze_comparison(self, file_a_content: str, file_b_content: str,
-                          file_a_name: str, file_b_name: str,
-                          diff_text: str) -> Dict[str, Any]:
-        """Analyze file comparison using Ollama"""
-        
-        prompt = self.generate_comparison_prompt(
-            file_a_content, file_b_content,
-            file_a_name, file_b_name,
-            diff_text
-        )
-        
+    def generate_chunk_prompt(self, file_a_name: str, file_b_name: str, diff_chunk: str,
+                              chunk_index: int, chunk_count: int) -> str:
+        """Prompt for one hunk-aligned chunk of a large diff (no full-file previews)"""
+        return f"""You are a precise, conservative code-comparison agent. Always explain assumptions, never invent code, and return structured JSON.
+
+Task: Review part {chunk_index + 1} of {chunk_count} of the unified diff between two source files. Other parts are reviewed separately, so only report issues visible in this part.
+
+File A: {file_a_name}
+File B: {file_b_name}
+
+Unified diff hunks (part {chunk_index + 1}/{chunk_count}):
+```
+{diff_chunk}
+```
+
+For the changes shown, report semantic differences, potential bugs or risky changes, concrete improvements and API contract differences, each with a severity of "info", "minor", "major" or "critical". Use the line numbers from the @@ hunk headers.
+
+Return ONLY valid JSON with this exact structure:
+
+{{
+  "analysis": [
+    {{
+      "file_section": "<function or region name or line range>",
+      "type": "style|bug|performance|api|security|best_practice",
+      "severity": "info|minor|major|critical",
+      "description": "<short human-readable>",
+      "suggestion": "<concrete fix or code fragment (<=200 chars) or link to linter rule>",
+      "lines": {{"start": <int|null>, "end": <int|null>}}
+    }}
+  ],
+  "summary": {{
+    "total_issues": <int>,
+    "critical": <int>,
+    "major": <int>,
+    "minor": <int>,
+    "info": <int>,
+    "recommendation": "<one-sentence recommendation for this part>"
+  }}
+}}
+
+Constraints:
+- NEVER invent code or claims; if uncertain, say "uncertain — needs human check"
+- Return ONLY the JSON object, no markdown, no code blocks, no explanations outside the JSON
+
+Return the JSON now:"""
+
+    @staticmethod
+    def summarize(analysis: List[Dict[str, Any]], recommendation: str) -> Dict[str, Any]:
+        """`summary` block with the severity counts of `analysis`"""
+        severities = [str(item.get("severity", "")).lower() for item in analysis]
+        return {
+            "total_issues": len(analysis),
+            **{severity: severities.count(severity) for severity in SEVERITIES},
+            "recommendation": recommendation
+        }
+
+    @classmethod
+    def parse_analysis(cls, response_text: str) -> Optional[Dict[str, Any]]:
+        """
+        Analysis dict from a model response (prose and code fences around the JSON are ignored),
+        or None when it holds no usable JSON. A truncated response keeps its complete
+        `analysis` entries, with the summary recomputed from them and `repaired` set.
+        """
+        data, repaired = parse_tolerant_json(response_text, openers="{")
+        if not isinstance(data, dict):
+            return None
+        if not repaired:
+            return data
+        required = ANALYSIS_SCHEMA["properties"]["analysis"]["items"]["required"]
+        items = data.get("analysis")
+        analysis = [item for item in (items if isinstance(items, list) else [])
+                    if isinstance(item, dict) and all(field in item for field in required)]
+        recommendation = (data.get("summary") or {}).get("recommendation")
+        return {
+            "analysis": analysis,
+            "summary": cls.summarize(
+                analysis, recommendation or "Model output was cut off; showing the issues reported before that."
+            ),
+            "repaired": True
+        }
+
+    @staticmethod
+    def _error_result(error: str, recommendation: str) -> Dict[str, Any]:
+        return {
+            "error": error,
+            "analysis": [],
+            "summary": {
+                "total_issues": 0,
+                "critical": 0,
+                "major": 0,
+                "minor": 0,
+                "info": 0,
+                "recommendation": recommendation
+            }
+        }
+
+    def _run_analysis(self, prompt: str, profile: str = "file_comparison", source: str = "") -> Dict[str, Any]:
+        """Send one prompt to Ollama and parse the JSON analysis out of the response"""
+        response_text = ""
+        on_token = self.token_stream.publisher(source) if self.token_stream is not None else None
         try:
             # Get analysis from Ollama
-            response_text = self.ollama_service.generate_text(prompt, max_tokens=4000)
-            
-            # Try to extract JSON from response
-            # Remove markdown code blocks if present
-            response_text = response_text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
+            response_text = self.ollama_service.generate_text(
+                prompt, profile=self.llm_profile or profile, options=self.llm_options,
+                use_cache=not self.bypass_llm_cache, cache_stats=self.llm_cache, on_token=on_token,
+                format=self.response_format
+            )
             
-            # Try to find JSON object
-            start_idx = response_text.find("{")
-            end_idx = response_text.rfind("}") + 1
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_text = response_text[start_idx:end_idx]
-                analysis_data = json.loads(json_text)
-                return analysis_data
-            else:
-                # Fallback: return error in expected format
-                return {
-                    "analysis": [],
-                    "summary": {
-                        "total_issues": 0,
-                        "critical": 0,
-                        "major": 0,
-                        "minor": 0,
-                        "info": 0,
-                        "recommendation": "Could not parse LLM response. Raw response: " + response_text[:500]
-                    }
-                }
+            # Tolerant parse: code fences and surrounding prose are skipped, truncated JSON is repaired
+            analysis_data = self.parse_analysis(response_text)
+            if analysis_data is None:
+                logging.error(f"Unparseable LLM response: {response_text[:500]}")
+                return self._error_result(
+                    "unparseable_response",
+                    "Could not parse LLM response. Raw response: " + response_text[:500]
+                )
+            if analysis_data.get("repaired"):
+                logging.warning(f"Repaired truncated LLM response ({len(analysis_data['analysis'])} complete issues kept)")
+            return analysis_data
                 
-        except json.JSONDecodeError as e:
-            logging.error(f"JSON decode error: {e}. Response: {response_text[:500]}")
-            return {
-                "analysis": [],
-                "summary": {
-                    "total_issues": 0,
-                    "critical": 0,
-                    "major": 0,
-                    "minor": 0,
-                    "info": 0,
-                    "recommendation": f"JSON parsing error: {str(e)}. Please check the LLM response format."
-                }
-            }
         except Exception as e:
             logging.error(f"Error in comparison analysis: {e}")
-            return {
-                "analysis": [],
-                "summary": {
-                    "total_issues": 0,
-                    "critical": 0,
-                    "major": 0,
-                    "minor": 0,
-                    "info": 0,
-                    "recommendation": f"Analysis error: {str(e)}"
-                }
-            }
+            return self._error_result("analysis_error", f"Analysis error: {str(e)}")
+        finally:
+            if on_token is not None:
+                on_token.close()
+
+    @staticmethod
+    def merge_analyses(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Reduce per-chunk analyses: concatenate the `analysis` arrays in chunk order and
+        recompute the `summary` counts from the merged issues. Failed chunks are reported
+        through `error` ("partial_analysis") so the merged result is not cached.
+        """
+        analysis = []
+        recommendations = []
+        failed = 0
+        repaired = 0
+        for index, result in enumerate(results):
+            if result.get("error"):
+                failed += 1
+                recommendations.append(f"Part {index + 1}: {result['summary']['recommendation']}")
+                continue
+            repaired += bool(result.get("repaired"))
+            analysis.extend(item for item in result.get("analysis", []) if isinstance(item, dict))
+            recommendation = (result.get("summary") or {}).get("recommendation")
+            if recommendation:
+                recommendations.append(f"Part {index + 1}: {recommendation}")
+
+        merged = {
+            "analysis": analysis,
+            "summary": ComparisonService.summarize(analysis, " ".join(recommendations)),
+            "chunks": {"total": len(results), "failed": failed, "repaired": repaired}
+        }
+        if failed == len(results):
+            merged["error"] = results[0]["error"] if results else "analysis_error"
+        elif failed:
+            merged["error"] = "partial_analysis"
+        return merged
+
+    def analyze_comparison(self, file_a_name: str, file_b_name: str,
+                          diff_text: str, semantic_diff: Optional[Dict[str, Any]] = None,
+                          diff_chunks: Optional[List[str]] = None, skipped_chunks: int = 0) -> Dict[str, Any]:
+        """
+        Analyze file comparison using Ollama.
+        Diffs that fit in one LLM_CHUNK_TOKENS chunk are sent whole in a single prompt, with
+        the changed symbols' code (from `semantic_diff`) as context;
+        larger diffs are split on hunk boundaries and the chunks analyzed concurrently (map-reduce).
+        `diff_chunks` (and `skipped_chunks`) are chunks of the whole diff from compute_unified_diff;
+        without them `diff_text` is chunked, which only covers what it holds.
+        """
+        if diff_chunks is None:
+            chunks = chunk_diff(diff_text, Config.LLM_CHUNK_TOKENS)
+            skipped = len(chunks[Config.LLM_MAX_CHUNKS:])
+            chunks = chunks[:Config.LLM_MAX_CHUNKS]
+        else:
+            chunks = diff_chunks[:Config.LLM_MAX_CHUNKS]
+            skipped = skipped_chunks + len(diff_chunks[Config.LLM_MAX_CHUNKS:])
+        if len(chunks) <= 1 and not skipped:
+            prompt = self.generate_comparison_prompt(
+                file_a_name, file_b_name,
+                chunks[0] if chunks else diff_text, semantic_diff
+            )
+            return self._run_analysis(prompt, source=file_b_name)
+
+        logging.info(f"Analyzing diff of {file_a_name} and {file_b_name} in {len(chunks)} chunks"
+                     f"{f' ({skipped} over LLM_MAX_CHUNKS skipped)' if skipped else ''}")
+        prompts = [
+            self.generate_chunk_prompt(file_a_name, file_b_name, chunk, index, len(chunks))
+            for index, chunk in enumerate(chunks)
+        ]
+        sources = [f"{file_b_name} (part {index + 1}/{len(chunks)})" for index in range(len(chunks))]
+        with ThreadPoolExecutor(max_workers=max(1, Config.LLM_CHUNK_CONCURRENCY)) as executor:
+            results = list(executor.map(partial(self._run_analysis, profile="diff_chunk_review"), prompts, sources))
 
+        merged = self.merge_analyses(results)
+        merged["chunks"]["skipped"] = skipped
+        return merged
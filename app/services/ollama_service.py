@@ -1,63 +1,325 @@
+"""
+Ollama client: one pooled HTTP session per worker process, shared by every task
+"""
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Any, Iterator, List, Optional, Sequence, Tuple, Union
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from ..config import Config
 from ..logger import logging
+from ..core.llm_cache import LLMCacheStats, get_llm_cache
+from ..core.ollama_pool import get_ollama_pool, ollama_api_urls
+
+Timeout = Union[float, Tuple[float, float]]
+
+# Ollama `options` per use. num_predict caps the output and num_ctx sizes the context window
+# (prompt + output): the two most direct latency controls. A profile may also set the
+# request-level keep_alive. Config.OLLAMA_PROFILES (JSON) overrides or adds profiles.
+GENERATION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "pr_file_review": {"num_predict": 1024, "num_ctx": 8192, "temperature": 0.2, "top_k": 40},
+    "file_comparison": {"num_predict": 4000, "num_ctx": 8192, "temperature": 0.1, "top_k": 20},
+    "diff_chunk_review": {"num_predict": 1024, "num_ctx": 4096, "temperature": 0.1, "top_k": 20},
+}
+
+_profiles: Optional[Dict[str, Dict[str, Any]]] = None
+_profiles_source: Optional[str] = None
+
+
+def generation_profiles() -> Dict[str, Dict[str, Any]]:
+    """Built-in profiles with Config.OLLAMA_PROFILES merged over them (per option)"""
+    global _profiles, _profiles_source
+    if _profiles is None or _profiles_source != Config.OLLAMA_PROFILES:
+        profiles = {name: dict(options) for name, options in GENERATION_PROFILES.items()}
+        if Config.OLLAMA_PROFILES:
+            try:
+                overrides = json.loads(Config.OLLAMA_PROFILES)
+            except ValueError as e:
+                logging.error(f"Ignoring invalid OLLAMA_PROFILES: {e}")
+                overrides = {}
+            for name, options in overrides.items():
+                profiles.setdefault(name, {}).update(options)
+        _profiles, _profiles_source = profiles, Config.OLLAMA_PROFILES
+    return _profiles
+
+
+def generation_options(profile: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                       max_tokens: Optional[int] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Ollama options and keep_alive for a profile, with per-call `options` and `max_tokens` on top"""
+    profiles = generation_profiles()
+    name = profile or "default"
+    if name not in profiles:
+        raise ValueError(f"Unknown generation profile '{name}', expected one of: {', '.join(profiles)}")
+    resolved = {**profiles[name], **(options or {})}
+    if max_tokens is not None:
+        resolved["num_predict"] = max_tokens
+    # keep_alive may legitimately be 0 (unload right away) or -1 (keep loaded)
+    keep_alive = resolved.pop("keep_alive") if "keep_alive" in resolved else Config.OLLAMA_KEEP_ALIVE or None
+    return resolved, keep_alive
+
+
+_session: Optional[requests.Session] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    # Only connection failures are retried: a generation that was sent may already be running
+    retry = Retry(total=Config.OLLAMA_MAX_RETRIES, connect=Config.OLLAMA_MAX_RETRIES, read=0, status=0,
+                  backoff_factor=0.5, raise_on_status=False)
+    # One connection pool (of OLLAMA_POOL_MAXSIZE) per Ollama host
+    adapter = HTTPAdapter(pool_connections=len(ollama_api_urls()), pool_maxsize=Config.OLLAMA_POOL_MAXSIZE,
+                          pool_block=True, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_ollama_session() -> requests.Session:
+    """
+    Return the process-wide Ollama session (and the executor behind the async methods).
+    Both are rebuilt after a fork so prefork Celery children never share sockets.
+    """
+    global _session, _executor, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _executor = ThreadPoolExecutor(max_workers=Config.OLLAMA_POOL_MAXSIZE,
+                                               thread_name_prefix="ollama")
+                _session_pid = pid
+                logging.info(f"Created Ollama HTTP session for pid {pid} (pool_maxsize={Config.OLLAMA_POOL_MAXSIZE})")
+    return _session
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    get_ollama_session()
+    return _executor
+
+
+def _is_host_failure(error: Exception) -> bool:
+    """Errors that say the host is unwell (not that the request was bad)"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.exceptions.HTTPError) and response is not None and response.status_code >= 500
+
 
 class OllamaService:
-    def __init__(self):
-        self.api_url = Config.OLLAMA_API_URL
-        self.model = Config.OLLAMA_MODEL
+    def __init__(self, api_url: Optional[Union[str, Sequence[str]]] = None, model: Optional[str] = None,
+                 timeout: Optional[Timeout] = None):
+        # One URL or several (least-outstanding routing with failover, see core.ollama_pool)
+        urls = [api_url] if isinstance(api_url, str) else list(api_url or ollama_api_urls())
+        self.api_urls = [url.rstrip("/") for url in urls]
+        self.api_url = self.api_urls[0]
+        self.model = model or Config.OLLAMA_MODEL
+        # (connect, read): generations can legitimately take minutes, connecting should not
+        self.timeout = timeout or (Config.OLLAMA_CONNECT_TIMEOUT, Config.OLLAMA_READ_TIMEOUT)
 
-    def generate_text(self, prompt, model=None, max_tokens=None):
+    @contextmanager
+    def _host_post(self, endpoint: str, payload: Dict[str, Any], timeout: Optional[Timeout] = None,
+                   stream: bool = False) -> Iterator[requests.Response]:
         """
-        Generate text using Ollama API
+        POST to the least busy admitted host; the response is read inside the block, while
+        the request counts as in flight. Connection failures move on to the next host; a read
+        timeout counts against the host but is raised, since the generation may be running there.
         """
-        if model is None:
-            model = self.model
-        
+        pool = get_ollama_pool(self.api_urls)
+        tried: List[str] = []
+        while True:
+            with pool.lease(exclude=tried) as url:
+                try:
+                    response = get_ollama_session().post(
+                        f"{url}/{endpoint}",
+                        json=payload,
+                        timeout=timeout or self.timeout,
+                        stream=stream
+                    )
+                except requests.exceptions.ConnectionError as e:
+                    # ConnectTimeout included: nothing was sent, so another host can take the request
+                    pool.record_failure(url, e)
+                    tried.append(url)
+                    if len(tried) < len(self.api_urls):
+                        logging.warning(f"Ollama host {url} unreachable, trying another host: {e}")
+                        continue
+                    raise
+                except requests.exceptions.Timeout as e:
+                    pool.record_failure(url, e)
+                    raise
+                try:
+                    with response:
+                        response.raise_for_status()
+                        yield response
+                except requests.exceptions.RequestException as e:
+                    if _is_host_failure(e):
+                        pool.record_failure(url, e)
+                    raise
+                pool.record_success(url)
+                return
+
+    def _post(self, endpoint: str, payload: Dict[str, Any], timeout: Optional[Timeout] = None) -> Dict[str, Any]:
         try:
-            response = requests.post(
-                f"{self.api_url}/generate",
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=300  # 5 minute timeout for long responses
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result.get("response", "").strip()
+            with self._host_post(endpoint, payload, timeout) as response:
+                return response.json()
         except requests.exceptions.RequestException as e:
             logging.error(f"Ollama API error: {e}")
             raise
 
-    def chat(self, messages, model=None):
-        """
-        Chat completion using Ollama API
-        """
-        if model is None:
-            model = self.model
-        
+    def _post_stream(self, endpoint: str, payload: Dict[str, Any], field: Callable[[Dict], str],
+                     on_token: Callable[[str], None], timeout: Optional[Timeout] = None) -> str:
+        """POST with "stream": true, passing each piece of output to on_token; returns the full text"""
+        parts = []
         try:
-            response = requests.post(
-                f"{self.api_url}/chat",
-                json={
-                    "model": model,
-                    "messages": messages,
-                    "stream": False
-                },
-                timeout=300
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result.get("message", {}).get("content", "").strip()
+            with self._host_post(endpoint, {**payload, "stream": True}, timeout, stream=True) as response:
+                # Newline-delimited JSON objects, the last one with "done": true
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise requests.exceptions.RequestException(chunk["error"])
+                    piece = field(chunk)
+                    if piece:
+                        parts.append(piece)
+                        on_token(piece)
+                    if chunk.get("done"):
+                        break
         except requests.exceptions.RequestException as e:
             logging.error(f"Ollama API error: {e}")
             raise
+        return "".join(parts)
+
+    @staticmethod
+    def _payload(model: str, profile: Optional[str], options: Optional[Dict[str, Any]],
+                 max_tokens: Optional[int], format: Optional[Union[str, Dict[str, Any]]] = None,
+                 **fields) -> Dict[str, Any]:
+        resolved, keep_alive = generation_options(profile, options, max_tokens)
+        payload = {"model": model, **fields, "stream": False}
+        if resolved:
+            payload["options"] = resolved
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        if format is not None:
+            # "json" or a JSON schema the output is constrained to
+            payload["format"] = format
+        return payload
+
+    def _cached_call(self, endpoint: str, payload: Dict[str, Any], cache_prompt: str, field: Callable[[Dict], str],
+                     timeout: Optional[Timeout], use_cache: bool, cache_stats: Optional[LLMCacheStats],
+                     on_token: Optional[Callable[[str], None]] = None) -> str:
+        """
+        POST through the LLM response cache. With use_cache=False the cache is not read
+        (bypass) but the fresh response still replaces the cached one.
+        With on_token the response is streamed token by token (a cached one arrives whole).
+        """
+        cache = get_llm_cache()
+        key = None
+        outcome = "disabled"
+        if cache is not None:
+            key_options = payload.get("options", {})
+            if "format" in payload:
+                key_options = {**key_options, "format": payload["format"]}
+            key = cache.make_key(payload["model"], key_options, cache_prompt)
+            text = cache.lookup(key) if use_cache else None
+            if text is not None:
+                if cache_stats is not None:
+                    cache_stats.record("hit")
+                if on_token is not None:
+                    on_token(text)
+                return text
+            outcome = "miss" if use_cache else "bypass"
+
+        if on_token is not None:
+            text = self._post_stream(endpoint, payload, field, on_token, timeout).strip()
+        else:
+            text = field(self._post(endpoint, payload, timeout)).strip()
+        if key is not None and text:
+            cache.store(key, text)
+        if cache_stats is not None:
+            cache_stats.record(outcome)
+        return text
+
+    def generate_text(self, prompt, model=None, max_tokens=None, timeout: Optional[Timeout] = None,
+                      profile: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                      use_cache: bool = True, cache_stats: Optional[LLMCacheStats] = None,
+                      on_token: Optional[Callable[[str], None]] = None,
+                      format: Optional[Union[str, Dict[str, Any]]] = None):
+        """
+        Generate text using Ollama API.
+        `profile` names a generation profile; `options` and `max_tokens` (num_predict) override it.
+        Responses are cached per (model, options, format, prompt); `cache_stats` records the outcome.
+        `on_token` streams the output: it is called with each piece as Ollama produces it.
+        `format` ("json" or a JSON schema) constrains the output to JSON.
+        """
+        if model is None:
+            model = self.model
+
+        payload = self._payload(model, profile, options, max_tokens, format, prompt=prompt)
+        return self._cached_call("generate", payload, prompt, lambda result: result.get("response", ""),
+                                 timeout, use_cache, cache_stats, on_token)
 
-    def analyze_code(self, file_name, content):
+    def chat(self, messages, model=None, timeout: Optional[Timeout] = None, max_tokens=None,
+             profile: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+             use_cache: bool = True, cache_stats: Optional[LLMCacheStats] = None,
+             on_token: Optional[Callable[[str], None]] = None,
+             format: Optional[Union[str, Dict[str, Any]]] = None):
         """
-        Analyze code using Ollama
+        Chat completion using Ollama API (generation options, caching, streaming and format as in generate_text)
+        """
+        if model is None:
+            model = self.model
+
+        payload = self._payload(model, profile, options, max_tokens, format, messages=messages)
+        return self._cached_call("chat", payload, "chat:" + json.dumps(messages, sort_keys=True),
+                                 lambda result: result.get("message", {}).get("content", ""),
+                                 timeout, use_cache, cache_stats, on_token)
+
+    async def agenerate_text(self, prompt, model=None, max_tokens=None, timeout: Optional[Timeout] = None,
+                             profile: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                             use_cache: bool = True, cache_stats: Optional[LLMCacheStats] = None,
+                             on_token: Optional[Callable[[str], None]] = None,
+                             format: Optional[Union[str, Dict[str, Any]]] = None):
+        """
+        generate_text for asyncio callers (e.g. asyncio.gather over many prompts).
+        Runs on the session's thread pool, so fan-out is bounded by OLLAMA_POOL_MAXSIZE.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_executor(), partial(self.generate_text, prompt, model=model, max_tokens=max_tokens, timeout=timeout,
+                                     profile=profile, options=options, use_cache=use_cache, cache_stats=cache_stats,
+                                     on_token=on_token, format=format)
+        )
+
+    async def achat(self, messages: List[Dict[str, str]], model=None, timeout: Optional[Timeout] = None,
+                    max_tokens=None, profile: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                    use_cache: bool = True, cache_stats: Optional[LLMCacheStats] = None,
+                    on_token: Optional[Callable[[str], None]] = None,
+                    format: Optional[Union[str, Dict[str, Any]]] = None):
+        """chat for asyncio callers, see agenerate_text"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_executor(), partial(self.chat, messages, model=model, timeout=timeout, max_tokens=max_tokens,
+                                     profile=profile, options=options, use_cache=use_cache, cache_stats=cache_stats,
+                                     on_token=on_token, format=format)
+        )
+
+    def analyze_code(self, file_name, content, profile: Optional[str] = None,
+                     options: Optional[Dict[str, Any]] = None, use_cache: bool = True,
+                     cache_stats: Optional[LLMCacheStats] = None, on_token: Optional[Callable[[str], None]] = None):
+        """
+        Analyze code using Ollama (on_token streams the output, see generate_text)
         """
         prompt = f"""Analyze the following GitHub Pull Request file for potential issues:
 File Name: {file_name}
@@ -70,5 +332,16 @@ Please provide:
 3. Performance improvements
 4. Best practices recommendations
 """
-        return self.generate_text(prompt)
+        return self.generate_text(prompt, profile=profile or "pr_file_review", options=options,
+                                  use_cache=use_cache, cache_stats=cache_stats, on_token=on_token)
+
+
+_service: Optional[OllamaService] = None
+
 
+def get_ollama_service() -> OllamaService:
+    """Process-wide OllamaService for the configured host and model"""
+    global _service
+    if _service is None:
+        _service = OllamaService()
+    return _service
@@ -4,12 +4,25 @@ from ..db.postgres import update_task_status
 from ..db.models import SessionLocal
 from ..config import Config
 from ..logger import logging
-from ..core.github_utils import fetch_pr_files, fetch_pr_commits
-from ..core.file_comparison import fetch_file_from_raw_url, compute_unified_diff
-from ..services.ollama_service import OllamaService
+from ..core.pr_backends import iter_pr_changes, iter_pr_file_changes
+from ..core.concurrency import ordered_map, prefetch
+from ..core.file_comparison import fetch_file_from_raw_url, parse_raw_url, content_text, intern_content, release_content
+from ..core.diff_engine import LineTable
+from ..core.diff_cache import cached_unified_diff
+from ..core.github_client import get_pool_stats
+from ..core.ollama_pool import get_ollama_pool_stats
+from ..core.tree_comparison import TreeSpec, compare_trees
+from ..core.file_classifier import SAMPLE_BYTES, load_gitattributes, prefilter
+from ..core.blob_cache import get_cached_comparison, store_cached_comparison
+from ..services.ollama_service import get_ollama_service
+from ..core.llm_cache import LLMCacheStats
+from ..core.token_stream import get_token_stream
 from ..services.comparison_service import ComparisonService
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
 
 app = Celery(
     "tasks",
@@ -18,166 +31,358 @@ app = Celery(
 )
 
 
+def _skipped_analysis(classification: dict) -> str:
+    return f"Skipped LLM analysis: {classification['category']} file ({classification['reason']})"
+
+
+def _analyze_pr_file(ollama_service, attributes, llm_cache: LLMCacheStats, analysis_options: dict,
+                     token_stream, file: dict) -> dict:
+    """Analysis entry for one file of a PR (files mode); errors are recorded on the entry"""
+    classification = prefilter(file["filename"], file["content"], attributes, patch=True)
+    file_llm_cache = LLMCacheStats()
+    on_token = token_stream.publisher(file["filename"]) if token_stream is not None else None
+    try:
+        if classification and classification["skipped"]:
+            logging.info(f"Skipping file: {file['filename']} ({classification['category']}: {classification['reason']})")
+            analysis = _skipped_analysis(classification)
+        else:
+            logging.info(f"Analyzing file: {file['filename']}")
+            analysis = ollama_service.analyze_code(
+                file_name=file["filename"],
+                content=file["content"],
+                cache_stats=file_llm_cache,
+                on_token=on_token,
+                **analysis_options
+            )
+        result = {
+            "file_name": file["filename"],
+            "analysis": analysis,
+            "llm_cache": file_llm_cache.last,
+        }
+    except Exception as e:
+        logging.error(f"Error analyzing file {file['filename']}: {e}")
+        result = {
+            "file_name": file["filename"],
+            "analysis": f"Error analyzing file: {str(e)}",
+        }
+    finally:
+        if on_token is not None:
+            on_token.close()
+    if classification:
+        result["classification"] = classification
+    if file_llm_cache.last:
+        llm_cache.record(file_llm_cache.last)
+    return result
+
+
+def _analyze_commit_file(ollama_service, attributes, llm_cache: LLMCacheStats, analysis_options: dict,
+                         token_stream, job: tuple) -> tuple:
+    """(commit entry, analysis entry) for one (commit entry, file) of a commit; errors are recorded on the entry"""
+    commit_analysis, file = job
+    filename = file.get("filename", "unknown")
+    patch = file.get("patch", "")
+    status = file.get("status", "")
+    additions = file.get("additions", 0)
+    deletions = file.get("deletions", 0)
+    
+    classification = prefilter(filename, patch, attributes, patch=True)
+    file_llm_cache = LLMCacheStats()
+    on_token = token_stream.publisher(filename) if token_stream is not None else None
+    
+    try:
+        if classification and classification["skipped"]:
+            logging.info(f"  Skipping file: {filename} ({classification['category']}: {classification['reason']})")
+            analysis = _skipped_analysis(classification)
+        elif patch:
+            logging.info(f"  Analyzing file: {filename} ({status}, +{additions}/-{deletions})")
+            analysis = ollama_service.analyze_code(
+                file_name=filename,
+                content=patch,
+                cache_stats=file_llm_cache,
+                on_token=on_token,
+                **analysis_options
+            )
+        else:
+            analysis = f"File {status} (no patch available). Additions: {additions}, Deletions: {deletions}"
+        
+        file_analysis = {
+            "filename": filename,
+            "status": status,
+            "additions": additions,
+            "deletions": deletions,
+            "analysis": analysis,
+            "llm_cache": file_llm_cache.last
+        }
+    except Exception as e:
+        logging.error(f"Error analyzing file {filename} in commit {commit_analysis['commit_sha']}: {e}")
+        file_analysis = {
+            "filename": filename,
+            "status": status,
+            "additions": additions,
+            "deletions": deletions,
+            "analysis": f"Error analyzing file: {str(e)}"
+        }
+    finally:
+        if on_token is not None:
+            on_token.close()
+    if classification:
+        file_analysis["classification"] = classification
+    if file_llm_cache.last:
+        llm_cache.record(file_llm_cache.last)
+    return commit_analysis, file_analysis
+
+
 @app.task(bind=True, name="analyze_pr_task")
-def analyze_pr_task(self, repo_url: str, pr_number: int):
+def analyze_pr_task(self, repo_url: str, pr_number: int, commit_limit: int = None,
+                    llm_profile: str = None, llm_options: dict = None, bypass_llm_cache: bool = False):
+    """
+    Analyze a PR's files (llm_profile / llm_options override the pr_file_review generation profile).
+    Up to ANALYZE_FILE_CONCURRENCY files are analyzed at once; results keep commit and file order.
+    Each file records its LLM response cache outcome; bypass_llm_cache skips cache lookups.
+    """
     logging.info(f"Received task for repo: {repo_url}, PR: {pr_number}")
     session = SessionLocal()
+    # Live model output for GET /stream/{task_id}, one source per file
+    token_stream = get_token_stream(self.request.id)
     try:
         # Update status to processing
         update_task_status(self.request.id, "processing", result=None, db=session)
         
-        # Initialize Ollama service
-        ollama_service = OllamaService()
+        # Shared Ollama client (pooled connections per worker process)
+        ollama_service = get_ollama_service()
+        llm_cache = LLMCacheStats()
+        analysis_options = {"profile": llm_profile, "options": llm_options, "use_cache": not bypass_llm_cache}
         
-        # Fetch 2 commits from the PR
-        logging.info(f"Fetching commits from PR #{pr_number}...")
-        commits = fetch_pr_commits(repo_url, pr_number, limit=2)
+        # Stream commits from the PR; later pages download while earlier commits are analyzed
+        if commit_limit is None:
+            commit_limit = Config.ANALYZE_COMMIT_LIMIT
+        logging.info(f"Fetching commits from PR #{pr_number} (limit: {commit_limit or 'all'})...")
+        commits = prefetch(iter_pr_changes(repo_url, pr_number, limit=commit_limit or None), Config.GITHUB_PREFETCH_BUFFER)
+        first_commit = next(commits, None)
         
-        if not commits:
+        if first_commit is None:
             # Fallback to PR files if no commits found
             logging.info("No commits found, falling back to PR files...")
-            files = fetch_pr_files(repo_url, pr_number)
-            if not files:
+            files = prefetch(iter_pr_file_changes(repo_url, pr_number), Config.GITHUB_PREFETCH_BUFFER)
+            first_file = next(files, None)
+            if first_file is None:
                 raise Exception("No files or commits found in the PR.")
             
-            results = []
-            for file in files:
-                logging.info(f"Analyzing file: {file['filename']}")
-                try:
-                    analysis = ollama_service.analyze_code(
-                        file_name=file["filename"],
-                        content=file["content"]
-                    )
-                    results.append({
-                        "file_name": file["filename"],
-                        "analysis": analysis,
-                    })
-                except Exception as e:
-                    logging.error(f"Error analyzing file {file['filename']}: {e}")
-                    results.append({
-                        "file_name": file["filename"],
-                        "analysis": f"Error analyzing file: {str(e)}",
-                    })
+            attributes = load_gitattributes(repo_url) if Config.FILE_PREFILTER_ENABLED else None
+            analyze = partial(_analyze_pr_file, ollama_service, attributes, llm_cache, analysis_options, token_stream)
+            results = list(ordered_map(analyze, chain([first_file], files), Config.ANALYZE_FILE_CONCURRENCY))
         else:
             # Analyze commits
-            logging.info(f"Found {len(commits)} commits. Analyzing...")
+            logging.info("Found commits. Analyzing...")
+            # .gitattributes (linguist-generated etc.) as of the first analyzed commit
+            attributes = load_gitattributes(repo_url, first_commit["full_sha"]) if Config.FILE_PREFILTER_ENABLED else None
             results = []
             
-            for idx, commit in enumerate(commits, 1):
-                logging.info(f"Analyzing commit {idx}/{len(commits)}: {commit['sha']}")
-                commit_analysis = {
-                    "commit_sha": commit["sha"],
-                    "commit_message": commit["message"],
-                    "author": commit["author"],
-                    "date": commit["date"],
-                    "files_analyzed": []
-                }
-                
-                # Analyze each file in the commit
-                for file in commit.get("files", []):
-                    filename = file.get("filename", "unknown")
-                    patch = file.get("patch", "")
-                    status = file.get("status", "")
-                    additions = file.get("additions", 0)
-                    deletions = file.get("deletions", 0)
-                    
-                    logging.info(f"  Analyzing file: {filename} ({status}, +{additions}/-{deletions})")
-                    
-                    try:
-                        if patch:
-                            analysis = ollama_service.analyze_code(
-                                file_name=filename,
-                                content=patch
-                            )
-                        else:
-                            analysis = f"File {status} (no patch available). Additions: {additions}, Deletions: {deletions}"
-                        
-                        commit_analysis["files_analyzed"].append({
-                            "filename": filename,
-                            "status": status,
-                            "additions": additions,
-                            "deletions": deletions,
-                            "analysis": analysis
-                        })
-                    except Exception as e:
-                        logging.error(f"Error analyzing file {filename} in commit {commit['sha']}: {e}")
-                        commit_analysis["files_analyzed"].append({
-                            "filename": filename,
-                            "status": status,
-                            "additions": additions,
-                            "deletions": deletions,
-                            "analysis": f"Error analyzing file: {str(e)}"
-                        })
-                
-                results.append(commit_analysis)
+            def commit_files():
+                for idx, commit in enumerate(chain([first_commit], commits), 1):
+                    logging.info(f"Analyzing commit {idx}: {commit['sha']}")
+                    commit_analysis = {
+                        "commit_sha": commit["sha"],
+                        "commit_message": commit["message"],
+                        "author": commit["author"],
+                        "date": commit["date"],
+                        "files_analyzed": []
+                    }
+                    if "commits" in commit:
+                        # GraphQL backend: one entry for the PR's net change, with its commits listed
+                        commit_analysis["commits"] = commit["commits"]
+                    results.append(commit_analysis)
+                    for file in commit.get("files", []):
+                        yield commit_analysis, file
+            
+            # Files of every commit share one bounded pipeline, so a commit's last files
+            # overlap with the next commit's first ones
+            analyze = partial(_analyze_commit_file, ollama_service, attributes, llm_cache, analysis_options,
+                              token_stream)
+            for commit_analysis, file_analysis in ordered_map(analyze, commit_files(), Config.ANALYZE_FILE_CONCURRENCY):
+                commit_analysis["files_analyzed"].append(file_analysis)
 
         # Update task status in the database
         update_task_status(self.request.id, "completed", result=results, db=session)
-        logging.info(f"Task {self.request.id} completed successfully. Analyzed {len(results)} commits.")
+        if token_stream is not None:
+            token_stream.close("completed")
+        logging.info(f"Task {self.request.id} completed successfully. Analyzed {len(results)} commits. "
+                     f"LLM cache: {llm_cache.snapshot()}")
+        logging.info(f"GitHub connection pool stats: {get_pool_stats()}")
+        logging.info(f"Ollama host stats: {get_ollama_pool_stats()}")
         return results
     except Exception as e:
         update_task_status(self.request.id, "failed", result=str(e), db=session)
+        if token_stream is not None:
+            token_stream.close("failed")
         logging.error(f"Task {self.request.id} failed: {e}")
         raise
     finally:
         session.close()
 
 
+def _prefilter_raw_file(raw_url: str, file_result: dict):
+    """prefilter() for a fetched raw file, with its repository's .gitattributes"""
+    if not Config.FILE_PREFILTER_ENABLED:
+        return None
+    parsed = parse_raw_url(raw_url)
+    if parsed is None:
+        return prefilter(raw_url.rsplit("/", 1)[-1], content_text(file_result, SAMPLE_BYTES))
+    owner, repo, branch, file_path = parsed
+    attributes = load_gitattributes(f"https://github.com/{owner}/{repo}", branch)
+    return prefilter(file_path, content_text(file_result, SAMPLE_BYTES), attributes)
+
+
 @app.task(bind=True, name="compare_files_task")
-def compare_files_task(self, repo_a_raw_url: str, repo_b_raw_url: str, ref_a: str = "HEAD", ref_b: str = "HEAD"):
-    """Compare two files from different repositories"""
+def compare_files_task(self, repo_a_raw_url: str, repo_b_raw_url: str, ref_a: str = "HEAD", ref_b: str = "HEAD",
+                       metadata: str = "full", llm_profile: str = None, llm_options: dict = None,
+                       bypass_llm_cache: bool = False):
+    """
+    Compare two files from different repositories (metadata: none | sha | full).
+    llm_profile / llm_options override the file_comparison generation profile;
+    bypass_llm_cache skips LLM response cache lookups.
+    """
     start_time = time.time()
     session = SessionLocal()
+    file_a_result = file_b_result = None
+    # Live model output for GET /stream/{task_id}
+    token_stream = get_token_stream(self.request.id)
     
     try:
         # Update status to processing
         update_task_status(self.request.id, "processing", result=None, db=session, checkpoint="starting")
         
-        # Step 1: Fetch file A
-        logging.info(f"Step 1/3: Fetching file A from {repo_a_raw_url}")
-        update_task_status(self.request.id, "processing", result=None, db=session, checkpoint="fetch_file_a")
+        # Step 1: Fetch file A and file B in parallel
+        logging.info(f"Step 1/2: Fetching file A from {repo_a_raw_url} and file B from {repo_b_raw_url}")
+        update_task_status(self.request.id, "processing", result=None, db=session, checkpoint="fetch_files")
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            file_a_future = executor.submit(fetch_file_from_raw_url, repo_a_raw_url, ref_a, metadata)
+            file_b_future = executor.submit(fetch_file_from_raw_url, repo_b_raw_url, ref_b, metadata)
+            file_a_result = file_a_future.result()
+            file_b_result = file_b_future.result()
         
-        file_a_result = fetch_file_from_raw_url(repo_a_raw_url, ref_a)
         if not file_a_result["fetched"]:
             error_msg = f"Failed to fetch file A: {file_a_result.get('error', 'Unknown error')}"
             update_task_status(self.request.id, "failed", result={"error": error_msg}, db=session)
             raise Exception(error_msg)
-        
-        # Step 2: Fetch file B
-        logging.info(f"Step 2/3: Fetching file B from {repo_b_raw_url}")
-        update_task_status(self.request.id, "processing", result=None, db=session, checkpoint="fetch_file_b")
-        
-        file_b_result = fetch_file_from_raw_url(repo_b_raw_url, ref_b)
         if not file_b_result["fetched"]:
             error_msg = f"Failed to fetch file B: {file_b_result.get('error', 'Unknown error')}"
             update_task_status(self.request.id, "failed", result={"error": error_msg}, db=session)
             raise Exception(error_msg)
         
-        # Step 3: Compute diff and analyze
-        logging.info("Step 3/3: Computing diff and analyzing...")
+        # Step 2: Compute diff and analyze
+        logging.info("Step 2/2: Computing diff and analyzing...")
         update_task_status(self.request.id, "processing", result=None, db=session, checkpoint="compute_diff")
         
         # Extract file names from URLs
         file_a_name = repo_a_raw_url.split("/")[-1]
         file_b_name = repo_b_raw_url.split("/")[-1]
+        sha_a = file_a_result["meta"].get("sha")
+        sha_b = file_b_result["meta"].get("sha")
+        comparison_names = f"{file_a_name}\n{file_b_name}"
         
-        # Compute unified diff
-        diff_result = compute_unified_diff(
-            file_a_result["content"],
-            file_b_result["content"],
-            file_a_name,
-            file_b_name
-        )
-        
-        # Analyze using comparison service
-        comparison_service = ComparisonService()
-        analysis_result = comparison_service.analyze_comparison(
-            file_a_result["content"],
-            file_b_result["content"],
-            file_a_name,
-            file_b_name,
-            diff_result["unified_diff"]
+        identical = bool(sha_a) and sha_a == sha_b
+        diff_cache = None
+        llm_cache = None
+        classification = None
+        comparison_service = ComparisonService(llm_profile, llm_options, bypass_llm_cache, token_stream)
+        # Stored comparisons are only reused for the same diff, prefilter and generation settings
+        comparison_settings = {
+            **comparison_service.settings(),
+            "diff_engine": Config.DIFF_ENGINE,
+            "semantic": Config.SEMANTIC_DIFF_ENABLED,
+            "prefilter": Config.FILE_PREFILTER_SKIP if Config.FILE_PREFILTER_ENABLED else None,
+        }
+        # Bypassing the LLM cache also skips stored comparisons, which hold an earlier LLM analysis
+        cached_comparison = None if identical or bypass_llm_cache else get_cached_comparison(
+            sha_a, sha_b, comparison_names, comparison_settings
         )
+        if identical:
+            # Same blob on both sides: nothing to diff or analyze
+            comparison_cache = "identical"
+            diff_result = {"unified_diff": "", "summary_lines_changed": {"added": 0, "removed": 0, "modified": 0}}
+            analysis_result = {
+                "analysis": [],
+                "summary": {
+                    "total_issues": 0,
+                    "critical": 0,
+                    "major": 0,
+                    "minor": 0,
+                    "info": 0,
+                    "recommendation": f"Files are identical (blob {sha_a})."
+                }
+            }
+        elif cached_comparison is not None:
+            comparison_cache = "hit"
+            diff_result = cached_comparison["diff"]
+            analysis_result = cached_comparison["analysis_result"]
+        else:
+            comparison_cache = "miss"
+            # Generated / binary / vendored files skip the LLM (binary ones the line diff too)
+            classification = (
+                _prefilter_raw_file(repo_b_raw_url, file_b_result)
+                or _prefilter_raw_file(repo_a_raw_url, file_a_result)
+            )
+            skip_llm = bool(classification and classification["skipped"])
+            
+            if skip_llm and classification["category"] == "binary":
+                diff_result = {"unified_diff": "", "summary_lines_changed": {"added": 0, "removed": 0, "modified": 0}}
+            else:
+                # The prompt only needs the diff: intern both files into one line table and
+                # release the content buffers before diffing and the LLM call
+                line_table = LineTable()
+                lines_a = intern_content(file_a_result, line_table)
+                lines_b = intern_content(file_b_result, line_table)
+                release_content(file_a_result)
+                release_content(file_b_result)
+                
+                # Compute unified diff on the line IDs (or reuse one computed for the same contents);
+                # LLM chunks come from the whole diff, not the truncated text kept in the result
+                diff_result, diff_cache = cached_unified_diff(
+                    lines_a,
+                    lines_b,
+                    file_a_name,
+                    file_b_name,
+                    semantic=Config.SEMANTIC_DIFF_ENABLED,
+                    chunk_tokens=None if skip_llm else Config.LLM_CHUNK_TOKENS,
+                    max_chunks=Config.LLM_MAX_CHUNKS
+                )
+                del lines_a, lines_b, line_table
+                # Copy: the cached diff keeps its chunks
+                diff_result = dict(diff_result)
+                diff_chunks = diff_result.pop("diff_chunks", None)
+                diff_chunks_skipped = diff_result.pop("diff_chunks_skipped", 0)
+            
+            if skip_llm:
+                logging.info(f"Skipping LLM analysis ({classification['category']}: {classification['reason']})")
+                analysis_result = {
+                    "analysis": [],
+                    "summary": {
+                        "total_issues": 0,
+                        "critical": 0,
+                        "major": 0,
+                        "minor": 0,
+                        "info": 0,
+                        "recommendation": _skipped_analysis(classification)
+                    }
+                }
+            else:
+                # Analyze using comparison service
+                analysis_result = comparison_service.analyze_comparison(
+                    file_a_name,
+                    file_b_name,
+                    diff_result["unified_diff"],
+                    semantic_diff=diff_result.get("semantic_diff"),
+                    diff_chunks=diff_chunks,
+                    skipped_chunks=diff_chunks_skipped
+                )
+                llm_cache = comparison_service.llm_cache.snapshot()
+                if not analysis_result.get("error"):
+                    store_cached_comparison(
+                        sha_a, sha_b, {"diff": diff_result, "analysis_result": analysis_result}, comparison_names,
+                        comparison_settings
+                    )
         
         # Build final result
         duration = time.time() - start_time
@@ -207,12 +412,21 @@ def compare_files_task(self, repo_a_raw_url: str, repo_b_raw_url: str, ref_a: st
             }),
             "meta": {
                 "duration_seconds": round(duration, 2),
+                "comparison_cache": comparison_cache,
+                "diff_cache": diff_cache,
+                "llm_chunks": analysis_result.get("chunks"),
+                "llm_cache": llm_cache,
+                "prefilter": classification,
+                "github_pool": get_pool_stats(),
+                "ollama_hosts": get_ollama_pool_stats(),
                 "errors": []
             }
         }
         
         # Update task status
         update_task_status(self.request.id, "completed", result=final_result, db=session)
+        if token_stream is not None:
+            token_stream.close("completed")
         logging.info(f"Task {self.request.id} completed successfully in {duration:.2f}s")
         return final_result
         
@@ -238,6 +452,69 @@ def compare_files_task(self, repo_a_raw_url: str, repo_b_raw_url: str, ref_a: st
             }
         }
         update_task_status(self.request.id, "failed", result=error_result, db=session)
+        if token_stream is not None:
+            token_stream.close("failed")
+        logging.error(f"Task {self.request.id} failed: {e}")
+        raise
+    finally:
+        # Spilled downloads live in temp files until the task is done with them
+        for file_result in (file_a_result, file_b_result):
+            if file_result is not None:
+                release_content(file_result)
+        session.close()
+
+
+@app.task(bind=True, name="compare_trees_task")
+def compare_trees_task(self, repo_a_url: str, repo_b_url: str, ref_a: str = "HEAD", ref_b: str = "HEAD",
+                       path_a: str = "", path_b: str = ""):
+    """Compare two directory trees: identical blobs are skipped, changed files are diffed in parallel"""
+    start_time = time.time()
+    session = SessionLocal()
+    tree_a = {"repo_url": repo_a_url, "ref": ref_a, "path": path_a}
+    tree_b = {"repo_url": repo_b_url, "ref": ref_b, "path": path_b}
+
+    try:
+        update_task_status(self.request.id, "processing", result=None, db=session, checkpoint="starting")
+
+        logging.info(f"Comparing trees {repo_a_url}@{ref_a}:{path_a} and {repo_b_url}@{ref_b}:{path_b}")
+        update_task_status(self.request.id, "processing", result=None, db=session, checkpoint="compare_trees")
+        comparison = compare_trees(TreeSpec(**tree_a), TreeSpec(**tree_b))
+
+        duration = time.time() - start_time
+        final_result = {
+            "task": "compare_trees",
+            "tree_a": tree_a,
+            "tree_b": tree_b,
+            "files": comparison["files"],
+            "not_compared": comparison["not_compared"],
+            "summary": comparison["summary"],
+            "meta": {
+                "duration_seconds": round(duration, 2),
+                **comparison["meta"],
+                "github_pool": get_pool_stats(),
+                "errors": [f"{entry['path']}: {entry['error']}" for entry in comparison["files"] if "error" in entry]
+            }
+        }
+
+        update_task_status(self.request.id, "completed", result=final_result, db=session)
+        logging.info(f"Task {self.request.id} completed successfully in {duration:.2f}s")
+        return final_result
+
+    except Exception as e:
+        duration = time.time() - start_time
+        error_result = {
+            "task": "compare_trees",
+            "tree_a": tree_a,
+            "tree_b": tree_b,
+            "files": [],
+            "not_compared": [],
+            "summary": {},
+            "meta": {
+                "duration_seconds": round(duration, 2),
+                "errors": [str(e)]
+            }
+        }
+        update_task_status(self.request.id, "failed", result=error_result, db=session)
         logging.error(f"Task {self.request.id} failed: {e}")
         raise
     finally:
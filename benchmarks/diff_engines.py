@@ -0,0 +1,91 @@
+"""
+Benchmark the diff engines used by compute_unified_diff.
+
+Inputs mimic the files that stall compare workers: lockfiles, JSON fixtures and
+generated code, i.e. many repeated lines, with scattered edits between the two sides.
+
+Usage:
+    python -m benchmarks.diff_engines [--sizes 10000 50000 200000] [--reference-max-lines 50000]
+
+difflib is quadratic on these inputs, so it only runs up to --reference-max-lines.
+"""
+import argparse
+import random
+import time
+
+from app.core.diff_engine import DIFF_ENGINES
+
+
+def lockfile(lines: int, rng: random.Random):
+    out = []
+    while len(out) < lines:
+        package = f"package-{rng.randrange(lines // 4)}"
+        out += [
+            f'"node_modules/{package}": {{\n',
+            f'  "version": "{rng.randrange(10)}.{rng.randrange(20)}.{rng.randrange(50)}",\n',
+            '  "dev": true,\n',
+            '  "license": "MIT"\n',
+            "},\n",
+        ]
+    return out[:lines]
+
+
+def json_fixture(lines: int, rng: random.Random):
+    out = []
+    while len(out) < lines:
+        out += ["  {\n", f'    "id": {rng.randrange(1000)},\n', '    "active": true,\n', '    "tags": []\n', "  },\n"]
+    return out[:lines]
+
+
+def generated_code(lines: int, rng: random.Random):
+    out = []
+    while len(out) < lines:
+        out += [f"    def field_{rng.randrange(200)}(self):\n", "        return self._get()\n", "\n"]
+    return out[:lines]
+
+
+def mutate(lines, rng: random.Random, edits: int):
+    """Copy of `lines` with `edits` scattered replacements, insertions and deletions"""
+    out = list(lines)
+    for _ in range(edits):
+        position = rng.randrange(len(out))
+        choice = rng.random()
+        if choice < 0.4:
+            out[position] = f"    // edited {rng.random()}\n"
+        elif choice < 0.7:
+            out.insert(position, f"    // inserted {rng.random()}\n")
+        else:
+            del out[position]
+    return out
+
+
+def run(sizes, reference_max_lines: int, seed: int = 0):
+    print(f"{'input':<16}{'lines':>8}  " + "".join(f"{name:>12}" for name in DIFF_ENGINES))
+    for generator in (lockfile, json_fixture, generated_code):
+        for size in sizes:
+            rng = random.Random(seed)
+            a = generator(size, rng)
+            b = mutate(a, rng, edits=max(10, size // 1000))
+            timings = []
+            for name, engine in DIFF_ENGINES.items():
+                if name == "difflib" and size > reference_max_lines:
+                    timings.append(f"{'skipped':>12}")
+                    continue
+                started = time.perf_counter()
+                for _ in engine.unified_diff(a, b, "a", "b", lineterm=""):
+                    pass
+                timings.append(f"{time.perf_counter() - started:>11.2f}s")
+            print(f"{generator.__name__:<16}{size:>8}  " + "".join(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--reference-max-lines", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.reference_max_lines, args.seed)
+
+
+if __name__ == "__main__":
+    main()
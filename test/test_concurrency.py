@@ -0,0 +1,42 @@
+import threading
+import time
+
+import pytest
+
+from app.core.concurrency import ordered_map
+
+
+def test_ordered_map_bounds_concurrency_and_keeps_order():
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+    consumed = []
+
+    def items():
+        for i in range(12):
+            consumed.append(i)
+            yield i
+
+    def work(i):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        # Later items finish first
+        time.sleep(0.02 * (12 - i) / 12)
+        with lock:
+            running["now"] -= 1
+        return i * i
+
+    results = ordered_map(work, items(), 3)
+    assert next(results) == 0
+    # The input is read lazily, at most `concurrency` items ahead
+    assert len(consumed) <= 4
+    assert list(results) == [i * i for i in range(1, 12)]
+    assert running["max"] == 3
+
+    def fail(i):
+        if i == 2:
+            raise ValueError("boom")
+        return i
+
+    with pytest.raises(ValueError):
+        list(ordered_map(fail, range(5), 3))
@@ -0,0 +1,113 @@
+import json
+
+from app.core.diff_chunker import chunk_diff, split_hunks
+from app.core.file_comparison import compute_unified_diff
+from app.services.comparison_service import ANALYSIS_SCHEMA, ComparisonService
+
+
+def make_diff(changes=40):
+    a = "".join(f"line {i}\n" for i in range(changes * 10))
+    b = "".join(f"line {i}\n" if i % 10 else f"changed {i}\n" for i in range(changes * 10))
+    return compute_unified_diff(a, b, "a.py", "b.py", max_chars=10 ** 6)["unified_diff"]
+
+
+def test_chunks_follow_hunk_boundaries():
+    diff = make_diff()
+    header, hunks = split_hunks(diff)
+    assert header == "--- a.py+++ b.py"
+    assert all(hunk.startswith("@@ -") for hunk in hunks)
+    assert header + "".join(hunks) == diff
+
+    chunks = chunk_diff(diff, max_tokens=100)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    # Every chunk is made of whole hunks, in order
+    assert "".join(chunks) == "".join(hunks)
+    assert all(chunk.startswith("@@ -") for chunk in chunks)
+
+
+def test_oversized_hunk_is_split_with_its_header():
+    a = "".join(f"old {i}\n" for i in range(200))
+    b = "".join(f"new {i}\n" for i in range(200))
+    diff = compute_unified_diff(a, b, max_chars=10 ** 6)["unified_diff"]
+
+    chunks = chunk_diff(diff, max_tokens=100)
+    assert len(chunks) > 5
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert all(chunk.startswith("@@ -1,200 +1,200 @@") for chunk in chunks)
+
+
+def test_merge_recomputes_summary():
+    issue = {"file_section": "f", "type": "bug", "description": "d", "suggestion": "s", "lines": {}}
+    results = [
+        {"analysis": [dict(issue, severity="major"), dict(issue, severity="info")],
+         "summary": {"total_issues": 9, "recommendation": "Fix f."}},
+        ComparisonService._error_result("json_decode_error", "bad json"),
+        {"analysis": [dict(issue, severity="Critical")], "summary": {"recommendation": "Fix g."}},
+    ]
+
+    merged = ComparisonService.merge_analyses(results)
+
+    assert [item["severity"] for item in merged["analysis"]] == ["major", "info", "Critical"]
+    summary = merged["summary"]
+    assert (summary["total_issues"], summary["critical"], summary["major"], summary["minor"], summary["info"]) == (3, 1, 1, 0, 1)
+    assert merged["chunks"] == {"total": 3, "failed": 1, "repaired": 0}
+    assert merged["error"] == "partial_analysis"
+
+
+def test_truncated_response_keeps_complete_issues():
+    issue = {"file_section": "f", "type": "bug", "severity": "major", "description": "d", "suggestion": "s",
+             "lines": {"start": 1, "end": 2}}
+    complete = json.dumps({"analysis": [issue, dict(issue, severity="minor")],
+                           "summary": {"total_issues": 2, "recommendation": "Fix f."}})
+    assert ComparisonService.parse_analysis("```json\n" + complete + "\n```")["summary"]["total_issues"] == 2
+
+    # Cut off in the middle of the second issue (e.g. by num_predict)
+    truncated = complete[:complete.index('"minor"') + 3]
+    result = ComparisonService.parse_analysis(truncated)
+    assert result["repaired"] is True
+    assert result["analysis"] == [issue]
+    assert (result["summary"]["total_issues"], result["summary"]["major"]) == (1, 1)
+    assert ComparisonService.parse_analysis("I cannot review this diff.") is None
+    # Brackets in the prose before the JSON are not taken for the document
+    prose = "Findings below (see [1] and {the spec}):\n"
+    assert ComparisonService.parse_analysis(prose + complete)["analysis"][1]["severity"] == "minor"
+    assert ComparisonService.parse_analysis(prose + truncated)["analysis"] == [issue]
+    assert ANALYSIS_SCHEMA["required"] == ["analysis", "summary"]
+
+
+def test_settings_reflect_profile_and_options():
+    default = ComparisonService().settings()
+    assert ComparisonService(llm_options={"num_ctx": 2048}).settings() != default
+    assert ComparisonService(llm_profile="pr_file_review").settings()["generation"]["diff_chunk_review"]["num_ctx"] == 8192
+    assert ComparisonService().settings() == default
+
+
+def test_chunks_cover_the_whole_diff_beyond_the_text_cap():
+    a = "".join(f"line {i}\n" for i in range(6000))
+    b = "".join(f"line {i}\n" if i % 10 else f"changed {i}\n" for i in range(6000))
+    full = compute_unified_diff(a, b, "a.py", "b.py", max_chars=10 ** 7)["unified_diff"]
+
+    result = compute_unified_diff(a, b, "a.py", "b.py", chunk_tokens=1500, max_chunks=8)
+    assert result["unified_diff"].endswith("... (truncated)")
+    expected = chunk_diff(full, 1500)
+    assert len(expected) > 8
+    assert result["diff_chunks"] == expected[:8]
+    assert result["diff_chunks_skipped"] == len(expected) - 8
+    # The capped text alone would only reach a few chunks
+    assert len(chunk_diff(result["unified_diff"], 1500)) < 5
+
+
+def test_single_chunk_diff_is_sent_whole(monkeypatch):
+    a = "".join(f"line {i}\n" for i in range(400))
+    b = "".join(f"line {i}\n" if i % 5 else f"edited {i}\n" for i in range(400))
+    result = compute_unified_diff(a, b, "a.py", "b.py", chunk_tokens=10 ** 6, max_chunks=8)
+    assert len(result["diff_chunks"]) == 1 and len(result["diff_chunks"][0]) > 3000
+
+    prompts = []
+    monkeypatch.setattr(ComparisonService, "_run_analysis",
+                        lambda self, prompt, profile="file_comparison", source="": prompts.append(prompt) or {})
+    ComparisonService().analyze_comparison("a.py", "b.py", result["unified_diff"],
+                                           diff_chunks=result["diff_chunks"])
+    assert result["diff_chunks"][0] in prompts[0]
+    assert "+edited 395" in prompts[0] and "File A content" not in prompts[0]
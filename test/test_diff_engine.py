@@ -0,0 +1,148 @@
+import difflib
+import random
+
+import pytest
+
+from app.core.diff_engine import DIFF_ENGINES, HistogramEngine, LineTable, get_diff_engine
+from app.core.file_comparison import compute_unified_diff
+
+
+def apply_opcodes(a, b, opcodes):
+    out = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+            out += a[i1:i2]
+        else:
+            out += b[j1:j2]
+    return out
+
+
+def test_histogram_matches_difflib_output_format():
+    a = [f"line {i}\n" for i in range(40)]
+    b = list(a)
+    b[5] = "changed\n"
+    b.insert(20, "inserted\n")
+    del b[35]
+
+    for lineterm in ("", "\n"):
+        expected = list(difflib.unified_diff(a, b, "a.py", "b.py", lineterm=lineterm))
+        assert list(HistogramEngine().unified_diff(a, b, "a.py", "b.py", lineterm=lineterm)) == expected
+    assert list(HistogramEngine().unified_diff(a, a, "a.py", "b.py")) == []
+
+
+@pytest.mark.parametrize("engine", [HistogramEngine(), HistogramEngine(max_chain=1), HistogramEngine(max_myers_cost=2)])
+def test_histogram_opcodes_rebuild_target(engine):
+    rng = random.Random(7)
+    for _ in range(500):
+        # Small alphabet: lots of repeated lines
+        a = [rng.choice("abcde") + "\n" for _ in range(rng.randint(0, 40))]
+        b = list(a)
+        for _ in range(rng.randint(0, 8)):
+            if b and rng.random() < 0.5:
+                del b[rng.randrange(len(b))]
+            else:
+                b.insert(rng.randint(0, len(b)), rng.choice("abcxyz") + "\n")
+        assert apply_opcodes(a, b, engine.get_opcodes(a, b)) == b
+
+
+def test_histogram_anchor_respects_max_chain_boundary():
+    # The line occurs twice in a: an anchor with max_chain=2, too common with max_chain=1
+    a, b = [7, 3, 7], [7]
+    assert HistogramEngine(max_chain=2)._find_anchor(a, b, 0, 3, 0, 1) == (0, 0, 1)
+    assert HistogramEngine(max_chain=1)._find_anchor(a, b, 0, 3, 0, 1) is None
+
+
+def test_compute_unified_diff_engines_agree_on_counts():
+    a = "".join(f"value = {i}\n" for i in range(100))
+    b = a.replace("value = 50\n", "value = fifty\n")
+
+    results = [compute_unified_diff(a, b, engine=name) for name in DIFF_ENGINES]
+    assert all(r == results[0] for r in results)
+    assert results[0]["summary_lines_changed"] == {"added": 1, "removed": 1, "modified": 1}
+
+    with pytest.raises(ValueError):
+        get_diff_engine("unknown")
+
+
+def test_interned_lines_diff_like_plain_lines():
+    a = "".join(f"value = {i % 7}\n" for i in range(200))
+    b = a.replace("value = 3\n", "value = three\n", 5) + "tail"
+    table = LineTable()
+    lines_a, lines_b = table.encode(a.splitlines(keepends=True)), table.encode(b.splitlines(keepends=True))
+
+    # Both files share the table: 7 distinct lines + "value = three" + "tail"
+    assert len(table) == 9
+    assert list(lines_b) == b.splitlines(keepends=True) and lines_a[3:5] == a.splitlines(keepends=True)[3:5]
+    for name in DIFF_ENGINES:
+        assert compute_unified_diff(lines_a, lines_b, engine=name) == compute_unified_diff(a, b, engine=name)
+
+
+def test_compute_unified_diff_truncates_but_counts_everything():
+    a = "".join(f"old {i}\n" for i in range(5000))
+    b = "".join(f"new {i}\n" for i in range(5000))
+
+    result = compute_unified_diff(a, b, max_chars=1000)
+
+    assert len(result["unified_diff"]) == 1000 + len("\n... (truncated)")
+    assert result["unified_diff"].endswith("\n... (truncated)")
+    assert result["summary_lines_changed"] == {"added": 5000, "removed": 5000, "modified": 5000}
+
+
+def test_diff_cache_reuses_results(monkeypatch):
+    from app.config import Config
+    from app.core import diff_cache
+
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    monkeypatch.setattr(Config, "DIFF_CACHE_ENABLED", True)
+    monkeypatch.setattr(diff_cache, "_cache", None)
+    a = "".join(f"value = {i}\n" for i in range(100))
+    b = a.replace("value = 7\n", "value = seven\n")
+
+    first, outcome = diff_cache.cached_unified_diff(a, b, "a.py", "b.py")
+    assert outcome == "miss"
+    # Same contents as lines: same key
+    second, outcome = diff_cache.cached_unified_diff(a.splitlines(keepends=True), b.splitlines(keepends=True), "a.py", "b.py")
+    assert outcome == "hit" and second == first
+    # Names are part of the diff text, so they are part of the key
+    assert diff_cache.cached_unified_diff(a, b, "a.py", "c.py")[1] == "miss"
+
+
+def test_diff_cache_disabled_computes_every_time(monkeypatch):
+    from app.config import Config
+    from app.core import diff_cache
+
+    monkeypatch.setattr(Config, "DIFF_CACHE_ENABLED", False)
+    monkeypatch.setattr(diff_cache, "_cache", None)
+    a, b = "x = 1\n", "x = 2\n"
+    diff, outcome = diff_cache.cached_unified_diff(a, b, "a.py", "b.py")
+    assert outcome == "disabled"
+    assert diff == compute_unified_diff(a, b, "a.py", "b.py")
+    assert diff_cache.cached_unified_diff(a, b, "a.py", "b.py")[1] == "disabled"
+    assert diff_cache._cache is None
+
+
+def test_diff_cache_hits_through_redis_in_another_worker(monkeypatch):
+    from app.config import Config
+    from app.core import diff_cache
+
+    class FakeRedis(dict):
+        def set(self, key, value, ex=None):
+            self[key] = value
+
+    redis = FakeRedis()
+    monkeypatch.setattr(diff_cache, "get_cache_redis", lambda: redis)
+    monkeypatch.setattr(Config, "DIFF_CACHE_ENABLED", True)
+    monkeypatch.setattr(diff_cache, "_cache", None)
+    a = "".join(f"value = {i}\n" for i in range(50))
+    b = a.replace("value = 3\n", "value = three\n")
+
+    first, outcome = diff_cache.cached_unified_diff(a, b, "a.py", "b.py", semantic=True)
+    assert outcome == "miss" and len(redis) == 1
+    # A fresh in-process LRU, as in another worker: served from Redis
+    monkeypatch.setattr(diff_cache, "_cache", None)
+    second, outcome = diff_cache.cached_unified_diff(a, b, "a.py", "b.py", semantic=True)
+    assert outcome == "hit" and second == first
+    # Diff options are part of the key
+    assert diff_cache.cached_unified_diff(a, b, "a.py", "b.py")[1] == "miss"
+    assert diff_cache.cached_unified_diff(a, b, "a.py", "b.py", max_chars=100)[1] == "miss"
@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+
+def test_github_rate_limit():
+    response = client.get("/github/rate-limit")
+    assert response.status_code == 200
+    assert isinstance(response.json()["budgets"], list)
+
+
+def test_stream_unknown_task():
+    response = client.get("/stream/unknown-task-id")
+    assert response.status_code == 404
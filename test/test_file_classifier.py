@@ -0,0 +1,69 @@
+import base64
+import random
+
+from app.config import Config
+from app.core.file_classifier import GitAttributes, classify_file, prefilter
+
+
+def test_path_rules():
+    assert classify_file("frontend/package-lock.json").reason == "lockfile"
+    assert classify_file("static/app.min.js").category == "generated"
+    assert classify_file("src/__snapshots__/App.test.js.snap").category == "generated"
+    assert classify_file("vendor/github.com/pkg/errors/errors.go").category == "vendored"
+    assert classify_file("docs/logo.PNG").category == "binary"
+    assert classify_file("src/app.py", "def main():\n    return 1\n") is None
+
+
+def test_content_heuristics():
+    assert classify_file("data.txt", b"abc\0def").reason == "contains null bytes"
+    assert classify_file("api.go", "// Code generated by protoc-gen-go. DO NOT EDIT.\npackage api\n").category == "generated"
+    minified = "var a=1;" * 500 + "\n" + "function f(){return a}" * 100
+    assert classify_file("static/app.js", minified).reason.startswith("minified content")
+    rng = random.Random(1)
+    noise = bytes(rng.getrandbits(8) for _ in range(4096)).replace(b"\0", b"\1")
+    assert classify_file("blob.dat", noise).category == "binary"
+    # base64 text stays below the binary entropy threshold
+    assert classify_file("key.txt", "\n".join(base64.b64encode(noise[i:i + 48]).decode() for i in range(0, 4096, 48))) is None
+
+
+def test_gitattributes_and_prefilter(monkeypatch):
+    attributes = GitAttributes.parse(
+        "# generated clients\n"
+        "api/client/** linguist-generated\n"
+        "*.lock -linguist-generated\n"
+        "*.dat -diff\n"
+        "third_party/** linguist-vendored=false\n"
+    )
+    assert classify_file("api/client/models.py", attributes=attributes).reason == "linguist-generated in .gitattributes"
+    assert classify_file("blobs/a.dat", attributes=attributes).category == "binary"
+    # Explicitly unset attributes override the path rules
+    assert classify_file("Cargo.lock", attributes=attributes) is None
+    assert classify_file("third_party/lib.c", attributes=attributes) is None
+
+    # Trailing-slash patterns cover everything below the directory
+    directories = GitAttributes.parse("vendor/ linguist-vendored\n/gen/api/ linguist-generated\n")
+    assert classify_file("vendor/lib/a.go", attributes=directories).category == "vendored"
+    assert classify_file("web/vendor/b.js", attributes=directories).category == "vendored"
+    assert classify_file("gen/api/models/c.py", attributes=directories).category == "generated"
+    assert classify_file("src/gen/api/d.py", attributes=directories) is None
+    assert classify_file("vendor.go", attributes=directories) is None
+
+    monkeypatch.setattr(Config, "FILE_PREFILTER_ENABLED", True)
+    monkeypatch.setattr(Config, "FILE_PREFILTER_SKIP", "generated,binary")
+    assert prefilter("yarn.lock") == {"category": "generated", "reason": "lockfile", "skipped": True}
+    assert prefilter("node_modules/left-pad/index.js")["skipped"] is False
+    assert prefilter("src/app.py", "x = 1\n") is None
+    monkeypatch.setattr(Config, "FILE_PREFILTER_ENABLED", False)
+    assert prefilter("yarn.lock") is None
+
+
+def test_generated_markers_only_count_in_the_file_header():
+    # A hand-written file whose patch adds a line mentioning a marker
+    edit = "@@ -40,3 +40,4 @@ def render():\n     out = []\n+    # DO NOT EDIT the template names below\n     return out\n"
+    assert classify_file("app/render.py", edit, patch=True) is None
+    # A new generated file: its patch starts at line 1 and shows the header
+    added = "@@ -0,0 +1,3 @@\n+// Code generated by protoc-gen-go. DO NOT EDIT.\n+package api\n+\n"
+    assert classify_file("api/api.go", added, patch=True).reason == "generated-file marker in header"
+    # Full content: the marker must be within the first lines
+    body = "".join(f"x{i} = {i}\n" for i in range(20)) + "# @generated mention\n"
+    assert classify_file("src/values.py", body) is None
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from app.config import Config
+from app.core import blob_cache
+from app.core.blob_cache import BlobStore, get_cached_comparison, git_blob_sha, store_cached_comparison
+from app.core.file_comparison import (
+    fetch_file_from_raw_url, compute_unified_diff, content_lines, content_text, release_content
+)
+
+SMALL = b"line 1\nline 2\n"
+LARGE = b"".join(b"line %d\n" % i for i in range(5000))
+# Windows and old Mac line endings, plus characters str.splitlines() would also break on
+MIXED = b"".join(b"crlf %d\r\nlone cr %d\rform\x0cfeed\xe2\x80\xa8sep\n" % (i, i) for i in range(200))
+FILES = {"/small.py": SMALL, "/large.py": LARGE, "/mixed.txt": MIXED}
+
+
+class StubRawHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Seconds every response is delayed by
+    delay = 0
+    downloads = 0
+
+    def do_GET(self):
+        time.sleep(StubRawHandler.delay)
+        if "/contents/" in self.path:
+            # Contents API: the blob SHA of the requested file
+            name = "/" + self.path.split("/contents/")[1].split("?")[0]
+            data = json.dumps({"sha": git_blob_sha(FILES[name])}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        StubRawHandler.downloads += 1
+        body = FILES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def raw_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRawHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    monkeypatch.setattr(Config, "BLOB_CACHE_ENABLED", False)
+    monkeypatch.setattr(Config, "FILE_SPILL_THRESHOLD", 1024)
+    StubRawHandler.delay = 0
+    StubRawHandler.downloads = 0
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_small_file_stays_in_memory(raw_server):
+    result = fetch_file_from_raw_url(f"{raw_server}/small.py", metadata="none")
+
+    assert result["fetched"]
+    assert result["content"] == SMALL.decode()
+    assert result["meta"]["size"] == len(SMALL)
+    assert "content_path" not in result
+
+
+def test_large_file_spills_to_disk(raw_server):
+    result = fetch_file_from_raw_url(f"{raw_server}/large.py", metadata="none")
+
+    assert result["fetched"]
+    assert result["meta"]["spilled"] is True
+    assert result["meta"]["size"] == len(LARGE)
+    path = result["content_path"]
+    assert content_lines(result) == LARGE.decode().splitlines(keepends=True)
+    assert content_text(result, max_chars=7) == "line 0\n"
+
+    diff = compute_unified_diff(content_lines(result), SMALL.decode())
+    assert diff["summary_lines_changed"]["removed"] > 0
+
+    release_content(result)
+    assert not os.path.exists(path)
+
+
+def test_file_over_size_limit_is_rejected(raw_server, monkeypatch):
+    monkeypatch.setattr(Config, "MAX_FILE_SIZE", 4096)
+
+    result = fetch_file_from_raw_url(f"{raw_server}/large.py", metadata="none")
+
+    assert not result["fetched"]
+    assert "MAX_FILE_SIZE" in result["error"]
+
+
+def test_blob_sha_lookup_overlaps_the_download(raw_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "BLOB_CACHE_ENABLED", True)
+    monkeypatch.setattr(Config, "BLOB_CACHE_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(Config, "GITHUB_API_URL", raw_server)
+    monkeypatch.setattr(blob_cache, "_store", None)
+    StubRawHandler.delay = 0.3
+
+    started = time.monotonic()
+    result = fetch_file_from_raw_url(f"{raw_server}/small.py", metadata="sha")
+    # One round trip, not the SHA lookup followed by the download
+    assert time.monotonic() - started < 0.55
+    assert result["content"] == SMALL.decode()
+    assert (result["meta"]["sha"], result["meta"]["blob_cache"]) == (git_blob_sha(SMALL), "miss")
+
+    again = fetch_file_from_raw_url(f"{raw_server}/small.py", metadata="sha")
+    assert (again["content"], again["meta"]["blob_cache"]) == (SMALL.decode(), "hit")
+
+
+def test_blob_store_evicts_least_recently_used(tmp_path):
+    store = BlobStore(str(tmp_path), max_bytes=300)
+    blobs = {name: name.encode() * 100 for name in "abcd"}
+    for name in "abc":
+        store.put(git_blob_sha(blobs[name]), blobs[name])
+    for mtime, name in enumerate("abc", 1):
+        os.utime(store._path(git_blob_sha(blobs[name])), (mtime * 1000, mtime * 1000))
+    # A hit makes "a" the most recently used blob
+    assert store.get(git_blob_sha(blobs["a"])) == blobs["a"]
+
+    store.put(git_blob_sha(blobs["d"]), blobs["d"])
+    kept = {name for name in "abcd" if store.path_for(git_blob_sha(blobs[name])) is not None}
+    assert kept == {"a", "d"}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def test_comparison_cache_is_keyed_by_blob_pair(monkeypatch):
+    monkeypatch.setattr(Config, "BLOB_CACHE_ENABLED", True)
+    monkeypatch.setattr(blob_cache, "get_cache_redis", lambda: FakeRedis.instance)
+    FakeRedis.instance = FakeRedis()
+    comparison = {"diff": {"unified_diff": "..."}, "analysis_result": {"analysis": []}}
+    settings = {"model": "m", "diff_engine": "histogram"}
+
+    store_cached_comparison("a1", "b2", comparison, "x.py\ny.py", settings)
+    assert get_cached_comparison("a1", "b2", "x.py\ny.py", settings) == comparison
+    assert get_cached_comparison("b2", "a1", "x.py\ny.py", settings) is None
+    assert get_cached_comparison("a1", "b2", "x.py\nz.py", settings) is None
+    assert get_cached_comparison("a1", "b2", "x.py\ny.py", {**settings, "model": "other"}) is None
+    assert get_cached_comparison(None, "b2") is None
+
+
+def test_lines_split_the_same_in_memory_and_spilled(raw_server, monkeypatch):
+    monkeypatch.setattr(Config, "FILE_SPILL_THRESHOLD", 10 ** 6)
+    in_memory = fetch_file_from_raw_url(f"{raw_server}/mixed.txt", metadata="none")
+    monkeypatch.setattr(Config, "FILE_SPILL_THRESHOLD", 1024)
+    spilled = fetch_file_from_raw_url(f"{raw_server}/mixed.txt", metadata="none")
+    assert "content_path" not in in_memory and spilled["meta"]["spilled"] is True
+
+    lines = content_lines(in_memory)
+    assert content_lines(spilled) == lines
+    assert lines[0] == "crlf 0\r\n" and lines[1] == "lone cr 0\rform\x0cfeed\u2028sep\n"
+    assert "".join(lines) == MIXED.decode()
+    assert compute_unified_diff(MIXED.decode(), lines)["unified_diff"] == ""
+    release_content(spilled)
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+
+import git
+import pytest
+
+from app.config import Config
+from app.core.git_mirror import MirrorManager
+
+ACTOR = git.Actor("Test Author", "author@example.com")
+IDENTITY = {
+    "GIT_AUTHOR_NAME": ACTOR.name, "GIT_AUTHOR_EMAIL": ACTOR.email,
+    "GIT_COMMITTER_NAME": ACTOR.name, "GIT_COMMITTER_EMAIL": ACTOR.email,
+}
+
+
+def commit_file(repo, path, content, message):
+    full_path = os.path.join(repo.working_tree_dir, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w") as f:
+        f.write(content)
+    repo.index.add([path])
+    return repo.index.commit(message, author=ACTOR, committer=ACTOR)
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """Origin repo with a default branch and PR #1 published as refs/pull/1/head"""
+    repo = git.Repo.init(tmp_path / "origin")
+    commit_file(repo, "app.py", "def main():\n    return 1\n", "Initial commit")
+    default_branch = repo.active_branch.name
+
+    repo.git.checkout("-b", "feature")
+    commit_file(repo, "app.py", "def main():\n    return 2\n", "Change return value")
+    head = commit_file(repo, "lib/util.py", "VALUE = 3\n", "Add util module")
+    repo.git.update_ref("refs/pull/1/head", head.hexsha)
+    repo.git.checkout(default_branch)
+    return repo
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return MirrorManager(str(tmp_path / "mirrors"), refresh_seconds=3600)
+
+
+def test_pr_commits_from_mirror(origin, manager):
+    commits = list(manager.iter_pr_commits(origin.working_tree_dir, 1))
+
+    assert [c["message"] for c in commits] == ["Change return value", "Add util module"]
+    assert commits[1]["full_sha"] == git.Repo(origin.working_tree_dir).git.rev_parse("refs/pull/1/head")
+    first_file = commits[0]["files"][0]
+    assert first_file["filename"] == "app.py"
+    assert first_file["status"] == "modified"
+    assert (first_file["additions"], first_file["deletions"]) == (1, 1)
+    assert "+    return 2" in first_file["patch"]
+    assert commits[1]["files"][0]["status"] == "added"
+
+    assert len(list(manager.iter_pr_commits(origin.working_tree_dir, 1, limit=1))) == 1
+
+
+def test_pr_files_are_net_diff(origin, manager):
+    files = {f["filename"]: f["content"] for f in manager.iter_pr_files(origin.working_tree_dir, 1)}
+
+    assert set(files) == {"app.py", "lib/util.py"}
+    assert "+VALUE = 3" in files["lib/util.py"]
+
+
+def test_read_file_and_incremental_refresh(origin, manager):
+    blob = manager.read_file(origin.working_tree_dir, "refs/pull/1/head", "lib/util.py")
+    assert blob["data"] == b"VALUE = 3\n"
+    assert blob["sha"] == git.Repo(origin.working_tree_dir).git.rev_parse("refs/pull/1/head:lib/util.py")
+    assert blob["last_commit_msg"] == "Add util module"
+
+    commit_file(origin, "app.py", "def main():\n    return 4\n", "Update default branch")
+
+    # Not fetched yet: the mirror still serves the old content
+    assert manager.read_file(origin.working_tree_dir, "HEAD", "app.py")["data"].endswith(b"return 1\n")
+    manager.ensure(origin.working_tree_dir, refresh=True)
+    assert manager.read_file(origin.working_tree_dir, "HEAD", "app.py")["data"].endswith(b"return 4\n")
+
+
+def test_missing_pr_raises(origin, manager):
+    with pytest.raises(Exception, match="not found"):
+        list(manager.iter_pr_commits(origin.working_tree_dir, 99))
+
+
+def test_list_tree_and_read_blob(origin, manager):
+    files = manager.list_tree(origin.working_tree_dir, "refs/pull/1/head", "lib")
+
+    assert list(files) == ["util.py"]
+    assert manager.read_blob(origin.working_tree_dir, files["util.py"]) == b"VALUE = 3\n"
+    assert set(manager.list_tree(origin.working_tree_dir, "refs/pull/1/head")) == {"app.py", "lib/util.py"}
+
+
+def test_pr_base_follows_the_base_branch(origin, manager, monkeypatch):
+    default_branch = origin.active_branch.name
+    # PR #2 targets a release branch that is ahead of the default branch
+    origin.git.checkout("-b", "release")
+    commit_file(origin, "release.txt", "1.0\n", "Prepare release")
+    origin.git.checkout("-b", "hotfix")
+    head = commit_file(origin, "app.py", "def main():\n    return 5\n", "Hotfix")
+    merge = origin.git.commit_tree(f"{head.hexsha}^{{tree}}", "-p", "release", "-p", head.hexsha, "-m", "Merge",
+                              env=IDENTITY)
+    origin.git.update_ref("refs/pull/2/head", head.hexsha)
+    origin.git.update_ref("refs/pull/2/merge", merge)
+
+    # PR #1 is already merged into the default branch (no merge ref any more)
+    origin.git.checkout(default_branch)
+    fork_point = origin.head.commit.hexsha
+    origin.git.merge("--no-ff", "refs/pull/1/head", "-m", "Merge PR #1", env=IDENTITY)
+    monkeypatch.setattr(MirrorManager, "_api_base_sha", staticmethod(lambda repo_url, pr_number: fork_point))
+
+    assert [c["message"] for c in manager.iter_pr_commits(origin.working_tree_dir, 2)] == ["Hotfix"]
+    assert [c["message"] for c in manager.iter_pr_commits(origin.working_tree_dir, 1)] == [
+        "Change return value", "Add util module"
+    ]
+
+
+def test_token_is_not_stored_in_the_mirror(origin, manager, monkeypatch):
+    monkeypatch.setattr(Config, "GITHUB_TOKEN", "secret-token")
+    env = MirrorManager._auth_env("https://github.com/o/r")
+    assert env["GIT_CONFIG_VALUE_0"] == "Authorization: Bearer secret-token"
+    assert MirrorManager._auth_env(origin.working_tree_dir) is None
+
+    # The header reaches clone and fetch through the environment only
+    monkeypatch.setattr(MirrorManager, "_auth_env", staticmethod(lambda repo_url: env))
+    manager.ensure(origin.working_tree_dir)
+    manager.ensure(origin.working_tree_dir, refresh=True)
+    with open(os.path.join(manager.mirror_path(origin.working_tree_dir), "config")) as config:
+        assert "secret-token" not in config.read()
+
+
+def test_backends_import_without_git_executable(tmp_path):
+    # GitPython refuses to import without git; only the mirror code paths may need it
+    env = {"PATH": str(tmp_path), "PYTHONPATH": os.getcwd(), "HOME": str(tmp_path)}
+    result = subprocess.run([sys.executable, "-c", "import app.core.pr_backends, app.core.file_comparison"],
+                            env=env, cwd=str(tmp_path), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from app.config import Config
+from app.core import github_cache, github_client, github_ratelimit
+from app.core.github_client import get_pool_stats, github_get
+from app.core.github_ratelimit import RateLimitScheduler, get_rate_limit_budget
+
+
+class StubGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Queued (status, headers, payload) answers; 200 with an empty list once they run out
+    responses = []
+    paths = []
+    # Client (host, port) of each request: one port per TCP connection
+    clients = []
+    # Answer 304 to requests revalidating this ETag
+    current_etag = None
+
+    def do_GET(self):
+        StubGitHubHandler.paths.append(self.path)
+        StubGitHubHandler.clients.append(self.client_address)
+        if StubGitHubHandler.current_etag and self.headers.get("If-None-Match") == StubGitHubHandler.current_etag:
+            self.send_response(304)
+            self.send_header("ETag", StubGitHubHandler.current_etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        status, headers, payload = (StubGitHubHandler.responses.pop(0) if StubGitHubHandler.responses
+                                    else (200, {}, []))
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def rate_headers(limit, remaining, reset):
+    return {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(reset), "X-RateLimit-Resource": "core"}
+
+
+@pytest.fixture
+def stub_github(monkeypatch):
+    StubGitHubHandler.responses = []
+    StubGitHubHandler.paths = []
+    StubGitHubHandler.clients = []
+    StubGitHubHandler.current_etag = None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGitHubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(Config, "GITHUB_API_URL", base_url)
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    monkeypatch.setattr(Config, "GITHUB_RATELIMIT_ENABLED", True)
+    # A fresh budget and session per test
+    monkeypatch.setattr(github_ratelimit, "_scheduler", RateLimitScheduler())
+    monkeypatch.setattr(github_client, "_session", None)
+    monkeypatch.setattr(github_client, "_pool_stats", github_client.PoolStats())
+    yield base_url
+    server.shutdown()
+
+
+def test_low_priority_waits_while_budget_is_in_reserve(stub_github, monkeypatch):
+    reset = int(time.time()) + 60
+    StubGitHubHandler.responses = [(200, rate_headers(100, 10, reset), [])]
+    github_get(f"{stub_github}/repos/o/r")
+
+    # 10 of 100 left: inside the low reserve (20%), above the normal one (5%)
+    scheduler = github_ratelimit.get_scheduler()
+    key = scheduler._key("core")
+    assert scheduler._try_acquire(key, scheduler._reserve_fraction("high")) == 0
+    assert scheduler._try_acquire(key, scheduler._reserve_fraction("normal")) == 0
+    assert 0 < scheduler._try_acquire(key, scheduler._reserve_fraction("low")) <= 60
+
+    sleeps = []
+
+    def fake_sleep(seconds):
+        # The window resets while the low-priority request waits
+        sleeps.append(seconds)
+        scheduler._local[key]["reset"] = 0
+
+    monkeypatch.setattr(github_ratelimit.time, "sleep", fake_sleep)
+    StubGitHubHandler.responses = [(200, rate_headers(100, 99, reset + 3600), [])]
+    assert github_get(f"{stub_github}/repos/o/r/pulls", priority="low").status_code == 200
+    assert len(sleeps) == 1
+    assert len(StubGitHubHandler.paths) == 2
+
+    budget = next(b for b in get_rate_limit_budget() if b["resource"] == "core")
+    assert (budget["limit"], budget["remaining"], budget["reset"]) == (100, 99, reset + 3600)
+
+
+def test_rate_limited_response_is_closed_and_retried(stub_github, monkeypatch):
+    StubGitHubHandler.responses = [
+        (403, {"Retry-After": "1", **rate_headers(60, 0, int(time.time()) + 1)}, {"message": "rate limited"}),
+        (200, rate_headers(60, 59, int(time.time()) + 3600), [{"sha": "a"}]),
+    ]
+    sleeps = []
+    monkeypatch.setattr(github_ratelimit.time, "sleep", sleeps.append)
+    responses = []
+    scheduler = github_ratelimit.get_scheduler()
+    record = scheduler.record
+    monkeypatch.setattr(scheduler, "record", lambda response: responses.append(response) or record(response))
+
+    response = github_get(f"{stub_github}/repos/o/r/commits", stream=True)
+    assert response.status_code == 200 and response.json() == [{"sha": "a"}]
+    assert sleeps == [1]
+    # The unread 403 was released before the retry
+    assert responses[0].status_code == 403 and responses[0].raw.closed
+
+
+def test_etag_revalidation_serves_cached_body(stub_github, monkeypatch):
+    monkeypatch.setattr(Config, "GITHUB_CACHE_ENABLED", True)
+    monkeypatch.setattr(github_cache, "_cache", None)
+    url = f"{stub_github}/repos/o/r/pulls/1/files"
+    StubGitHubHandler.current_etag = '"v1"'
+    StubGitHubHandler.responses = [(200, {"ETag": '"v1"'}, [{"filename": "app.py"}])]
+
+    first = github_get(url, cache=True)
+    assert first.json() == [{"filename": "app.py"}] and not getattr(first, "from_cache", False)
+    second = github_get(url, cache=True)
+    assert second.status_code == 200 and second.from_cache
+    assert second.json() == [{"filename": "app.py"}]
+    assert second.headers["ETag"] == '"v1"'
+    assert len(StubGitHubHandler.paths) == 2
+
+    # A changed resource replaces the entry
+    StubGitHubHandler.current_etag = '"v2"'
+    StubGitHubHandler.responses = [(200, {"ETag": '"v2"'}, [{"filename": "lib.py"}])]
+    assert github_get(url, cache=True).json() == [{"filename": "lib.py"}]
+    assert github_get(url, cache=True).json() == [{"filename": "lib.py"}]
+
+
+def test_response_cache_is_bounded_by_bytes(stub_github, monkeypatch):
+    monkeypatch.setattr(Config, "GITHUB_CACHE_ENABLED", True)
+    monkeypatch.setattr(Config, "GITHUB_CACHE_LRU_BYTES", 4096)
+    monkeypatch.setattr(github_cache, "_cache", None)
+    patch = "+" * 1000
+    for page in range(3):
+        StubGitHubHandler.responses = [(200, {"ETag": f'"p{page}"'}, [{"patch": patch}])]
+        github_get(f"{stub_github}/repos/o/r/pulls/1/files?page={page}", cache=True)
+
+    lru = github_cache.get_response_cache().lru
+    # Each entry counts about 2 KB: only the most recent page fits next to the budget
+    assert len(lru._data) == 1 and lru._size <= 4096
+    key = github_cache.get_response_cache().make_key(
+        f"{stub_github}/repos/o/r/pulls/1/files?page=2", github_client.github_headers(), None)
+    assert lru.get(key)["etag"] == '"p2"'
+
+
+def test_session_reuses_pooled_connection(stub_github, monkeypatch):
+    for page in range(1, 4):
+        assert github_get(f"{stub_github}/repos/o/r/pulls?page={page}").status_code == 200
+
+    # One TCP connection served every request
+    assert len(set(StubGitHubHandler.clients)) == 1
+    stats = get_pool_stats()
+    assert stats["requests"] == 3
+    assert (stats["new_connections"], stats["hits"]) == (1, 2)
+
+    # A forked child builds its own session and starts its counters over
+    session = github_client.get_session()
+    monkeypatch.setattr(github_client, "_session_pid", -1)
+    assert github_client.get_session() is not session
+    assert get_pool_stats()["requests"] == 0
@@ -0,0 +1,104 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from app.config import Config
+from app.core.github_graphql import iter_pr_changes_graphql
+
+
+class StubGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    graphql_calls = []
+    rest_calls = []
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        request = json.loads(self.rfile.read(length))
+        variables = request["variables"]
+        StubGitHubHandler.graphql_calls.append(variables)
+
+        pull_request = {
+            "title": "Add feature",
+            "createdAt": "2024-01-01T00:00:00Z",
+            "headRefOid": "a" * 40,
+            "baseRefOid": "b" * 40,
+            "author": {"login": "octocat"},
+        }
+        # Two pages of commits to exercise cursor handling
+        first_page = variables["commitsAfter"] is None
+        numbers = range(1, 3) if first_page else range(3, 4)
+        pull_request["commits"] = {
+            "pageInfo": {"hasNextPage": first_page, "endCursor": "c1" if first_page else "c2"},
+            "nodes": [
+                {"commit": {"oid": f"{i}" * 40, "message": f"commit {i}", "additions": 1, "deletions": 0,
+                            "changedFilesIfAvailable": 1, "author": {"name": "Octo", "date": "2024-01-01"}}}
+                for i in numbers
+            ][:variables["commitsFirst"]],
+        }
+        self._send_json({"data": {"repository": {"pullRequest": pull_request}}})
+
+    def do_GET(self):
+        StubGitHubHandler.rest_calls.append(self.path)
+        if self.path.startswith("/repos/octo/demo/pulls/7/files"):
+            self._send_json([
+                {"filename": "app.py", "status": "modified", "additions": 1, "deletions": 1,
+                 "patch": "@@ -1 +1 @@\n-old\n+new"},
+                {"filename": "README.md", "status": "added", "additions": 1, "deletions": 0,
+                 "patch": "@@ -0,0 +1 @@\n+docs"},
+            ])
+        else:
+            self._send_json({"message": "Not Found"}, status=404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_github(monkeypatch):
+    StubGitHubHandler.graphql_calls = []
+    StubGitHubHandler.rest_calls = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGitHubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(Config, "GITHUB_API_URL", base_url)
+    monkeypatch.setattr(Config, "GITHUB_GRAPHQL_URL", f"{base_url}/graphql")
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    yield server
+    server.shutdown()
+
+
+def test_graphql_backend_batches_pr_fetch(stub_github):
+    changes = list(iter_pr_changes_graphql("https://github.com/octo/demo", 7))
+
+    assert len(changes) == 1
+    change = changes[0]
+    assert (change["sha"], change["full_sha"]) == ("a" * 7, "a" * 40)
+    assert change["message"] == "Add feature"
+    assert [commit["message"] for commit in change["commits"]] == ["commit 1", "commit 2", "commit 3"]
+    assert [(f["filename"], f["status"]) for f in change["files"]] == [("app.py", "modified"), ("README.md", "added")]
+    assert change["files"][0]["patch"].endswith("+new")
+
+    # One query per page of commits; files come from a single REST listing
+    assert len(StubGitHubHandler.graphql_calls) == 2
+    assert StubGitHubHandler.graphql_calls[1]["commitsAfter"] == "c1"
+    assert len(StubGitHubHandler.rest_calls) == 1
+
+
+def test_graphql_backend_respects_commit_limit(stub_github):
+    change = next(iter_pr_changes_graphql("https://github.com/octo/demo", 7, limit=2))
+
+    assert len(change["commits"]) == 2
+    assert StubGitHubHandler.graphql_calls[0]["commitsFirst"] == 2
+    # The limit bounds the listed commits only: the net change still covers every file
+    assert len(StubGitHubHandler.graphql_calls) == 1
+    assert [f["filename"] for f in change["files"]] == ["app.py", "README.md"]
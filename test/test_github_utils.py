@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from app.config import Config
+from app.core import github_client, github_ratelimit
+from app.core.github_ratelimit import RateLimitScheduler
+from app.core.github_utils import fetch_pr_commits
+
+SHAS = [f"{index:040x}" for index in range(1, 8)]
+# This commit's detail request fails and it is skipped
+MISSING = SHAS[4]
+
+
+class StubCommitsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    per_page = 3
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/repos/o/r/pulls/1/commits":
+            page = int(parse_qs(url.query).get("page", ["1"])[0])
+            start = (page - 1) * self.per_page
+            commits = [{"sha": sha, "commit": {"message": f"commit {SHAS.index(sha)}"}}
+                       for sha in SHAS[start:start + self.per_page]]
+            headers = {}
+            if start + self.per_page < len(SHAS):
+                host = self.headers["Host"]
+                headers["Link"] = f'<http://{host}/repos/o/r/pulls/1/commits?page={page + 1}>; rel="next"'
+            self._send(200, commits, headers)
+        elif url.path.startswith("/repos/o/r/commits/"):
+            sha = url.path.rsplit("/", 1)[1]
+            cls = StubCommitsHandler
+            with cls.lock:
+                cls.in_flight += 1
+                cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            # Earlier commits answer last
+            time.sleep(0.02 * (len(SHAS) - SHAS.index(sha)))
+            with cls.lock:
+                cls.in_flight -= 1
+            if sha == MISSING:
+                self._send(404, {"message": "Not Found"})
+            else:
+                self._send(200, {"files": [{"filename": f"{sha[-1]}.py", "status": "modified"}]})
+        else:
+            self._send(404, {"message": "Not Found"})
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_commits(monkeypatch):
+    StubCommitsHandler.in_flight = 0
+    StubCommitsHandler.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCommitsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Config, "GITHUB_API_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    monkeypatch.setattr(Config, "GITHUB_CACHE_ENABLED", False)
+    monkeypatch.setattr(github_ratelimit, "_scheduler", RateLimitScheduler())
+    monkeypatch.setattr(github_client, "_session", None)
+    yield
+    server.shutdown()
+
+
+def test_concurrent_commit_fetch_keeps_pr_order(stub_commits):
+    commits = fetch_pr_commits("https://github.com/o/r", 1, limit=None, concurrency=4)
+
+    expected = [sha for sha in SHAS if sha != MISSING]
+    assert [commit["full_sha"] for commit in commits] == expected
+    assert [commit["message"] for commit in commits] == [f"commit {SHAS.index(sha)}" for sha in expected]
+    assert commits[0]["files"][0]["filename"] == f"{SHAS[0][-1]}.py"
+    # Details were really fetched in parallel, never more than asked for
+    assert 1 < StubCommitsHandler.max_in_flight <= 4
+
+
+def test_commit_limit_stops_listing(stub_commits):
+    commits = fetch_pr_commits("https://github.com/o/r", 1, limit=2, concurrency=4)
+    assert [commit["full_sha"] for commit in commits] == SHAS[:2]
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from app.config import Config
+from app.core import llm_cache
+from app.core.llm_cache import LLMCacheStats
+from app.core import ollama_pool
+from app.services import ollama_service
+from app.services.ollama_service import OllamaService
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    clients = set()
+    payloads = []
+    ports = []
+
+    def do_GET(self):
+        data = json.dumps({"version": "stub"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        StubOllamaHandler.clients.add(self.client_address)
+        StubOllamaHandler.ports.append(self.server.server_port)
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StubOllamaHandler.payloads.append(payload)
+        time.sleep(0.05)
+        if self.path.endswith("/chat"):
+            body = {"message": {"content": f" {payload['messages'][-1]['content']} "}}
+        else:
+            body = {"response": f" {payload['prompt']} "}
+        data = json.dumps(body).encode("utf-8")
+        if payload.get("stream"):
+            # One NDJSON line per word, then the final "done" line
+            words = payload["messages"][-1]["content"] if "messages" in payload else payload["prompt"]
+            field = "message" if "messages" in payload else "response"
+            lines = [{field: {"content": word} if field == "message" else word, "done": False}
+                     for word in words.split(" ")]
+            lines.append({field: {"content": ""} if field == "message" else "", "done": True})
+            data = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api"
+
+
+@pytest.fixture
+def ollama_url(monkeypatch):
+    StubOllamaHandler.clients = set()
+    StubOllamaHandler.payloads = []
+    StubOllamaHandler.ports = []
+    server, url = start_stub()
+    monkeypatch.setattr(Config, "OLLAMA_POOL_MAXSIZE", 4)
+    # Fresh session, so the pool is built with the size above
+    monkeypatch.setattr(ollama_service, "_session", None)
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    monkeypatch.setattr(Config, "LLM_CACHE_ENABLED", False)
+    yield url
+    server.shutdown()
+
+
+def test_sequential_calls_reuse_one_connection(ollama_url):
+    service = OllamaService(api_url=ollama_url, model="stub")
+
+    assert [service.generate_text(f"p{i}") for i in range(5)] == [f"p{i}" for i in range(5)]
+    assert service.chat([{"role": "user", "content": "hi"}]) == "hi"
+    assert len(StubOllamaHandler.clients) == 1
+
+
+def test_async_fan_out_is_bounded_by_the_pool(ollama_url):
+    service = OllamaService(api_url=ollama_url, model="stub", timeout=(1, 5))
+
+    async def fan_out():
+        return await asyncio.gather(*(service.agenerate_text(f"p{i}") for i in range(12)),
+                                    service.achat([{"role": "user", "content": "hi"}]))
+
+    assert asyncio.run(fan_out()) == [f"p{i}" for i in range(12)] + ["hi"]
+    assert len(StubOllamaHandler.clients) <= Config.OLLAMA_POOL_MAXSIZE
+
+
+def test_generation_profiles_reach_ollama(ollama_url, monkeypatch):
+    monkeypatch.setattr(Config, "OLLAMA_KEEP_ALIVE", "5m")
+    monkeypatch.setattr(Config, "OLLAMA_PROFILES", '{"file_comparison": {"num_ctx": 16384}, "fast": {"num_predict": 64, "keep_alive": -1}}')
+    service = OllamaService(api_url=ollama_url, model="stub")
+
+    service.generate_text("a", profile="file_comparison", max_tokens=100)
+    service.chat([{"role": "user", "content": "b"}], profile="fast", options={"temperature": 0})
+
+    assert StubOllamaHandler.payloads[0]["options"] == {"num_predict": 100, "num_ctx": 16384, "temperature": 0.1, "top_k": 20}
+    assert StubOllamaHandler.payloads[0]["keep_alive"] == "5m"
+    assert StubOllamaHandler.payloads[1]["options"] == {"num_predict": 64, "temperature": 0}
+    assert StubOllamaHandler.payloads[1]["keep_alive"] == -1
+    service.generate_text("d", format={"type": "object"})
+    assert StubOllamaHandler.payloads[2]["format"] == {"type": "object"}
+    assert "format" not in StubOllamaHandler.payloads[0]
+    with pytest.raises(ValueError):
+        service.generate_text("c", profile="unknown")
+
+
+def test_response_cache_skips_repeated_prompts(ollama_url, monkeypatch):
+    monkeypatch.setattr(Config, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "_cache", None)
+    service = OllamaService(api_url=ollama_url, model="stub")
+    stats = LLMCacheStats()
+
+    assert service.generate_text("same patch", cache_stats=stats) == "same patch"
+    assert service.generate_text("same patch", cache_stats=stats) == "same patch"
+    # Options are part of the key
+    service.generate_text("same patch", max_tokens=10, cache_stats=stats)
+    assert service.generate_text("same patch", use_cache=False, cache_stats=stats) == "same patch"
+
+    assert len(StubOllamaHandler.payloads) == 3
+    assert stats.snapshot() == {"hits": 1, "misses": 2, "bypassed": 1} and stats.last == "bypass"
+
+
+def test_streaming_passes_each_piece_to_on_token(ollama_url):
+    service = OllamaService(api_url=ollama_url, model="stub")
+    tokens = []
+
+    assert service.generate_text("one two three", on_token=tokens.append) == "onetwothree"
+    assert tokens == ["one", "two", "three"]
+    assert StubOllamaHandler.payloads[-1]["stream"] is True
+    chat_tokens = []
+    assert service.chat([{"role": "user", "content": "hi there"}], on_token=chat_tokens.append) == "hithere"
+    assert chat_tokens == ["hi", "there"]
+    # Without a callback the response comes back in one piece
+    assert service.generate_text("one two") == "one two"
+    assert StubOllamaHandler.payloads[-1]["stream"] is False
+
+
+def test_requests_are_balanced_across_hosts_with_ejection(ollama_url, monkeypatch):
+    second, second_url = start_stub()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        dead_url = f"http://127.0.0.1:{sock.getsockname()[1]}/api"
+    monkeypatch.setattr(Config, "OLLAMA_MAX_RETRIES", 0)
+    monkeypatch.setattr(Config, "OLLAMA_EJECT_FAILURES", 1)
+    monkeypatch.setattr(Config, "OLLAMA_EJECT_SECONDS", 60)
+    monkeypatch.setattr(Config, "OLLAMA_HEALTH_INTERVAL", 0)
+    monkeypatch.setattr(ollama_pool, "_pools", {})
+    service = OllamaService(api_url=[ollama_url, second_url, dead_url], model="stub", timeout=(1, 5))
+    pool = ollama_pool.get_ollama_pool(service.api_urls)
+
+    async def fan_out(count):
+        return await asyncio.gather(*(service.agenerate_text(f"p{i}") for i in range(count)))
+
+    # The unreachable host fails over and is ejected; the others share the load
+    assert asyncio.run(fan_out(12)) == [f"p{i}" for i in range(12)]
+    ports = [int(url.split(":")[2].split("/")[0]) for url in (ollama_url, second_url)]
+    assert all(StubOllamaHandler.ports.count(port) >= 3 for port in ports)
+    hosts = {host["url"]: host for host in pool.snapshot()["hosts"]}
+    assert hosts[dead_url]["admitted"] is False and hosts[dead_url]["errors"] >= 1
+    assert all(host["inflight"] == 0 for host in hosts.values())
+
+    # An ejected host gets no requests until a health check readmits it
+    monkeypatch.setattr(Config, "OLLAMA_EJECT_SECONDS", 0.2)
+    pool.record_failure(ollama_url, "stub failure")
+    StubOllamaHandler.ports = []
+    assert asyncio.run(fan_out(4)) == [f"p{i}" for i in range(4)]
+    assert set(StubOllamaHandler.ports) == {ports[1]}
+    time.sleep(0.25)
+    pool.check_health()
+    hosts = {host["url"]: host for host in pool.snapshot()["hosts"]}
+    assert hosts[ollama_url]["admitted"] is True
+    assert hosts[dead_url]["admitted"] is False
+    second.shutdown()
+
+
+def test_read_timeout_is_recorded_but_not_retried(ollama_url, monkeypatch):
+    monkeypatch.setattr(Config, "OLLAMA_MAX_RETRIES", 0)
+    monkeypatch.setattr(Config, "OLLAMA_EJECT_FAILURES", 1)
+    monkeypatch.setattr(Config, "OLLAMA_EJECT_SECONDS", 60)
+    monkeypatch.setattr(Config, "OLLAMA_HEALTH_INTERVAL", 0)
+    monkeypatch.setattr(ollama_pool, "_pools", {})
+    # Ties go to the first host, which accepts connections but never answers
+    monkeypatch.setattr(ollama_pool.random, "shuffle", lambda hosts: None)
+    with socket.socket() as hanging:
+        hanging.bind(("127.0.0.1", 0))
+        hanging.listen(8)
+        hanging_url = f"http://127.0.0.1:{hanging.getsockname()[1]}/api"
+        service = OllamaService(api_url=[hanging_url, ollama_url], model="stub", timeout=(1, 0.3))
+
+        # The generation may already be running on the slow host: it is not sent again elsewhere
+        StubOllamaHandler.payloads = []
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            service.generate_text("slow host")
+        assert StubOllamaHandler.payloads == []
+        hosts = {host["url"]: host for host in ollama_pool.get_ollama_pool(service.api_urls).snapshot()["hosts"]}
+        assert hosts[hanging_url]["admitted"] is False and hosts[hanging_url]["errors"] == 1
+
+        # Once ejected, the next request goes to the other host
+        assert service.generate_text("next request") == "next request"
@@ -0,0 +1,97 @@
+from collections.abc import Sequence
+
+from app.core.file_comparison import compute_unified_diff
+from app.core import semantic_diff as semantic_diff_module
+from app.core.semantic_diff import semantic_diff
+from app.services.comparison_service import ComparisonService
+
+OLD = '''import os
+
+LIMIT = 10
+
+
+class Client:
+    def get(self, key):
+        return self.store[key]
+
+    def put(self, key, value):
+        self.store[key] = value
+
+
+def helper(x):
+    return x + 1
+
+
+def legacy():
+    pass
+'''
+
+NEW = '''import os
+
+LIMIT = 10
+
+
+class Client:
+    def get(self, key, default=None):
+        return self.store.get(key, default)
+
+    def put(self, key,   value):  # formatting only
+        self.store[key] = value
+
+    @property
+    def size(self):
+        return len(self.store)
+
+
+def helper(x):
+    return x + 1
+'''
+
+
+def test_semantic_diff_matches_symbols_by_name():
+    result = semantic_diff(OLD, NEW, "client.py")
+
+    statuses = {symbol["name"]: symbol["status"] for symbol in result["symbols"]}
+    assert statuses == {"Client.get": "changed", "Client.size": "added", "legacy": "removed"}
+    assert result["summary"] == {"added": 1, "removed": 1, "changed": 1}
+    get = result["symbols"][0]
+    assert get["lines_a"] == [7, 8] and get["lines_b"] == [7, 8]
+    assert "self.store.get(key, default)" in get["source_b"]
+    assert next(s for s in result["symbols"] if s["name"] == "Client.size")["lines_b"] == [13, 15]
+
+    assert semantic_diff(OLD, NEW, "client.js") is None
+    assert semantic_diff(OLD, "def broken(:\n", "client.py") is None
+
+
+def test_prompt_uses_changed_symbols_instead_of_previews():
+    diff = compute_unified_diff(OLD, NEW, "a/client.py", "b/client.py", semantic=True)
+    assert diff["semantic_diff"]["summary"]["changed"] == 1
+    assert "semantic_diff" not in compute_unified_diff(OLD, NEW, "a/client.py", "b/client.py")
+
+    prompt = ComparisonService().generate_comparison_prompt(
+        "a/client.py", "b/client.py", diff["unified_diff"], diff["semantic_diff"]
+    )
+    assert "function Client.get (changed; A lines 7-8, B lines 7-8)" in prompt
+    assert "File A content" not in prompt and "import os" not in prompt
+
+
+class CountingLines(Sequence):
+    """Lines that record how far they were read"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.read = 0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __getitem__(self, index):
+        self.read = max(self.read, index + 1)
+        return self.lines[index]
+
+
+def test_oversized_input_is_rejected_before_joining(monkeypatch):
+    monkeypatch.setattr(semantic_diff_module, "MAX_PARSE_CHARS", 1000)
+    huge = CountingLines([f"x{i} = {'1' * 90}\n" for i in range(10000)])
+    assert semantic_diff(huge, NEW, "client.py") is None
+    assert huge.read < 20
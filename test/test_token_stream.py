@@ -0,0 +1,78 @@
+import json
+
+from app.core import token_stream
+from app.core.token_stream import TokenStream, iter_sse_events
+
+
+class FakeStreamRedis:
+    """Just enough of a Redis stream (XADD / XREAD) for one process"""
+
+    def __init__(self):
+        self.streams = {}
+        self.expires = {}
+        self._seq = 0
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self._seq += 1
+        entry_id = f"{self._seq}-0"
+        self.streams.setdefault(key, []).append((entry_id, dict(fields)))
+        return entry_id
+
+    def expire(self, key, ttl):
+        self.expires[key] = ttl
+
+    def xread(self, streams, count=None, block=None):
+        response = []
+        for key, last_id in streams.items():
+            after = int(last_id.split("-")[0])
+            entries = [entry for entry in self.streams.get(key, [])
+                       if int(entry[0].split("-")[0]) > after][:count]
+            if entries:
+                response.append((key, entries))
+        return response
+
+
+def parse_sse(messages):
+    events = []
+    for message in messages:
+        if message.startswith(":"):
+            continue
+        fields = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+        events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_published_tokens_are_relayed_as_sse(monkeypatch):
+    redis = FakeStreamRedis()
+    monkeypatch.setattr(token_stream, "get_cache_redis", lambda: redis)
+    stream = TokenStream("t1", flush_ms=0)
+    publisher = stream.publisher("app.py")
+    for token in ("def ", "main", "():"):
+        publisher(token)
+    publisher.close()
+    stream.close("completed")
+
+    events = parse_sse(iter_sse_events("t1", client=redis, block_ms=10))
+    assert [event for _, event, _ in events] == ["token"] * 3 + ["end", "done"]
+    assert "".join(data["text"] for _, event, data in events if event == "token") == "def main():"
+    assert events[3][2] == {"source": "app.py"}
+    assert events[-1][2] == {"status": "completed"}
+    assert redis.expires["stream:t1"] == stream.ttl
+
+    # A reconnect resumes after the last event id it saw
+    resumed = parse_sse(iter_sse_events("t1", last_event_id=events[2][0], client=redis, block_ms=10))
+    assert [event for _, event, _ in resumed] == ["end", "done"]
+
+
+def test_stream_ends_from_task_status_without_done_entry():
+    redis = FakeStreamRedis()
+    statuses = iter(["processing", "failed"])
+    messages = list(iter_sse_events("t2", task_status=lambda: next(statuses), client=redis, block_ms=10))
+    assert messages[0] == ": keep-alive\n\n"
+    assert parse_sse(messages) == [(None, "done", {"status": "failed"})]
@@ -0,0 +1,95 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote, urlparse
+
+import pytest
+
+from app.config import Config
+from app.core.blob_cache import git_blob_sha
+from app.core.tree_comparison import TreeSpec, compare_trees
+
+FILES = {
+    "main": {"src/app.py": b"x = 1\ny = 2\n", "src/same.py": b"same\n", "src/old.py": b"old\n", "README.md": b"top\n"},
+    "feature": {"src/app.py": b"x = 1\ny = 3\n", "src/same.py": b"same\n", "src/new.py": b"new\n",
+                "src/logo.png": b"\x89PNG\0\0"},
+}
+
+
+class StubGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    raw_requests = []
+
+    def _send(self, body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = unquote(urlparse(self.path).path)
+        if path.startswith("/repos/octo/demo/git/trees/"):
+            ref, _, prefix = path.rsplit("/", 1)[-1].partition(":")
+            tree = [
+                {"path": name[len(prefix) + 1:], "type": "blob", "sha": git_blob_sha(data)}
+                for name, data in FILES[ref].items() if name.startswith(prefix + "/")
+            ]
+            tree.append({"path": "nested", "type": "tree", "sha": "0" * 40})
+            self._send(json.dumps({"tree": tree, "truncated": False}).encode("utf-8"))
+        elif path.startswith("/raw/octo/demo/"):
+            ref, name = path[len("/raw/octo/demo/"):].split("/", 1)
+            if name not in FILES[ref]:
+                self._send(b"404: Not Found", status=404)
+                return
+            StubGitHubHandler.raw_requests.append(path)
+            self._send(FILES[ref][name])
+        else:
+            self._send(b"{}", status=404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_github(monkeypatch):
+    StubGitHubHandler.raw_requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGitHubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(Config, "GITHUB_API_URL", base_url)
+    monkeypatch.setattr(Config, "GITHUB_RAW_URL", f"{base_url}/raw")
+    monkeypatch.setattr(Config, "GITHUB_BACKEND", "rest")
+    monkeypatch.setattr(Config, "REDIS_URL", None)
+    monkeypatch.setattr(Config, "BLOB_CACHE_ENABLED", False)
+    monkeypatch.setattr(Config, "TREE_DIFF_PROCESSES", 2)
+    yield server
+    server.shutdown()
+
+
+def test_compare_trees_skips_identical_blobs(stub_github):
+    spec_a = TreeSpec("https://github.com/octo/demo", "main", "src")
+    spec_b = TreeSpec("https://github.com/octo/demo", "feature", "src/")
+
+    report = compare_trees(spec_a, spec_b)
+
+    files = {entry["path"]: entry for entry in report["files"]}
+    assert sorted(files) == ["app.py", "logo.png", "new.py", "old.py"]
+    assert [files[name]["status"] for name in sorted(files)] == ["modified", "added", "added", "removed"]
+    assert "+y = 3" in files["app.py"]["diff"]["unified_diff"]
+    assert files["logo.png"]["binary"] is True and "diff" not in files["logo.png"]
+    assert report["summary"]["unchanged"] == 1
+    assert report["summary"]["lines_added"] == 2 and report["summary"]["lines_removed"] == 2
+
+    # Identical blobs are never downloaded, and absent sides are not requested
+    assert not any(path.endswith("same.py") for path in StubGitHubHandler.raw_requests)
+    assert len(StubGitHubHandler.raw_requests) == 5
+
+
+def test_compare_trees_respects_file_limit(stub_github):
+    spec_a = TreeSpec("https://github.com/octo/demo", "main", "src")
+    spec_b = TreeSpec("https://github.com/octo/demo", "feature", "src")
+
+    report = compare_trees(spec_a, spec_b, max_files=1)
+
+    assert [entry["path"] for entry in report["files"]] == ["app.py"]
+    assert report["not_compared"] == ["logo.png", "new.py", "old.py"]